@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+benchmarks the stages of sci-paper-rename on a synthetic corpus (see corpus.py) and on
+the golden set (examples/*.pdf, expected names in golden_titles.json).
+reports files/sec of hash_file, scan_title, parse_title and of a full
+rename_files_in_dir run, and the title accuracy against the ground truth.
+
+usage: python3 bench.py [--files N] [--corpus DIR] [--jobs N] [--json OUT]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import tempfile
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCH_DIR, ".."))
+from sci_paper_rename.__main__ import hash_file, parse_title, scan_title, rename_files_in_dir
+from corpus import GROUND_TRUTH_FILE, generate_corpus
+
+GOLDEN_DIR = os.path.join(BENCH_DIR, "..", "examples")
+GOLDEN_TITLES_FILE = os.path.join(BENCH_DIR, "golden_titles.json")
+
+
+def timed(function, items):
+    """
+    calls function(item) for each item, returns (results, elapsed seconds)
+    """
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    return results, time.perf_counter() - start
+
+
+def report_line(stage, count, seconds, accuracy=None):
+    line = {"stage": stage, "files": count, "seconds": round(seconds, 4),
+            "files_per_sec": round(count / seconds, 1) if seconds > 0 else None}
+    if accuracy is not None:
+        line["accuracy"] = round(accuracy, 4)
+    print("%-22s %7d files %9.3f s %10s files/s %s" % (
+        stage, count, seconds, line["files_per_sec"],
+        "" if accuracy is None else "accuracy %.1f%%" % (accuracy * 100)))
+    return line
+
+
+def bench_scan(label, dir_name, expected_names, scan_options):
+    """
+    times scan_title over the files of 'expected_names' and checks the font-based titles
+    """
+    file_names = sorted(expected_names)
+    paths = [os.path.join(dir_name, file_name) for file_name in file_names]
+    results, seconds = timed(lambda path: scan_title(path, **scan_options), paths)
+    good = sum(1 for file_name, (meta_title, font_based_title) in zip(file_names, results)
+               if font_based_title.lower() == expected_names[file_name].lower())
+    return report_line(label, len(paths), seconds, good / len(paths))
+
+
+def bench_end_to_end(corpus_dir, ground_truth, jobs, scan_options):
+    """
+    runs rename_files_in_dir on a copy of the corpus, checks the names in the output directory
+    """
+    work_dir = tempfile.mkdtemp(prefix="sci-paper-rename-bench-")
+    try:
+        for file_name in ground_truth:
+            shutil.copyfile(os.path.join(corpus_dir, file_name), os.path.join(work_dir, file_name))
+        start = time.perf_counter()
+        renamed_counter, total_counter = rename_files_in_dir(
+            work_dir, jobs=jobs, scan_options=scan_options, loop_type="1")
+        seconds = time.perf_counter() - start
+        renamed_names = {name.lower() for name in os.listdir(os.path.join(work_dir, "auto_renamed_pdf"))}
+        originals = [truth for truth in ground_truth.values() if truth["duplicate_of"] is None]
+        good = sum(1 for truth in originals if truth["expected"].lower() in renamed_names)
+        return report_line("rename_files_in_dir", total_counter, seconds, good / len(originals))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def run_benchmarks(args):
+    corpus_dir = args.corpus or tempfile.mkdtemp(prefix="sci-paper-rename-corpus-")
+    ground_truth_file = os.path.join(corpus_dir, GROUND_TRUTH_FILE)
+    if os.path.exists(ground_truth_file):
+        with open(ground_truth_file) as f:
+            ground_truth = json.load(f)
+    else:
+        print("generating " + str(args.files) + " files in " + corpus_dir)
+        ground_truth = generate_corpus(corpus_dir, args.files, args.seed)
+    with open(GOLDEN_TITLES_FILE) as f:
+        golden_titles = json.load(f)
+
+    scan_options = {}
+    if args.clip_top is not None:
+        scan_options["clip_top"] = args.clip_top
+
+    paths = [os.path.join(corpus_dir, file_name) for file_name in sorted(ground_truth)]
+    raw_titles = [truth["title"] for truth in ground_truth.values()] * 100
+
+    report = []
+    results, seconds = timed(hash_file, paths)
+    report.append(report_line("hash_file", len(paths), seconds))
+    report.append(bench_scan("scan_title", corpus_dir,
+                             {name: truth["expected"] for name, truth in ground_truth.items()},
+                             scan_options))
+    results, seconds = timed(parse_title, raw_titles)
+    report.append(report_line("parse_title", len(raw_titles), seconds))
+    report.append(bench_scan("scan_title (golden)", GOLDEN_DIR, golden_titles, scan_options))
+    report.append(bench_end_to_end(corpus_dir, ground_truth, args.jobs, scan_options))
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.corpus is None:
+        shutil.rmtree(corpus_dir)
+    return report
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark sci-paper-rename.")
+    parser.add_argument("--files", type=int, default=200,
+                        help="Number of files of the generated corpus (default: 200).")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the corpus.")
+    parser.add_argument("--corpus", help="Reuse (or generate once) the corpus in this directory.")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Processes used by the rename_files_in_dir run (default: 1).")
+    parser.add_argument("--clip-top", type=float, default=None,
+                        help="Extract only the top fraction of the first page.")
+    parser.add_argument("--json", help="Also write the report to this json file.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    logging.getLogger().setLevel(logging.WARNING)
+    run_benchmarks(parse_arguments())
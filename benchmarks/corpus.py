@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+generates a synthetic corpus of scientific-paper-like pdf files with known titles.
+the ground truth (expected file name of each pdf) is written to ground_truth.json.
+
+usage: python3 corpus.py <OUTPUT_DIRECTORY> [--files N] [--seed S] ...
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sci_paper_rename.__main__ import parse_title
+
+GROUND_TRUTH_FILE = "ground_truth.json"
+
+WORDS = (
+    "adaptive scalable distributed secure efficient learning network blockchain "
+    "quantum cloud edge storage consensus protocol analysis survey framework "
+    "architecture graph neural inference privacy federated trusted execution "
+    "scheduling cache memory compiler verification benchmark approach towards "
+    "systems data streaming energy aware robust sparse optimization model "
+    "language retrieval kernel virtualization containers serverless fault tolerance"
+).split()
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 54
+
+
+def random_title(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(4, 12))]
+    words[0] = words[0].capitalize()
+    if rng.random() < 0.3:
+        words.insert(rng.randint(1, len(words) - 1), ":")
+    return " ".join(words).replace(" :", ":")
+
+
+def random_text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+
+def write_paper(path, title, rng, multicolumn=False, dropcap=False, extra_pages=0,
+                with_metadata=False):
+    """
+    writes a pdf file whose first page looks like a paper: title (largest font),
+    authors, abstract and body text, in one or two columns, optionally with a
+    drop cap (a single letter larger than the title).
+    """
+    import fitz
+
+    doc = fitz.open()
+    page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    width = PAGE_WIDTH - 2 * MARGIN
+
+    page.insert_textbox(fitz.Rect(MARGIN, 60, PAGE_WIDTH - MARGIN, 160), title,
+                        fontsize=20, fontname="hebo", align=1)
+    page.insert_textbox(fitz.Rect(MARGIN, 165, PAGE_WIDTH - MARGIN, 200),
+                        "Alice Author, Bob Researcher, Carol Scientist",
+                        fontsize=11, align=1)
+    page.insert_textbox(fitz.Rect(MARGIN + 30, 205, PAGE_WIDTH - MARGIN - 30, 300),
+                        "Abstract. " + random_text(rng, 80), fontsize=9)
+
+    body_top = 310
+    if dropcap:
+        page.insert_text((MARGIN, body_top + 36), "T", fontsize=48, fontname="tibo")
+        body_top += 50
+    if multicolumn:
+        column_width = (width - 18) / 2
+        for column in range(2):
+            x0 = MARGIN + column * (column_width + 18)
+            page.insert_textbox(fitz.Rect(x0, body_top, x0 + column_width, PAGE_HEIGHT - MARGIN),
+                                random_text(rng, 400), fontsize=10)
+    else:
+        page.insert_textbox(fitz.Rect(MARGIN, body_top, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN),
+                            random_text(rng, 500), fontsize=10)
+
+    for _ in range(extra_pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_textbox(fitz.Rect(MARGIN, MARGIN, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN),
+                            random_text(rng, 700), fontsize=10)
+
+    if with_metadata:
+        doc.set_metadata({"title": title})
+    doc.save(path)
+    doc.close()
+
+
+def generate_corpus(output_dir, files=100, seed=1, multicolumn=0.3, dropcap=0.2,
+                    large=0.05, large_pages=200, duplicates=0.05, metadata=0.5):
+    """
+    writes 'files' pdf files to 'output_dir' ('duplicates' of them being byte copies of
+    other files) and returns the ground truth:
+    {file name: {"title": raw title, "expected": expected new name, "duplicate_of": name or None}}
+    the ratios give the share of files with each layout feature.
+    """
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    ground_truth = {}
+    titles = set()
+    originals = []
+
+    for index in range(files):
+        file_name = "paper_%05d.pdf" % index
+        path = os.path.join(output_dir, file_name)
+        if originals and rng.random() < duplicates:
+            original = rng.choice(originals)
+            shutil.copyfile(os.path.join(output_dir, original), path)
+            ground_truth[file_name] = dict(ground_truth[original], duplicate_of=original)
+            continue
+
+        title = random_title(rng)
+        while parse_title(title).lower() in titles:
+            title = random_title(rng)
+        titles.add(parse_title(title).lower())
+        write_paper(path, title, rng,
+                    multicolumn=rng.random() < multicolumn,
+                    dropcap=rng.random() < dropcap,
+                    extra_pages=large_pages if rng.random() < large else 0,
+                    with_metadata=rng.random() < metadata)
+        ground_truth[file_name] = {"title": title, "expected": parse_title(title),
+                                   "duplicate_of": None}
+        originals.append(file_name)
+
+    with open(os.path.join(output_dir, GROUND_TRUTH_FILE), "w") as f:
+        json.dump(ground_truth, f, indent=2)
+    return ground_truth
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Generate a synthetic corpus of papers.")
+    parser.add_argument("output_dir", help="Directory where the pdf files are written.")
+    parser.add_argument("--files", type=int, default=100, help="Number of files (default: 100).")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1).")
+    parser.add_argument("--multicolumn", type=float, default=0.3,
+                        help="Share of two-column papers (default: 0.3).")
+    parser.add_argument("--dropcap", type=float, default=0.2,
+                        help="Share of papers with a drop cap (default: 0.2).")
+    parser.add_argument("--large", type=float, default=0.05,
+                        help="Share of large papers (default: 0.05).")
+    parser.add_argument("--large-pages", type=int, default=200,
+                        help="Number of pages of a large paper (default: 200).")
+    parser.add_argument("--duplicates", type=float, default=0.05,
+                        help="Share of byte-identical duplicates (default: 0.05).")
+    parser.add_argument("--metadata", type=float, default=0.5,
+                        help="Share of papers with a metadata title (default: 0.5).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    generate_corpus(args.output_dir, args.files, args.seed, args.multicolumn, args.dropcap,
+                    args.large, args.large_pages, args.duplicates, args.metadata)
+    print("corpus written to " + args.output_dir)
@@ -0,0 +1,8 @@
+from .scan import ScanError
+from .api import (
+    TitleResult,
+    RenameResult,
+    extract_title,
+    extract_titles,
+    rename_batch,
+)
@@ -1,16 +1,43 @@
 #!/usr/bin/env python3
-import fitz
 import os
 import sys
-import platform
-import pkg_resources
 import signal
-import string
-import hashlib
-import shutil
-import re
 import logging
+import functools
+import itertools
 from .helper import *
+from .pipeline import ReadAhead, bounded_map
+from .walker import iter_listed_pdf_files, iter_pdf_files, read_path_list, OUTPUT_DIR_NAME
+from .plan import NameIndex, apply_action, read_plan, write_plan
+from .commit import Committer, look_up_archive
+from .journal import Journal, journal_path, read_journal
+from .title import TITLE_SELECTOR_VERSION, TITLE_STRATEGIES
+from .scan import (
+    hash_file,
+    hash_and_scan,
+    parse_title,
+    scan_title,
+    choose_candidate_title,
+)
+from .shard import CLAIM_DIR_NAME, LEASE_SECONDS, WorkClaims, in_shard, parse_shard
+from .neardup import SIMILARITY_THRESHOLD, text_signature
+from .transfer import LINK_MODES, PARTIAL_SUFFIX, place_file
+from .watch import DEBOUNCE_SECONDS, watch_pdf_files
+from .supervisor import QUARANTINE_FILE_NAME, QUARANTINED, Quarantine, SupervisedPool
+from .events import EVENT_FIELDS, EventWriter, Progress
+from .stats import RunStats, collecting, get_collector, set_collector, timed_stage
+
+# maximum number of new files waiting to be renamed in --watch mode
+WATCH_QUEUE_SIZE = 256
+# line logged before each file
+SEPARATOR = "*" * 80
+# files scanned ahead while the user confirms the current one (one-by-one mode)
+PREFETCH_FILES = 4
+# paths read from stdin ahead of the files being processed (--from-stdin)
+STDIN_READ_AHEAD = 1024
+
+# heavy modules (fitz, sqlite3, concurrent.futures) are imported where they are used,
+# so the command line starts fast (e.g. --help) and only pays for what it runs.
 
 # Define logger / logger config
 log_level = logging.INFO
@@ -49,7 +76,7 @@ def validate_arguments(arguments):
             if os.path.isdir(target):
                 base_dir = os.path.abspath(target)
             else:
-                if target.endswith(".pdf"):
+                if target.lower().endswith(".pdf"):
                     base_dir = os.path.dirname(target)
                     filename = os.path.basename(target)
                 else:
@@ -64,272 +91,20 @@ def validate_arguments(arguments):
     return base_dir, filename
 
 
-def hash_file(target_file):
-
-    blocksize = 65536
-    hasher = hashlib.new("sha256")
-    target_file = os.path.abspath(target_file)
-    if os.path.isfile(target_file):
-        with open(target_file, "rb") as f:
-            while True:
-                data = f.read(blocksize)
-                if not data:
-                    break
-                hasher.update(data)
-
-        return hasher.hexdigest()
-    else:
-        logger.error(target_file + " is not a file")
-        sys.exit()
-
-
-def parse_title(title, max_length=None):
-    """
-    uses regex to parse the title/file-name candidate
-    """
-
-    if max_length == None:
-        max_length = 125
-
-    if len(title) > max_length:
-        title = title[:max_length]
-
-    title = re.sub(r"[^a-zA-Z0-9]+", " ", title)
-    title = title.strip()
-    title = re.sub(r"\s", "_", title)
-    title = string.capwords(title) + ".pdf"
-    return title
-
-
-def deprecating_get_page_text(current_page):
-    """
-    this function is deprecating, keeping here as archive only.
-    """
-    # first find python version
-    # python_version = sys.version
-    # Get the Python version as a string
-
-    python_version = platform.python_version()
-    tested_versions = ["3.11.6", "3.7.17", "3.8.18"]
-    library_name = "PyMuPDF"
-    library_version = pkg_resources.get_distribution(library_name).version
-
-    if library_version == "1.18.14":
-        if python_version == "3.7.0":
-            logger.debug("Python  version is: " + python_version)
-            logger.debug("PyMuPDF version is: " + library_version)
-            blocks = current_page.getText("dict")["blocks"]
-        else:
-            logger.warn("Python  version is: " + python_version)
-            logger.warn("PyMuPDF version is: " + library_version)
-            logger.error(
-                "Your Python version is not at the required level to work with PyMuPDF 1.18.14"
-            )
-            logger.error(
-                "Please ensure that both meet the specified version requirements for this script to function properly."
-            )
-            sys.exit()
-    elif library_version == "1.22.5":
-        if python_version in tested_versions:
-            blocks = current_page.get_text("dict")["blocks"]
-            logger.debug("Python  version is: " + python_version)
-            logger.debug("PyMuPDF version is: " + library_version)
-        else:
-            logger.warn("Python  version is: " + python_version)
-            logger.warn("PyMuPDF version is: " + library_version)
-            logger.error(
-                "Your Python version is not at the required level to work with PyMuPDF 1.22.5"
-            )
-            logger.error(
-                "Please ensure that both meet the specified version requirements for this script to function properly."
-            )
-            sys.exit()
-    else:
-        logger.warn("Python  version is: " + python_version)
-        logger.warn("PyMuPDF version is: " + library_version)
-        logger.error("Your Python version or PyMuPDF is not at the required level!")
-        logger.error("Please ensure that both meet the specified version requirements.")
-        sys.exit()
-
-    return blocks
-
-
-def get_page_text(current_page):
-    """
-    This function is required for compatibility reasons:
-    There is a function 'get_text' from PyMuPDF that has changed
-    its name from one version to another: 'get_text' or 'get_Text'
-    so this function just try to track the compatibility between them.
-    """
-
-    # Get the current Python version and PyMuPDF version.
-    python_version = platform.python_version()
-    library_name = "PyMuPDF"
-    library_version = pkg_resources.get_distribution(library_name).version
-
-    # Define supported Python versions for PyMuPDF versions 1.22.5 and 1.26.0.
-    tested_versions = ["3.11.6", "3.7.17", "3.8.18"]
-
-    # Prepare a common version message.
-    version_message = (
-        f"Python version: {python_version}, PyMuPDF version: {library_version}"
-    )
-
-    if library_version == "1.18.14":
-        if python_version == "3.7.0":
-            logger.debug(version_message)
-            blocks = current_page.getText("dict")["blocks"]
-        else:
-            logger.warning(version_message)
-            logger.error(
-                "Your Python version is not at the required level to work with PyMuPDF 1.18.14. "
-                "Please ensure that both meet the specified version requirements for this script to function properly."
-            )
-            sys.exit(1)
-    elif library_version in ["1.22.5", "1.26.0", "1.22.0"]:
-        if python_version in tested_versions:
-            logger.debug(version_message)
-            # Use get_text for these versions.
-            blocks = current_page.get_text("dict")["blocks"]
-        else:
-            logger.warning(version_message)
-            logger.error(
-                f"Your Python version is not at the required level to work with PyMuPDF {library_version}. "
-                "Please ensure that both meet the specified version requirements for this script to function properly."
-            )
-            sys.exit(1)
-    else:
-        logger.warning(version_message)
-        logger.error(
-            "Your Python version or PyMuPDF is not at the required level! "
-            "Please ensure that both meet the specified version requirements for this script to function properly."
-        )
-        sys.exit(1)
-
-    return blocks
-
-
-def scan_title(full_file_name, page_num=None):
+def confirm_to_continue(proposal=None):
     """
-    scans the pdf file looking for a title, either based on the pdf metadata or
-    trying to figure out what is the sentence that has the larger font-size
+    asks the user whether to go on with the current file, showing the 'proposal'
+    (what will be done with it) if it is known
     """
 
-    logger.info(
-        "*******************************************************************************"
-    )
-    logger.info("Searching title for file : " + full_file_name)
-    if page_num is None:
-        page_num = 0
-
-    doc = fitz.open(full_file_name)
-    meta_title = doc.metadata["title"].strip()
-
-    # Check document's metadata for a potential title
-    if len(meta_title) > 5:
-        logger.debug("Document metadata title: " + meta_title)
-        meta_title = parse_title(meta_title)
-
-    # Read first page and look for the setence with the largest font
-    page = doc.load_page(page_num)
-    size_text_tup_list = []
-    title = ""
-    # get paget text
-    # blocks = page.get_text('dict')['blocks']
-    blocks = get_page_text(page)
-    for blk in blocks:  # iterate through text blocks
-        if blk["type"] == 0:  # only considers text blocks (type 0)
-            for line in blk["lines"]:  # iterate through text lines
-                if (
-                    line["dir"] == (1.0, 0.0) and line["wmode"] == 0
-                ):  # only considers horizontal lines:
-                    # check 'dir' argument (writing direction) in the Line dictionary
-                    # line['dir'] == (1.0, 0.0) write direction is horizontal left to right
-                    for span in line["spans"]:  # iterate through spans
-                        size_text_tup = (span["size"], span["text"], span["origin"])
-                        size_text_tup_list.append(size_text_tup)
-                        # sort the list of tuples ('font_size','text_line') according to the 'font size' of a text line
-    # TODO: improve this above. to many 'for' in 'for'
-    # sort output
-    sorted_size_text_list = sorted(
-        size_text_tup_list, key=lambda text_size: text_size[0], reverse=True
-    )
-
-    larger_font = 0
-    title_max_lines = 5
-
-    for item in sorted_size_text_list:
-        t_font_size = item[0]
-        t_text = item[1]
-        t_text_len = len(t_text)
-        # logger.debug('t_font_size: ' + str(t_font_size) + ' t_text: ' + t_text + ' t_text_len: ' + str(t_text_len))
-        # consider only span text bigger than 2 , in order to avoid posible single characters
-        # with font size bigger than the Title being gotten as if they were the title.
-        # ex: in some papers the first letter of the paragraph is bigger than anything else,
-        # only getting the bigger font without considering the size of the text must generate titles that
-        # are as big as a single character. such as a.pdf, or b.pdf, thus only consider span at lines with more than 2 chars
-        if t_text_len > 2:
-            if (
-                t_font_size > larger_font
-            ):  # compare the size of each item with the size of the larger font size
-                larger_font = (
-                    t_font_size  # replace text if larger, append if it is the same
-                )
-                title = t_text.strip() + " "
-                title_max_lines -= 1
-            else:
-                if t_font_size == larger_font:
-                    title = title + t_text.strip() + " "
-                    title_max_lines -= 1
-
-        if title_max_lines < 1:
-            break
-
-    doc.close()
-    parsed_found_title = parse_title(title)
-
-    logger.debug("Parsed Found title: " + parsed_found_title)
-    logger.debug("--------------------------------------------------------")
-
-    return (meta_title, parsed_found_title)
-
-
-def do_rename(fullpath_current_filename, fullpath_new_filename):
-    """
-    function do_rename: renames the file name given by the full path in
-                        'current_filename' to 'new_filename'
-            receives: current_filename and 'new_filename
-            returns:
-    """
-    logger.info("Renaming pdf file...")
-    logger.info("Current file name: " + fullpath_current_filename)
-    logger.info("New file name: " + fullpath_new_filename)
-
-    if fullpath_current_filename == fullpath_new_filename:
-        logger.warning(
-            "Current filename and found title are already the same. Skipping..."
-        )
-        return False
-
-    logger.info("Renaming file...")
-
-    try:
-        os.rename(fullpath_current_filename, fullpath_new_filename)
-    except:
-        logger.error("An exception occurred. File not renamed!")
-        return False
-    finally:
-        logger.debug("File renamed!")
-        return True
-
-
-def confirm_to_continue():
-
     logger.debug("Choose [c] to continue")
     logger.debug("Choose [s] to skip file")
     logger.debug("Choose [a] to abort")
     valid_choices = ["c", "s", "a"]
-    choice = input("Choose [c] to continue, [s] to skip, or [a] to abort : \n")
+    prompt = "Choose [c] to continue, [s] to skip, or [a] to abort : \n"
+    if proposal is not None:
+        prompt = proposal + "\n" + prompt
+    choice = input(prompt)
 
     while choice not in valid_choices:
         logger.warning("Answer not valid!")
@@ -346,6 +121,22 @@ def confirm_to_continue():
         sys.exit()
 
 
+def describe_action(action):
+    """
+    short description of a planned action, shown when asking the user to confirm it
+    """
+    if action["action"] == "rename":
+        return "Proposed name: " + os.path.basename(action["target"])
+    if action["action"] == "duplicate":
+        return (
+            "Duplicate of "
+            + action["original"]
+            + ", proposed name: "
+            + os.path.basename(action["target"])
+        )
+    return "No title found"
+
+
 def select_loop_type():
     """
     Function to allow user to select the loop mode, in the case of renaming all files in a directory.
@@ -371,155 +162,699 @@ def select_loop_type():
         sys.exit()
 
 
-def move_file(fullpath_src_file, destination_dir, dest_file):
-
-    if not os.path.isdir(destination_dir):
-        os.mkdir(os.path.join(destination_dir))
+def move_file(fullpath_src_file, destination_dir, dest_file, link_mode="move"):
 
     try:
-        # shutil.move(fullpath_src_file, destination_dir)
-        shutil.move(fullpath_src_file, os.path.join(destination_dir, dest_file))
+        os.makedirs(destination_dir, exist_ok=True)
+        place_file(fullpath_src_file, os.path.join(destination_dir, dest_file), link_mode)
     except OSError as e:
         logger.exception(e.strerror)
         logger.warning(
-            "File "
-            + fullpath_src_file
-            + " was not moved to "
-            + destination_dir
-            + "/auto_renamed_pdf"
+            "File %s was not moved to %s/auto_renamed_pdf",
+            fullpath_src_file,
+            destination_dir,
         )
+        return False
+    return True
 
 
-def search_candidate_title(src_dir, current_file):
+def search_candidate_title(src_dir, current_file, scan_options=None):
     """
     Generic function to search for one of the potential title candidates: based either on the metadata or on the font-size title
+    'scan_options' are extra keyword arguments passed to scan_title (e.g. clip_top)
     """
 
-    counter = 0
     # look for title in the pdf file, returns 2 potential candidates (meta data in pdf and bigger-font sentence)
-    meta_title, font_based_title = scan_title(src_dir + "/" + current_file)
-    logger.debug(
-        "get_title returned:  [meta_title]: "
-        + meta_title
-        + " [found_title]: "
-        + font_based_title
-    )
-
-    if len(font_based_title) > 0:
-        # if found_title > 0: then font-based title was found. use font_based_title.
-        return font_based_title
-    elif len(meta_title) > 0:
-        # if meta_title > 0: then metadata title was found. user chooses between meta_title and mined title
-        return meta_title
-    else:
-        logger.info("No potential Title was found for : " + current_file)
-        return None
+    meta_title, font_based_title = scan_title(
+        src_dir + "/" + current_file, **(scan_options or {})
+    )
+    return choose_candidate_title(meta_title, font_based_title, current_file)
 
 
-def rename_files_in_dir(base_dir):
+def read_file(scan_record, collect_stats=False):
     """
-    For each pdf file in base_dir,
-    searches for a potential title in the pdf document (metadata and font-size)
+    I/O stage of the pipeline, runs in a thread: reads the file once to compute its hash,
+    which also brings it into the page cache before it is parsed by a CPU worker.
+    if 'collect_stats', the stage timings are sent back in scan_record["timings"].
+    returns the updated 'scan_record'
     """
-    renamed_counter = 0
-    total_counter = 0
+    with collecting(collect_stats) as collector:
+        try:
+            scan_record["fingerprint"] = hash_file(scan_record["path"])
+        except OSError:
+            # gone since it was listed, handled when the record is committed
+            scan_record["fingerprint"] = None
+    if collector is not None:
+        scan_record["timings"] = collector.take_file_timings()
+    return scan_record
+
+
+def scan_file(scan_record, scan_options=None, collect_stats=False, near_duplicates=False):
+    """
+    worker function used by the process pool: scans the file for title candidates,
+    and hashes it from the same read if its hash will be needed and is not known yet
+    (scan_record["needs_hash"], see iter_scan_records and hash_and_scan).
+    if 'collect_stats', the stage timings are sent back in scan_record["timings"].
+    if 'near_duplicates', the signature of the text of the page is computed from the
+    same scan and sent back in scan_record["signature"] (see neardup.py).
+    returns the updated 'scan_record'
+    """
+    with collecting(collect_stats) as collector:
+        if scan_record["fingerprint"] is None and scan_record.get("needs_hash"):
+            scanned = hash_and_scan(
+                scan_record["path"], near_duplicates, **(scan_options or {})
+            )
+            scan_record["fingerprint"] = scanned[0]
+            scanned = scanned[1:]
+        else:
+            scanned = scan_title(
+                scan_record["path"], with_text=near_duplicates, **(scan_options or {})
+            )
+        scan_record["meta_title"], scan_record["font_based_title"] = scanned[:2]
+        if near_duplicates:
+            scan_record["signature"] = text_signature(scanned[2])
+    if collector is not None:
+        scan_record["timings"] = (
+            scan_record.get("timings", []) + collector.take_file_timings()
+        )
+    return scan_record
 
-    # file_fingerprints -> list of files (based on their hashes) used to avoid duplicated files.
-    #                      when a duplicated file is found it adds a 'dup' prefix to the file name
-    file_fingerprints = []
-    full_path_base_dir = os.path.abspath(base_dir)
 
-    if os.path.isdir(full_path_base_dir):
-        list_of_files = []
-        for file in os.listdir(full_path_base_dir):
-            if file.endswith(".pdf"):
-                logger.debug("adding file to the list: " + file)
-                list_of_files.append(file)
+def needs_scan(scan_record):
+    return (
+        scan_record["meta_title"] is None
+        and scan_record.get("failure") is None
+        and scan_record.get("archived") is None
+    )
+
+
+def needs_read(scan_record):
+    return needs_scan(scan_record) and scan_record["fingerprint"] is None
+
+
+def scan_failed(scan_record, reason):
+    scan_record["failure"] = reason
+    return scan_record
+
 
-        if len(list_of_files) < 1:
-            logger.info("no pdf files found in the target directory")
-            return renamed_counter, total_counter
+def scan_records_in_pool(
+    scan_records,
+    jobs,
+    io_threads=0,
+    io_depth=None,
+    cpu_depth=None,
+    scan_options=None,
+    timeout=None,
+    max_memory=None,
+    near_duplicates=False,
+    input_ready=None,
+):
+    """
+    scans the files of 'scan_records' using a pool of 'jobs' worker processes.
+    if a 'timeout' (seconds per file) or 'max_memory' (bytes per worker) is given, the
+    workers are supervised (see SupervisedPool): a file that makes its worker time out,
+    crash or raise gets its scan_record["failure"] set instead of stopping the run.
+    if io_threads > 0, the files are first read/hashed by a pool of 'io_threads' threads,
+    so reading the next files overlaps with parsing the current ones.
+    each stage keeps at most 'io_depth' / 'cpu_depth' files in flight, files whose titles
+    are already known (scan cache) go through without being read nor scanned.
+    yields the scan records in the same order as 'scan_records',
+    no matter in which order the workers finish, so the caller can take its decisions
+    (dedup, rename, move) exactly as in a serial run.
+    if the next record may take a while to come (files read from stdin), 'input_ready'
+    tells if it is there (see bounded_map), the scanned records do not wait for it.
+    """
+    import concurrent.futures
+
+    # timings are collected in the workers and merged by the caller
+    collect_stats = get_collector() is not None
+    if cpu_depth is None:
+        cpu_depth = 2 * jobs
+    if io_depth is None:
+        io_depth = 2 * io_threads
+    supervised_pool = None
+    cpu_executor = None
+    if timeout is not None or max_memory is not None:
+        supervised_pool = SupervisedPool(jobs, timeout, max_memory)
+    else:
+        cpu_executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+    io_executor = None
+    try:
+        if io_threads > 0:
+            io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=io_threads)
+            scan_records = bounded_map(
+                io_executor,
+                functools.partial(read_file, collect_stats=collect_stats),
+                scan_records,
+                io_depth,
+                skip=lambda scan_record: not needs_read(scan_record),
+                input_ready=input_ready,
+            )
+        scan_function = functools.partial(
+            scan_file,
+            scan_options=scan_options,
+            collect_stats=collect_stats,
+            near_duplicates=near_duplicates,
+        )
+        if supervised_pool is not None:
+            yield from supervised_pool.map(
+                scan_function,
+                scan_records,
+                cpu_depth,
+                skip=lambda scan_record: not needs_scan(scan_record),
+                on_failure=scan_failed,
+                input_ready=input_ready,
+            )
         else:
-            logger.info(
-                str(len(list_of_files)) + " files found in the target directory!"
+            yield from bounded_map(
+                cpu_executor,
+                scan_function,
+                scan_records,
+                cpu_depth,
+                skip=lambda scan_record: not needs_scan(scan_record),
+                input_ready=input_ready,
             )
-            loop_type = select_loop_type()
+    finally:
+        # drop pending work if the caller stops early (abort, Ctrl+C)
+        if io_executor is not None:
+            io_executor.shutdown(wait=True, cancel_futures=True)
+        if supervised_pool is not None:
+            supervised_pool.close()
+        else:
+            cpu_executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_scan_records(
+    full_path_base_dir,
+    cache=None,
+    walk_options=None,
+    skip_paths=None,
+    max_size=None,
+    quarantine=None,
+    archive_index=None,
+    shard=None,
+    claims=None,
+    pdf_files=None,
+):
+    """
+    yields a scan record for each pdf file found in 'full_path_base_dir' (see iter_pdf_files),
+    or for each of the 'pdf_files' if given (e.g. iter_listed_pdf_files):
+    {"file": name relative to the base dir, "path": full path, "stat": stat of the file,
+     "fingerprint", "meta_title", "font_based_title": from the scan cache, or None,
+     "needs_hash": see below}
+    files larger than 'max_size' bytes, or listed in the 'quarantine', are not scanned:
+    their record gets a "failure" (the reason) instead.
+    files whose content is already in the 'archive_index' get the path of the archived
+    copy in "archived" (they are only hashed if their size matches an archived file),
+    files that are themselves in the archive (--link-mode hardlink or symlink) are skipped.
+    "needs_hash" is set when the hash of the file will be needed, to find duplicates
+    (its size was already seen, or contents are claimed) or to add the file to the
+    'archive_index', so it can be hashed from the same read as the scan. the other
+    files are never hashed.
+    when several processes share the directory, only the files of the 'shard' (i, N)
+    and the files this process could claim (see WorkClaims) are yielded.
+    """
+    if pdf_files is None:
+        pdf_files = iter_pdf_files(
+            full_path_base_dir, skip_paths=skip_paths, **(walk_options or {})
+        )
+    # sizes of the files yielded so far, files with a unique size are never hashed
+    seen_sizes = set()
+    for relative_name, full_file_name, file_stat in pdf_files:
+        if shard is not None and not in_shard(relative_name, shard):
+            continue
+        if claims is not None:
+            if os.path.basename(full_file_name).startswith("duplicated_"):
+                # marked by another process
+                continue
+            if not claims.claim_file(full_file_name):
+                continue
+        needs_hash = (
+            claims is not None
+            or archive_index is not None
+            or file_stat.st_size in seen_sizes
+        )
+        seen_sizes.add(file_stat.st_size)
+        cached_scan = None
+        if cache is not None:
+            cached_scan = cache.get(full_file_name, file_stat)
+        fingerprint, meta_title, font_based_title = cached_scan or (None, None, None)
+        failure = None
+        if quarantine is not None and quarantine.contains(full_file_name, file_stat):
+            failure = QUARANTINED
+        elif max_size is not None and file_stat.st_size > max_size:
+            failure = "larger than " + str(max_size) + " bytes"
+        scan_record = {
+            "file": relative_name,
+            "path": full_file_name,
+            "stat": file_stat,
+            "cached": cached_scan,
+            "fingerprint": fingerprint,
+            "needs_hash": needs_hash,
+            "meta_title": meta_title,
+            "font_based_title": font_based_title,
+            "failure": failure,
+            "archived": None,
+        }
+        if (
+            failure is None
+            and archive_index is not None
+            and not look_up_archive(archive_index, scan_record)
+        ):
+            # the original of a hardlink or symlink placed by an earlier run
+            continue
+        yield scan_record
+
+
+def finish_interrupted_action(action):
+    """
+    looks at the file system to find how far an action of an interrupted run went,
+    and finishes it (or removes what it left if it can not be finished).
+    returns True if the action is complete, False if it never started (the file is
+    processed again by the new run).
+    """
+    source = action["source"]
+    if action["action"] != "rename":
+        return not os.path.exists(source)
+
+    target = action["target"]
+    link_mode = action.get("link_mode", "move")
+    partial_file = target + PARTIAL_SUFFIX
+    if os.path.exists(partial_file):
+        # copy across file systems cut before completion
+        os.remove(partial_file)
+    if not os.path.lexists(target):
+        # renamed in place but not moved yet, by a version renaming in two steps
+        renamed_file_name = os.path.dirname(source) + "/" + os.path.basename(target)
+        if os.path.exists(source) or not os.path.exists(renamed_file_name):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        place_file(renamed_file_name, target)
+        logger.info("Finished interrupted rename: %s", target)
+        return True
+    if link_mode == "move" and os.path.exists(source):
+        # the copy across file systems completed, the source was not removed yet
+        if os.path.getsize(source) != os.path.getsize(target):
+            return False
+        os.remove(source)
+        logger.info("Finished interrupted rename: %s", target)
+    return True
 
-            for current_file in list_of_files:
 
-                total_counter += 1
-                # use the hash of the file to avoir renaming files already renamed.
-                # avoiding duplications.
-                fingerprint = hash_file(full_path_base_dir + "/" + current_file)
-                logger.info("*" * 80)
-                logger.info("[Current file name] : " + current_file)
-                logger.debug("[Current file hash] : " + fingerprint)
-                logger.debug("[loop_type] : " + loop_type)
+def resume_journal(journal_file):
+    """
+    reads the journal of an interrupted run, finishes its half-done actions and
+    reopens it to go on appending to it.
+    returns (journal, completed) where 'completed' is the set of source paths
+    that must not be processed again.
+    """
+    completed, pending = read_journal(journal_file)
+    logger.info(
+        "Resuming interrupted run: "
+        + str(len(completed))
+        + " files done, "
+        + str(len(pending))
+        + " actions to check"
+    )
+    journal = Journal(journal_file)
+    for action in pending:
+        if finish_interrupted_action(action):
+            journal.done(action)
+            completed.add(action["source"])
+    return journal, completed
 
-                if loop_type == "2":
-                    answer = confirm_to_continue()
 
-                    if answer is False:
-                        continue
+def log_action(action):
+    logger.info(
+        "[%s] %s -> %s", action["action"], action["source"], action.get("target", "")
+    )
 
-                if fingerprint not in file_fingerprints:
-                    file_fingerprints.append(fingerprint)
-                    found_title = search_candidate_title(
-                        full_path_base_dir, current_file
-                    )
-                    if found_title is not None:
-                        renamed = do_rename(
-                            full_path_base_dir + "/" + current_file,
-                            full_path_base_dir + "/" + found_title,
-                        )
-                        if renamed:
-                            move_file(
-                                full_path_base_dir + "/" + found_title,
-                                full_path_base_dir + "/auto_renamed_pdf",
-                                found_title,
-                            )
-                            renamed_counter += 1
-                else:
-                    logger.warning(
-                        "Another file with the same content (hash) was found in the source directory!"
-                    )
-                    logger.info(
-                        "Skipping file: "
-                        + current_file
-                        + " adding prefix `duplicated_`to it"
-                    )
-                    os.rename(
-                        full_path_base_dir + "/" + current_file,
-                        full_path_base_dir + "/duplicated_" + current_file,
-                    )
 
-    else:
+def rename_files_in_dir(
+    base_dir,
+    jobs=1,
+    cache=None,
+    io_threads=0,
+    io_depth=None,
+    cpu_depth=None,
+    scan_options=None,
+    walk_options=None,
+    loop_type=None,
+    plan=None,
+    journal=None,
+    completed_paths=None,
+    link_mode="move",
+    timeout=None,
+    max_memory=None,
+    max_size=None,
+    quarantine=None,
+    archive_index=None,
+    near_duplicates=None,
+    events=None,
+    progress=None,
+    shard=None,
+    claims=None,
+    prefetch=PREFETCH_FILES,
+    listed_files=None,
+    read_ahead=None,
+):
+    """
+    For each pdf file in base_dir,
+    searches for a potential title in the pdf document (metadata and font-size)
+    files are processed as they are found, see iter_pdf_files for 'walk_options'
+    (recursive, include, exclude, max_depth).
+    if 'listed_files' (an iterable of paths, e.g. read_path_list) is given, its files are
+    processed as they come instead, renamed files still go to the output directory of
+    base_dir. with 'read_ahead' (e.g. paths read from stdin), the paths are read and
+    checked in a thread, at most 'read_ahead' files ahead: the files scanned by the pool
+    are handled while the next paths are awaited.
+    if jobs > 1 (or io_threads > 0), title scanning runs in a pool of 'jobs' processes,
+    fed by 'io_threads' reading threads (see scan_records_in_pool),
+    while dedup, renaming and counters are still handled here, in order.
+    if a scan cache is given, unchanged files reuse their cached hash and titles.
+    'scan_options' are extra keyword arguments passed to scan_title (e.g. clip_top)
+    'loop_type' is asked to the user if it is None (see select_loop_type). one by one
+    ("2"), the user confirms the proposed name of each file, while the next 'prefetch'
+    files are scanned in the background.
+    if a 'plan' list is given, nothing is renamed: the actions that would be applied
+    (see apply_action) are appended to it instead.
+    new names never collide: they are checked against an in-memory index of the names
+    found in the output directory and of the names given by this run.
+    if a 'journal' is given, each action is recorded in it before and after being applied,
+    and files listed in 'completed_paths' (done by an interrupted run) are skipped.
+    'link_mode' tells how renamed files are placed in the output directory (see LINK_MODES).
+    with a 'timeout' (seconds) or 'max_memory' (bytes), files are scanned in supervised
+    worker processes (see scan_records_in_pool). files that can not be scanned, or larger
+    than 'max_size' bytes, are skipped and added to the 'quarantine' (if given).
+    if an 'archive_index' (of the output directory) is given, files already archived are
+    handled as duplicates, and each renamed file is added to the index.
+    if 'near_duplicates' (a similarity between 0 and 1) is given, files whose first page
+    text is that similar to the text of a file seen before are handled as duplicates
+    too, even if their content differs (see neardup.py).
+    if an 'events' writer (see EventWriter) is given, a record of what was found and
+    done is written for each file, and a 'progress' display is updated after each file.
+    several processes (on several machines) can process the same directory together:
+    each one only takes the files of its 'shard' (i, N) and/or the files it claimed in
+    the shared 'claims' directory (see WorkClaims), where the content of the files is
+    claimed too, so duplicates are found across processes. new names are then placed
+    without ever replacing a file placed by another process.
+    """
+    renamed_counter = 0
+    total_counter = 0
+    cached_counter = 0
+
+    full_path_base_dir = os.path.abspath(base_dir)
+    output_dir = full_path_base_dir + "/" + OUTPUT_DIR_NAME
+    # files created by this run (or done by the run being resumed),
+    # they must not be picked up by the directory walk
+    created_paths = set(completed_paths or ())
+
+    if not os.path.isdir(full_path_base_dir):
         logger.error("Directory does not exist!")
+        return renamed_counter, total_counter
+
+    # pdf_files -> the files of 'listed_files', None to walk the directory
+    pdf_files = None
+    # input_ready -> tells if the next listed file is there
+    input_ready = None
+    if listed_files is not None:
+        pdf_files = iter_listed_pdf_files(listed_files, full_path_base_dir, created_paths)
+        if read_ahead is not None:
+            # the paths that are not files to scan are dropped by the thread, so
+            # the next file is only "ready" once a file to scan was read
+            pdf_files = ReadAhead(pdf_files, read_ahead)
+            input_ready = pdf_files.ready
+    scan_records = iter_scan_records(
+        full_path_base_dir,
+        cache,
+        walk_options,
+        created_paths,
+        max_size,
+        quarantine,
+        archive_index,
+        shard,
+        claims,
+        pdf_files,
+    )
+    first_record = next(scan_records, None)
+    if first_record is None:
+        logger.info("no pdf files found in the target directory")
+        return renamed_counter, total_counter
+
+    logger.info("pdf files found in the target directory!")
+    if loop_type is None:
+        loop_type = select_loop_type()
+    scan_records = itertools.chain([first_record], scan_records)
+    if progress is not None:
+        # the total is known once all the files of the run were found
+        scan_records = progress.counted(scan_records)
+    # committer -> finds the duplicates and the new names, and renames the files
+    committer = Committer(
+        output_dir,
+        link_mode,
+        scan_options,
+        archive_index,
+        near_duplicates,
+        claims,
+        cache,
+    )
+
+    # one by one, the next files are scanned while the user answers
+    prefetching = loop_type == "2" and prefetch > 0
+    if prefetching and cpu_depth is None:
+        cpu_depth = prefetch
+    # pool_records -> scan records coming from the pool, closed to drop the work in flight
+    pool_records = None
+    if (
+        prefetching
+        or jobs > 1
+        or io_threads > 0
+        or timeout is not None
+        or max_memory is not None
+    ):
+        logger.info(
+            "Scanning files using "
+            + str(jobs)
+            + " processes and "
+            + str(io_threads)
+            + " I/O threads"
+        )
+        pool_records = scan_records_in_pool(
+            scan_records,
+            jobs,
+            io_threads,
+            io_depth,
+            cpu_depth,
+            scan_options,
+            timeout,
+            max_memory,
+            near_duplicates is not None,
+            input_ready,
+        )
+        scan_records = pool_records
+
+    # run_stats -> stage timings of the run (--stats), None if they are not collected
+    run_stats = get_collector()
+    current_file = None
+    # event -> what was found and done for the current file (--events)
+    event = None
+
+    def end_file():
+        if claims is not None:
+            # the other processes skip this file from now on
+            claims.release_file(full_file_name)
+        durations = None
+        if run_stats is not None:
+            durations = run_stats.end_file(current_file)
+        if events is not None:
+            event["durations"] = durations
+            events.write(event)
+        if progress is not None:
+            progress.update()
+
+    # each file is ended (see end_file) as soon as it is handled, not when the next
+    # file comes, which may be much later when the files are read from a stream
+    for scan_record in scan_records:
+
+        if run_stats is not None:
+            run_stats.merge(scan_record.get("timings"))
+        total_counter += 1
+        current_file = scan_record["file"]
+        full_file_name = scan_record["path"]
+        if scan_record["cached"] is not None:
+            cached_counter += 1
+        logger.info(SEPARATOR)
+        logger.info("[Current file name] : %s", current_file)
+        logger.debug("[loop_type] : %s", loop_type)
+
+        failure = scan_record.get("failure")
+        if events is not None:
+            event = dict.fromkeys(EVENT_FIELDS)
+            event["path"] = full_file_name
+            event["failure"] = failure
+        if failure is not None:
+            logger.warning("Skipping file: %s (%s)", current_file, failure)
+            if quarantine is not None and failure != QUARANTINED:
+                quarantine.add(full_file_name, scan_record["stat"], failure)
+            end_file()
+            continue
+
+        action = committer.decide(scan_record)
+        if events is not None:
+            event.update(
+                {
+                    "hash": scan_record["fingerprint"],
+                    "meta_title": scan_record["meta_title"],
+                    "font_based_title": scan_record["font_based_title"],
+                    "title": scan_record["title"],
+                    "action": action["action"],
+                    "target": action.get("target"),
+                    "original": action.get("original"),
+                    "applied": False,
+                }
+            )
+        if loop_type == "2" and action["action"] != "skip":
+            try:
+                answer = confirm_to_continue(describe_action(action))
+            except SystemExit:
+                # aborted, the files scanned ahead are dropped
+                if pool_records is not None:
+                    pool_records.close()
+                raise
+
+            if answer is False:
+                # a skipped file is not the original of the next ones
+                committer.cancel(scan_record, action)
+                end_file()
+                continue
+
+        if action["action"] == "duplicate":
+            logger.info("Skipping file: %s adding prefix `duplicated_`to it", current_file)
+
+        if plan is not None:
+            plan.append(action)
+            if action["action"] == "rename":
+                renamed_counter += 1
+            end_file()
+            continue
+
+        try:
+            new_file_name = committer.apply(scan_record, action, journal)
+        except OSError as e:
+            logger.error("File not renamed: %s", e)
+            new_file_name = None
+        if events is not None:
+            event["applied"] = new_file_name is not None
+        if new_file_name is not None:
+            if action["action"] == "rename":
+                renamed_counter += 1
+            else:
+                created_paths.add(new_file_name)
+        end_file()
+
+    if cache is not None:
+        logger.info("%d files found in the scan cache", cached_counter)
 
     return renamed_counter, total_counter
 
 
-def rename_target_file(src_dir, filename):
+def apply_plan(plan_file, dry_run=False, assume_yes=False):
+    """
+    applies the actions of a plan written with --plan, without scanning the files again.
+    target names (new names and 'duplicated_' names) that got used since the plan was
+    written are skipped (checked against an in-memory index of each target directory,
+    listed once).
+    returns (renamed_counter, total_counter)
+    """
+    renamed_counter = 0
+    base_dir, actions = read_plan(plan_file)
+    logger.info(
+        str(len(actions)) + " actions found in the plan for directory " + base_dir
+    )
+
+    if dry_run:
+        for action in actions:
+            log_action(action)
+        return renamed_counter, len(actions)
+
+    if not assume_yes and not confirm_to_continue():
+        return renamed_counter, 0
+
+    # output directories (and directories of the duplicates) are created and listed
+    # once, not for each file
+    name_indexes = {}
+    for action in actions:
+        if action["action"] not in ("rename", "duplicate"):
+            continue
+        target_dir, target_name = os.path.split(action["target"])
+        if target_dir not in name_indexes:
+            os.makedirs(target_dir, exist_ok=True)
+            name_indexes[target_dir] = NameIndex.from_directory(target_dir)
+        if name_indexes[target_dir].reserve(target_name) != target_name:
+            logger.warning(
+                "Skipping %s, %s already exists", action["source"], action["target"]
+            )
+            continue
+
+        log_action(action)
+        try:
+            new_file_name = apply_action(action)
+        except OSError as e:
+            logger.warning("Could not apply action: %s", e)
+            continue
+        if action["action"] == "rename" and new_file_name is not None:
+            renamed_counter += 1
+
+    return renamed_counter, len(actions)
+
+
+def rename_target_file(
+    src_dir,
+    filename,
+    scan_options=None,
+    dry_run=False,
+    link_mode="move",
+    committer=None,
+):
     """
     For received a pdf file in the command line 'src_dir / filename',
     scans the file for a potential title in the pdf document (metadata and font-size)
     and call the method 'rename'
+    a long-running caller (--watch) keeps its 'committer' (see Committer) between files,
+    with the names of the output directory, the contents seen and the archive index:
+    a file with the same content as a file renamed before gets the 'duplicated_' prefix.
     """
 
     fullpath_filename = src_dir + "/" + filename
-    logger.debug("Searching file: " + fullpath_filename)
+    logger.debug("Searching file: %s", fullpath_filename)
     if os.path.isfile(fullpath_filename):
-        if os.path.abspath(fullpath_filename).endswith(".pdf"):
-            found_title = search_candidate_title(src_dir, filename)
-            if found_title is not None:
-                renamed = do_rename(fullpath_filename, src_dir + "/" + found_title)
-                if renamed:
-                    move_file(
-                        src_dir + "/" + found_title,
-                        src_dir + "/auto_renamed_pdf",
-                        found_title,
-                    )
-                    return True
+        if os.path.abspath(fullpath_filename).lower().endswith(".pdf"):
+            if committer is None:
+                committer = Committer(
+                    src_dir + "/" + OUTPUT_DIR_NAME, link_mode, scan_options
+                )
+            scan_record = next(
+                iter_scan_records(
+                    src_dir,
+                    archive_index=committer.archive_index,
+                    pdf_files=iter_listed_pdf_files([fullpath_filename], src_dir),
+                ),
+                None,
+            )
+            if scan_record is None:
+                # the original kept by an earlier run (--link-mode hardlink or symlink)
+                return False
+            action = committer.decide(scan_record)
+            if dry_run:
+                if action["action"] != "skip":
+                    log_action(action)
+                return False
+            try:
+                new_file_name = committer.apply(scan_record, action)
+            except OSError as e:
+                logger.error("File not renamed: %s", e)
+                return False
+            return action["action"] == "rename" and new_file_name is not None
         else:
             logger.debug("File is not a pdf!")
             return False
@@ -537,16 +872,473 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def watch_directory(
+    base_dir, scan_options=None, link_mode="move", debounce=DEBOUNCE_SECONDS,
+    queue_size=WATCH_QUEUE_SIZE, use_archive_index=True,
+):
+    """
+    long-running mode (--watch): renames each new pdf file of 'base_dir' once it is
+    completely written (see watch_pdf_files), the directory is never listed again.
+    files are renamed by a worker thread fed through a bounded queue, so events keep
+    being read while a file is scanned. runs until interrupted (Ctrl+C).
+    the worker keeps the names of the output directory and the contents seen (and the
+    archive index, unless 'use_archive_index' is unset) for the life of the watch, so
+    a paper dropped twice is marked as a duplicate, as in a directory run.
+    """
+    import queue
+    import threading
+
+    work_queue = queue.Queue(maxsize=queue_size)
+    output_dir = base_dir + "/" + OUTPUT_DIR_NAME
+
+    def rename_worker():
+        # sqlite connections stay in the thread that opened them
+        archive_index = None
+        if use_archive_index:
+            archive_index = open_archive_index(output_dir)
+        committer = Committer(output_dir, link_mode, scan_options, archive_index)
+        try:
+            while True:
+                full_file_name = work_queue.get()
+                if full_file_name is None:
+                    return
+                try:
+                    rename_target_file(
+                        os.path.dirname(full_file_name),
+                        os.path.basename(full_file_name),
+                        scan_options,
+                        link_mode=link_mode,
+                        committer=committer,
+                    )
+                except Exception:
+                    logger.exception("Could not rename %s", full_file_name)
+        finally:
+            if archive_index is not None:
+                archive_index.close()
+
+    new_files = watch_pdf_files(base_dir, debounce)
+    worker = threading.Thread(target=rename_worker, name="rename-worker")
+    worker.start()
+    logger.info("Watching " + base_dir + " for new pdf files, press Ctrl+C to stop")
+    try:
+        for full_file_name in new_files:
+            if os.path.basename(full_file_name).startswith("duplicated_"):
+                # marked by the worker, the rename shows up as a new file
+                continue
+            logger.info("[New file] : %s", full_file_name)
+            work_queue.put(full_file_name)
+    finally:
+        new_files.close()
+        # the files already queued are renamed before leaving
+        work_queue.put(None)
+        worker.join()
+
+
+def profile_target_file(
+    src_dir, filename, scan_options=None, dry_run=False, link_mode="move"
+):
+    """
+    runs rename_target_file under cProfile and prints the functions with the
+    highest cumulative time
+    """
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    renamed = profiler.runcall(
+        rename_target_file, src_dir, filename, scan_options, dry_run, link_mode
+    )
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(30)
+    return renamed
+
+
+def parse_title_order(text):
+    """
+    argparse type of --title-order: "metadata,font" -> ("metadata", "font")
+    """
+    title_order = tuple(strategy.strip() for strategy in text.split(","))
+    if not all(strategy in TITLE_STRATEGIES for strategy in title_order) or len(
+        set(title_order)
+    ) != len(title_order):
+        raise argparse.ArgumentTypeError(
+            "expected strategies among " + ", ".join(TITLE_STRATEGIES) + ", each once"
+        )
+    return title_order
+
+
+def scan_options_from_arguments(args):
+    """
+    extra keyword arguments for scan_title, from the command line arguments
+    """
+    scan_options = {}
+    if args.clip_top is not None:
+        scan_options["clip_top"] = args.clip_top
+    if args.title_order is not None:
+        scan_options["title_order"] = args.title_order
+    return scan_options
+
+
 def parse_arguments():
     parser = argparse.ArgumentParser(
         description="Rename scientific papers based on their titles inside of PDF files."
     )
     parser.add_argument(
-        "path", help="Path to a PDF file or a Directory containing PDF files."
+        "path",
+        nargs="?",
+        help="Path to a PDF file or a Directory containing PDF files.",
+    )
+    parser.add_argument(
+        "--plan",
+        metavar="PLAN_FILE",
+        help="Only scan the directory and write the renames to PLAN_FILE (json), "
+        "nothing is renamed.",
+    )
+    parser.add_argument(
+        "--apply",
+        metavar="PLAN_FILE",
+        help="Apply the renames of a PLAN_FILE written with --plan (no path needed).",
+    )
+    parser.add_argument(
+        "-y",
+        "--yes",
+        action="store_true",
+        help="Do not ask anything: rename all files without confirmation.",
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Show what would be renamed without renaming anything.",
+    )
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="Also rename the PDF files found in sub-directories.",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=None,
+        help="Maximum depth of sub-directories walked with --recursive (default: no limit).",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Only rename files whose name or relative path matches GLOB (repeatable).",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Skip files and directories whose name or relative path matches GLOB (repeatable).",
+    )
+    parser.add_argument(
+        "--from-stdin",
+        action="store_true",
+        help="Rename the PDF files listed on stdin (one path per line) as they are read,"
+        " instead of the files of a directory. Renamed files go to the output directory"
+        " of 'path' (default: the current directory), nothing is asked.",
+    )
+    parser.add_argument(
+        "-0",
+        "--null",
+        action="store_true",
+        help="The paths listed on stdin are separated by NUL characters (e.g. the output"
+        " of 'find -print0'), implies --from-stdin.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to scan files in a directory "
+        "(default: 1, 0 uses all available CPUs).",
+    )
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        default=0,
+        help="Number of threads reading/hashing files ahead of the scanning processes, "
+        "overlapping disk/network I/O with PDF parsing (default: 0, disabled).",
+    )
+    parser.add_argument(
+        "--io-depth",
+        type=int,
+        default=None,
+        help="Maximum number of files in flight in the I/O stage (default: 2 x io-threads).",
+    )
+    parser.add_argument(
+        "--cpu-depth",
+        type=int,
+        default=None,
+        help="Maximum number of files in flight in the scanning stage (default: 2 x jobs).",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=PREFETCH_FILES,
+        metavar="N",
+        help="In one-by-one mode, number of files scanned ahead while you confirm the"
+        " current one (default: " + str(PREFETCH_FILES) + ", 0 to scan each file only"
+        " when it comes).",
+    )
+    parser.add_argument(
+        "--clip-top",
+        type=float,
+        default=None,
+        metavar="FRACTION",
+        help="Only extract the top FRACTION of the first page (e.g. 0.4) when looking "
+        "for the title, the full page is used if nothing is found there or if the"
+        " title found reaches the bottom of that part.",
+    )
+    parser.add_argument(
+        "--title-order",
+        type=parse_title_order,
+        default=None,
+        metavar="STRATEGIES",
+        help="Comma-separated ways to find the title, in the order they are tried:"
+        " 'metadata' (the pdf metadata title, when it looks like a real title, without"
+        " parsing any page) and 'font' (largest font of the first page)."
+        " Default: font,metadata.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run on the same directory: files it already handled "
+        "are skipped and half-done renames are finished or rolled back.",
+    )
+    parser.add_argument(
+        "--discard-journal",
+        action="store_true",
+        help="Start a new run even if a run on the same directory was interrupted,"
+        " forgetting what it did (see --resume).",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="DIR",
+        help="Keep running and rename each new PDF file written or moved into DIR,"
+        " as soon as it is complete (Linux inotify).",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEBOUNCE_SECONDS,
+        metavar="SECONDS",
+        help="With --watch, time a new file must stay unchanged before it is renamed"
+        " (default: " + str(DEBOUNCE_SECONDS) + ").",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Scan each file in a supervised worker process, killed (and the file"
+        " quarantined) if it takes more than SECONDS.",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="Limit the address space of each supervised worker process to MB megabytes,"
+        " a file that needs more is quarantined.",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="Do not scan files larger than MB megabytes, they are quarantined.",
+    )
+    parser.add_argument(
+        "--quarantine",
+        metavar="FILE",
+        help="File listing the files that could not be scanned, which are skipped by the"
+        " next runs (default: " + QUARANTINE_FILE_NAME + " in the target directory,"
+        " with --timeout, --max-memory or --max-size).",
+    )
+    parser.add_argument(
+        "--link-mode",
+        choices=LINK_MODES,
+        default="move",
+        help="How renamed files are placed in the output directory: moved (default),"
+        " or hard linked, symlinked or reflinked (copy-on-write clone), keeping the"
+        " original file.",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Show per-stage timings (p50/p95/max) and the slowest files at the end of the run.",
+    )
+    parser.add_argument(
+        "--stats-json",
+        metavar="JSON_FILE",
+        help="Write the per-stage timings and the slowest files to JSON_FILE.",
+    )
+    parser.add_argument(
+        "--slowest",
+        type=int,
+        default=10,
+        metavar="N",
+        help="Number of slowest files reported by --stats/--stats-json (default: 10).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the processing of a single PDF file with cProfile.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use the persistent scan cache (hashes and titles of unchanged files).",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="Discard the persistent scan cache and rebuild it during this run.",
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="Only log warnings and errors.",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Show a progress line (files done, files/s and ETA) on stderr, best used"
+        " with --quiet.",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="Process only the files of shard I (0 to N-1) out of N, so N processes or"
+        " machines sharing the directory split it between them.",
+    )
+    parser.add_argument(
+        "--claim",
+        action="store_true",
+        help="Process the files not claimed yet by another process sharing the directory"
+        " (claims are files of --claim-dir, created atomically).",
+    )
+    parser.add_argument(
+        "--claim-dir",
+        metavar="DIR",
+        help="Claim directory shared by the processes, with --shard or --claim (default: "
+        + CLAIM_DIR_NAME
+        + " in the target directory).",
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=LEASE_SECONDS,
+        metavar="SECONDS",
+        help="Seconds after which the claim of a file is taken over by another process,"
+        " its process being considered dead (default: " + str(LEASE_SECONDS) + ").",
+    )
+    parser.add_argument(
+        "--events",
+        metavar="JSONL_FILE",
+        help="Write one json record per file of a directory (path, hash, title candidates,"
+        " chosen title, action, stage durations) to JSONL_FILE ('-' for stdout).",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Do not use the content index of the output directory to detect files"
+        " already archived (see 'sci-paper-rename reindex').",
+    )
+    parser.add_argument(
+        "--near-duplicates",
+        action="store_true",
+        help="Also handle as duplicates the files whose first page text is nearly the same"
+        " as another file (e.g. two versions of a paper), see --similarity.",
+    )
+    parser.add_argument(
+        "--similarity",
+        type=float,
+        default=SIMILARITY_THRESHOLD,
+        help="Similarity (between 0 and 1) of the first page text above which files are"
+        " near-duplicates (default: " + str(SIMILARITY_THRESHOLD) + ").",
     )
 
     args = parser.parse_args()
 
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive number")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.max_depth is not None and args.max_depth < 0:
+        parser.error("--max-depth must be 0 or a positive number")
+    if args.io_threads < 0:
+        parser.error("--io-threads must be 0 or a positive number")
+    if args.prefetch < 0:
+        parser.error("--prefetch must be 0 or a positive number")
+    if args.clip_top is not None and not 0 < args.clip_top <= 1:
+        parser.error("--clip-top must be a fraction between 0 and 1")
+    for depth in (args.io_depth, args.cpu_depth):
+        if depth is not None and depth < 1:
+            parser.error("--io-depth and --cpu-depth must be positive numbers")
+
+    if args.timeout is not None and args.timeout <= 0:
+        parser.error("--timeout must be a positive number")
+    for limit in (args.max_memory, args.max_size):
+        if limit is not None and limit < 1:
+            parser.error("--max-memory and --max-size must be positive numbers")
+    if args.debounce < 0:
+        parser.error("--debounce must be 0 or a positive number")
+    if not 0 < args.similarity <= 1:
+        parser.error("--similarity must be a number between 0 and 1")
+    if args.shard is not None:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError:
+            parser.error("--shard must be I/N with 0 <= I < N")
+    if args.lease <= 0:
+        parser.error("--lease must be a positive number")
+    if args.resume and args.discard_journal:
+        parser.error("--resume and --discard-journal can not be used together")
+    shared = args.shard is not None or args.claim
+    if shared and (
+        args.plan is not None
+        or args.dry_run
+        or args.apply is not None
+        or args.watch is not None
+    ):
+        parser.error(
+            "--shard and --claim can not be used with --plan, --dry-run, --apply or --watch"
+        )
+
+    if args.null:
+        args.from_stdin = True
+    if args.from_stdin:
+        if args.apply is not None or args.watch is not None or args.profile:
+            parser.error("--from-stdin can not be used with --apply, --watch or --profile")
+        if args.recursive or args.max_depth is not None or args.include or args.exclude:
+            parser.error(
+                "--from-stdin can not be used with --recursive, --max-depth, --include"
+                " or --exclude"
+            )
+        if args.path is None:
+            args.path = os.curdir
+
+    if args.apply is not None:
+        if args.path is not None or args.plan is not None:
+            parser.error("--apply takes no path and can not be used with --plan")
+        return "", "", args
+    if args.watch is not None:
+        if args.path is not None or args.plan is not None:
+            parser.error("--watch takes no path and can not be used with --plan")
+        if not os.path.isdir(args.watch):
+            parser.error("--watch needs an existing directory")
+        return os.path.abspath(args.watch), "", args
+    if args.path is None:
+        parser.error("the following arguments are required: path")
+
     path = os.path.abspath(args.path)
     base_dir = ""
     filename = ""
@@ -554,7 +1346,7 @@ def parse_arguments():
     if os.path.exists(path):
         if os.path.isdir(path):
             base_dir = path
-        elif os.path.isfile(path) and path.endswith(".pdf"):
+        elif os.path.isfile(path) and path.lower().endswith(".pdf"):
             base_dir = os.path.dirname(path)
             filename = os.path.basename(path)
         else:
@@ -564,30 +1356,389 @@ def parse_arguments():
         logger.error(f"Directory or file [{args.path}] path does not exist!")
         sys.exit(1)
 
-    return base_dir, filename
+    if args.plan is not None and filename:
+        parser.error("--plan needs a directory")
+    if shared and filename:
+        parser.error("--shard and --claim need a directory")
+    if args.from_stdin and filename:
+        parser.error("--from-stdin needs a directory (where renamed files go)")
+    if args.profile and not filename:
+        parser.error("--profile needs a single PDF file")
+
+    return base_dir, filename, args
+
+
+def open_scan_cache(rebuild=False, scan_options=None):
+    """
+    opens the persistent scan cache, the run goes on without cache if it can not be opened
+    cached titles are only reused if they were found with the same 'scan_options'
+    and the same version of the title selector
+    """
+    import sqlite3
+    from .cache import ScanCache
+
+    scan_key = repr(sorted((scan_options or {}).items())) + " " + TITLE_SELECTOR_VERSION
+    try:
+        return ScanCache(rebuild=rebuild, scan_key=scan_key)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("Scan cache disabled, it could not be opened: " + str(e))
+        return None
+
+
+def open_journal(base_dir, resume=False, discard=False):
+    """
+    opens the journal of the run in 'base_dir', resuming the journal of an interrupted run
+    if 'resume' is set. the journal of an interrupted run is only replaced by a new one
+    if 'discard' is set, the program exits otherwise.
+    returns (journal, completed_paths), the journal is None if it can not be written.
+    """
+    journal_file = journal_path(base_dir)
+    try:
+        if os.path.exists(journal_file):
+            if resume:
+                return resume_journal(journal_file)
+            if not discard:
+                logger.error(
+                    "A previous run in this directory was interrupted, use --resume to go"
+                    " on with it, or --discard-journal to start a new run."
+                )
+                sys.exit(1)
+            logger.warning("Discarding the journal of the interrupted run.")
+        elif resume:
+            logger.info("No interrupted run to resume, starting a new run.")
+        return Journal(journal_file, truncate=True), None
+    except OSError as e:
+        logger.warning("Journal disabled, it could not be opened: " + str(e))
+        return None, None
+
+
+def open_archive_index(archive_dir, create=True):
+    """
+    opens the content index of the archive 'archive_dir' (output directory), the run goes
+    on without it if it can not be opened. with 'create' unset, an archive without
+    index is not given one (nothing must be written, e.g. --plan or --dry-run).
+    """
+    import sqlite3
+    from .archive import INDEX_FILE_NAME, ArchiveIndex
+
+    if not create and not os.path.exists(os.path.join(archive_dir, INDEX_FILE_NAME)):
+        return None
+    try:
+        return ArchiveIndex(archive_dir)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("Archive index disabled, it could not be opened: " + str(e))
+        return None
+
+
+def reindex_archive(arguments):
+    """
+    'reindex' command: sci-paper-rename reindex DIR
+    brings the content index of the archive of DIR (DIR/auto_renamed_pdf, or DIR itself
+    if it is an output directory) in line with its files
+    """
+    parser = argparse.ArgumentParser(
+        prog="sci-paper-rename reindex",
+        description="Update the content index of an archive (output directory),"
+        " hashing only new or changed files.",
+    )
+    parser.add_argument("path", help="Directory renamed before, or its output directory.")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Drop the index and hash every file again."
+    )
+    args = parser.parse_args(arguments)
+    archive_dir = os.path.abspath(args.path)
+    if os.path.basename(archive_dir) != OUTPUT_DIR_NAME:
+        archive_dir = os.path.join(archive_dir, OUTPUT_DIR_NAME)
+    if not os.path.isdir(archive_dir):
+        parser.error("no archive found: " + archive_dir)
+
+    import sqlite3
+    from .archive import ArchiveIndex
+
+    try:
+        archive_index = ArchiveIndex(archive_dir, rebuild=args.rebuild)
+        try:
+            hashed, removed = archive_index.reindex(hash_file)
+        finally:
+            archive_index.close()
+    except (OSError, sqlite3.Error) as e:
+        logger.error("Could not index " + archive_dir + ": " + str(e))
+        sys.exit(1)
+    logger.info(
+        "Archive indexed: "
+        + archive_dir
+        + " => Hashed files: "
+        + str(hashed)
+        + " Removed entries: "
+        + str(removed)
+    )
+
+
+def parse_serve_arguments(arguments):
+    """
+    arguments of the 'serve' command: sci-paper-rename serve --socket PATH [...]
+    """
+    from .server import MAX_BATCH, MAX_REQUESTS
+
+    parser = argparse.ArgumentParser(
+        prog="sci-paper-rename serve",
+        description="Serve PDF titles (scan_title candidates) as json over a Unix socket.",
+    )
+    parser.add_argument(
+        "--socket", required=True, metavar="PATH", help="Path of the Unix socket."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of worker processes scanning the files (default: 0, one per CPU).",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=MAX_REQUESTS,
+        metavar="N",
+        help="Requests scanned at the same time, the next ones are answered 'busy'"
+        " (default: " + str(MAX_REQUESTS) + ").",
+    )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=MAX_BATCH,
+        metavar="N",
+        help="Maximum number of files in a request (default: " + str(MAX_BATCH) + ").",
+    )
+    parser.add_argument(
+        "--clip-top",
+        type=float,
+        default=None,
+        metavar="FRACTION",
+        help="Extract only the top FRACTION of the first page when looking for the title.",
+    )
+    parser.add_argument(
+        "--title-order",
+        type=parse_title_order,
+        default=None,
+        metavar="STRATEGIES",
+        help="Comma-separated ways to find the title, in the order they are tried:"
+        " 'metadata' (the pdf metadata title, when it looks like a real title, without"
+        " parsing any page) and 'font' (largest font of the first page)."
+        " Default: font,metadata.",
+    )
+    args = parser.parse_args(arguments)
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive number")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.max_requests < 1 or args.max_batch < 1:
+        parser.error("--max-requests and --max-batch must be positive numbers")
+    if args.clip_top is not None and not 0 < args.clip_top <= 1:
+        parser.error("--clip-top must be a fraction between 0 and 1")
+    return args
 
 
 def main():
 
-    print_header()
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from .server import serve
+
+        args = parse_serve_arguments(sys.argv[2:])
+        scan_options = scan_options_from_arguments(args)
+        signal.signal(signal.SIGINT, keyboardInterruptHandler)
+        try:
+            serve(args.socket, args.jobs, scan_options, args.max_requests, args.max_batch)
+        except OSError as e:
+            logger.error("Could not serve on " + args.socket + ": " + str(e))
+            sys.exit(1)
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == "reindex":
+        reindex_archive(sys.argv[2:])
+        return
+
     # validade arguments passed in the command line
     # base_dir, filename = validate_arguments(sys.argv)
     # use argparse instead of sys.argv
-    base_dir, filename = parse_arguments()
+    base_dir, filename, args = parse_arguments()
+    if args.quiet:
+        # only warnings and errors, the info messages are not even formatted
+        logging.getLogger().setLevel(logging.WARNING)
+    print_header()
 
     # set handler to capture the 'control+C' interruption from keyboard
     signal.signal(signal.SIGINT, keyboardInterruptHandler)
 
+    if args.apply is not None:
+        logger.info("[Plan]: " + args.apply)
+        rename_counter, total_counter = apply_plan(
+            args.apply, args.dry_run, args.yes
+        )
+        logger.info("*" * 80)
+        logger.info(
+            "Finished => Total actions: "
+            + str(total_counter)
+            + " Renamed files: "
+            + str(rename_counter)
+        )
+        return
+
+    if args.watch is not None:
+        scan_options = scan_options_from_arguments(args)
+        try:
+            watch_directory(
+                base_dir,
+                scan_options,
+                args.link_mode,
+                args.debounce,
+                use_archive_index=not args.no_index,
+            )
+        except OSError as e:
+            logger.error("Could not watch " + base_dir + ": " + str(e))
+            sys.exit(1)
+        return
+
     # target path is either a (full path) directory or (full path) file name
     target_path = base_dir + "/" + filename
     logger.info("[Target Path]: " + target_path)
 
     rename_counter = 0
+    # extra keyword arguments for scan_title
+    scan_options = scan_options_from_arguments(args)
+    # run_stats -> per-stage timings (--stats / --stats-json)
+    run_stats = None
+    if args.stats or args.stats_json is not None:
+        run_stats = RunStats(args.slowest)
+        set_collector(run_stats)
 
     if os.path.isdir(target_path):
         # target is directory
         logger.debug("[base_dir]: " + base_dir)
-        rename_counter, total_counter = rename_files_in_dir(base_dir)
+        # planned actions, when nothing must be renamed (--plan or --dry-run)
+        plan = None
+        if args.plan is not None or args.dry_run:
+            plan = []
+        # no prompt when the run is not interactive, or when stdin is the list of files
+        loop_type = None
+        if args.yes or plan is not None or args.from_stdin:
+            loop_type = "1"
+        # listed_files -> paths read from stdin as they come (--from-stdin)
+        listed_files = None
+        if args.from_stdin:
+            separator = b"\0" if args.null else b"\n"
+            # read by a thread (see rename_files_in_dir), so results never wait for
+            # the next path. the thread blocks in a read holding the lock of its
+            # stream: it has its own stream over the descriptor, sys.stdin is closed
+            # by the forked pool workers
+            stdin_stream = open(sys.stdin.fileno(), "rb", closefd=False)
+            listed_files = read_path_list(stdin_stream, separator)
+        cache = None
+        if not args.no_cache:
+            cache = open_scan_cache(args.rebuild_cache, scan_options)
+        # claims -> shared with the other processes (--shard / --claim)
+        claims = None
+        if args.shard is not None or args.claim:
+            claim_dir = args.claim_dir or os.path.join(base_dir, CLAIM_DIR_NAME)
+            try:
+                claims = WorkClaims(claim_dir, args.claim, args.lease)
+            except OSError as e:
+                logger.error("Could not open the claim directory: " + str(e))
+                sys.exit(1)
+        archive_index = None
+        # the sqlite index can not be shared between machines, the claims of the
+        # contents find the duplicates instead
+        if not args.no_index and claims is None:
+            archive_index = open_archive_index(
+                base_dir + "/" + OUTPUT_DIR_NAME, create=plan is None
+            )
+        journal = None
+        completed_paths = None
+        # a file left by a process that died is taken over by another one once its
+        # claim expires, there is no journal to resume
+        if plan is None and claims is None:
+            journal, completed_paths = open_journal(
+                base_dir, args.resume, args.discard_journal
+            )
+        quarantine = None
+        max_memory = None
+        max_size = None
+        if args.max_memory is not None:
+            max_memory = args.max_memory * 1024 * 1024
+        if args.max_size is not None:
+            max_size = args.max_size * 1024 * 1024
+        if args.quarantine is not None or (
+            args.timeout is not None or max_memory is not None or max_size is not None
+        ):
+            quarantine = Quarantine(
+                args.quarantine or os.path.join(base_dir, QUARANTINE_FILE_NAME)
+            )
+        walk_options = {
+            "recursive": args.recursive,
+            "include": args.include,
+            "exclude": args.exclude,
+            "max_depth": args.max_depth,
+        }
+        events = None
+        if args.events is not None:
+            try:
+                events = EventWriter(args.events)
+            except OSError as e:
+                logger.error("Could not write the events: " + str(e))
+                sys.exit(1)
+            if run_stats is None:
+                # the durations of the stages of each file are part of the events
+                run_stats = RunStats(args.slowest)
+                set_collector(run_stats)
+        progress = None
+        if args.progress:
+            progress = Progress()
+        finished = False
+        try:
+            rename_counter, total_counter = rename_files_in_dir(
+                base_dir,
+                jobs=args.jobs,
+                cache=cache,
+                io_threads=args.io_threads,
+                io_depth=args.io_depth,
+                cpu_depth=args.cpu_depth,
+                scan_options=scan_options,
+                walk_options=walk_options,
+                loop_type=loop_type,
+                plan=plan,
+                journal=journal,
+                completed_paths=completed_paths,
+                link_mode=args.link_mode,
+                timeout=args.timeout,
+                max_memory=max_memory,
+                max_size=max_size,
+                quarantine=quarantine,
+                archive_index=archive_index,
+                near_duplicates=args.similarity if args.near_duplicates else None,
+                events=events,
+                progress=progress,
+                shard=args.shard,
+                claims=claims,
+                prefetch=args.prefetch,
+                listed_files=listed_files,
+                read_ahead=STDIN_READ_AHEAD if args.from_stdin else None,
+            )
+            finished = True
+        finally:
+            if progress is not None:
+                progress.close()
+            if events is not None:
+                events.close()
+            if cache is not None:
+                cache.close()
+            if archive_index is not None:
+                archive_index.close()
+            if journal is not None:
+                # the journal is only kept if the run was interrupted
+                journal.close(remove=finished)
+        if args.plan is not None:
+            write_plan(args.plan, base_dir, plan)
+        elif plan is not None:
+            for action in plan:
+                log_action(action)
         logger.info("*" * 80)
         logger.info(
             "Finished => Total files: "
@@ -600,14 +1751,31 @@ def main():
         # target is a file
         logger.debug("[base_dir]: " + base_dir)
         logger.debug("[filename]: " + filename)
-        renamed = rename_target_file(base_dir, filename)
+        if args.profile:
+            renamed = profile_target_file(
+                base_dir, filename, scan_options, args.dry_run, args.link_mode
+            )
+        else:
+            renamed = rename_target_file(
+                base_dir, filename, scan_options, args.dry_run, args.link_mode
+            )
         logger.debug("Renamed? : " + str(renamed))
         if renamed:
             rename_counter += 1
+        if run_stats is not None:
+            run_stats.end_file(filename)
 
         logger.info("*" * 80)
         logger.info("Finished => Renamed files : " + str(rename_counter))
 
+    if run_stats is not None:
+        set_collector(None)
+        if args.stats:
+            run_stats.log_summary()
+        if args.stats_json is not None:
+            run_stats.write_json(args.stats_json)
+            logger.info("Stats written to: " + args.stats_json)
+
 
 # if __name__ == "__main__":
 #    main()
@@ -0,0 +1,187 @@
+import os
+import logging
+import functools
+import collections
+
+from .scan import hash_and_scan, scan_title, choose_candidate_title
+from .commit import Committer, look_up_archive
+from .pipeline import bounded_map
+
+logger = logging.getLogger(__name__)
+
+# library api: everything runs in the calling process (or in the executor it gives),
+# errors are raised or returned, never turned into sys.exit, and nothing is asked
+# to the user, so a long-running service can process any number of files.
+
+# title found for 'path': 'title' is the chosen one (None if nothing was found),
+# 'error' is the exception raised while scanning the file (the other fields are None)
+TitleResult = collections.namedtuple(
+    "TitleResult", ["path", "title", "meta_title", "font_based_title", "error"]
+)
+# what rename_batch did with 'source': 'action' is "rename", "duplicate", "skip"
+# (no title found) or "error" ('error' then holds the exception)
+RenameResult = collections.namedtuple(
+    "RenameResult", ["action", "source", "target", "original", "error"]
+)
+
+
+def extract_title(path, **scan_options):
+    """
+    scans one pdf file, returns its TitleResult.
+    raises OSError, ScanError or the PyMuPDF exception if the file can not be scanned.
+    'scan_options' are passed to scan_title (e.g. clip_top)
+    """
+    meta_title, font_based_title = scan_title(path, **scan_options)
+    title = choose_candidate_title(meta_title, font_based_title, path)
+    return TitleResult(path, title, meta_title, font_based_title, None)
+
+
+def _extract_title_result(path, scan_options=None):
+    try:
+        return extract_title(path, **(scan_options or {}))
+    except Exception as e:
+        return TitleResult(path, None, None, None, e)
+
+
+def extract_titles(paths, scan_options=None, executor=None, depth=None):
+    """
+    yields the TitleResult of each file of 'paths' (any iterable, consumed lazily),
+    in the same order. a file that can not be scanned does not stop the batch,
+    its result holds the error.
+    if an 'executor' is given (e.g. a ProcessPoolExecutor kept by the caller), the files
+    are scanned there, at most 'depth' (default: 2 per cpu) at a time.
+    """
+    function = functools.partial(_extract_title_result, scan_options=scan_options)
+    if executor is None:
+        for path in paths:
+            yield function(path)
+        return
+    if depth is None:
+        depth = 2 * (os.cpu_count() or 1)
+    yield from bounded_map(executor, function, paths, depth)
+
+
+def _scan_titles(scan_record, scan_options=None):
+    try:
+        if scan_record["needs_hash"]:
+            scanned = hash_and_scan(scan_record["path"], **(scan_options or {}))
+            scan_record["fingerprint"] = scanned[0]
+            scanned = scanned[1:]
+        else:
+            scanned = scan_title(scan_record["path"], **(scan_options or {}))
+        scan_record["meta_title"], scan_record["font_based_title"] = scanned
+    except Exception as e:
+        scan_record["failure"] = e
+    return scan_record
+
+
+def _needs_scan(item):
+    return (
+        isinstance(item, dict)
+        and item["failure"] is None
+        and item["archived"] is None
+    )
+
+
+def _scan_records(paths, archive_index=None):
+    """
+    yields the scan record (see Committer) of each file of 'paths', or its RenameResult
+    if there is nothing to scan (the file is gone, or is an archived file itself)
+    """
+    for path in paths:
+        full_file_name = os.path.abspath(path)
+        try:
+            file_stat = os.stat(full_file_name)
+        except OSError as e:
+            yield RenameResult("error", full_file_name, None, None, e)
+            continue
+        scan_record = {
+            "file": path,
+            "path": full_file_name,
+            "stat": file_stat,
+            "fingerprint": None,
+            # renamed files are added to the archive index with their hash
+            "needs_hash": archive_index is not None,
+            "meta_title": None,
+            "font_based_title": None,
+            "failure": None,
+            "archived": None,
+        }
+        if archive_index is not None and not look_up_archive(archive_index, scan_record):
+            yield RenameResult("skip", full_file_name, None, None, None)
+            continue
+        yield scan_record
+
+
+def rename_batch(
+    paths,
+    output_dir=None,
+    link_mode="move",
+    dry_run=False,
+    scan_options=None,
+    executor=None,
+    depth=None,
+    archive_index=None,
+):
+    """
+    renames the pdf files of 'paths' after their titles, as the command line does
+    (see Committer): each file is placed in 'output_dir' (default: auto_renamed_pdf
+    next to the file) following 'link_mode' (see LINK_MODES), new names never collide
+    nor replace an existing file, even one placed by another process, and files with
+    the same content as a file seen before get a 'duplicated_' prefix in place.
+    with an 'archive_index' (the ArchiveIndex of 'output_dir', which must be given),
+    files already archived are duplicates too, and renamed files are added to it.
+    yields a RenameResult per file, in order. with 'dry_run', nothing is changed and
+    the results tell what would be done. see extract_titles for 'executor' and 'depth',
+    without executor a file is only scanned if it is not a duplicate.
+    """
+    if archive_index is not None and output_dir is None:
+        raise ValueError("an archive_index needs the output_dir it indexes")
+    # a service may run next to other processes placing files
+    committer = Committer(
+        output_dir, link_mode, scan_options, archive_index, exclusive=True
+    )
+    scan_records = _scan_records(paths, archive_index)
+    if executor is not None:
+        if depth is None:
+            depth = 2 * (os.cpu_count() or 1)
+        scan_records = bounded_map(
+            executor,
+            functools.partial(_scan_titles, scan_options=scan_options),
+            scan_records,
+            depth,
+            skip=lambda item: not _needs_scan(item),
+        )
+    for scan_record in scan_records:
+        if isinstance(scan_record, RenameResult):
+            yield scan_record
+            continue
+        source = scan_record["path"]
+        if scan_record["failure"] is not None:
+            yield RenameResult("error", source, None, None, scan_record["failure"])
+            continue
+        try:
+            action = committer.decide(scan_record)
+        except Exception as e:
+            yield RenameResult("error", source, None, None, e)
+            continue
+        if action["action"] == "skip":
+            yield RenameResult("skip", source, None, None, None)
+            continue
+        if dry_run:
+            yield RenameResult(
+                action["action"], source, action["target"], action.get("original"), None
+            )
+            continue
+        try:
+            new_file_name = committer.apply(scan_record, action)
+        except OSError as e:
+            yield RenameResult("error", source, action["target"], None, e)
+            continue
+        if new_file_name is None:
+            # already named after its title
+            yield RenameResult("skip", source, None, None, None)
+            continue
+        yield RenameResult(
+            action["action"], source, new_file_name, action.get("original"), None
+        )
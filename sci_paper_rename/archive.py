@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# bump this number whenever the layout of the index changes
+INDEX_SCHEMA_VERSION = 4
+# the index of an archive (output directory) is kept inside it
+INDEX_FILE_NAME = ".sci-paper-rename-index.sqlite3"
+# number of writes grouped in a single transaction
+COMMIT_EVERY = 500
+
+
+class ArchiveIndex:
+    """
+    persistent content index of an archive (the output directory of the renamed files):
+    file name in the archive -> full hash, title, size and mtime_ns, looked up by hash
+    (several files of the archive may have the same content), and the full path of the
+    original file when it was kept outside of the archive (copied or linked), and the
+    MinHash signature of its first page text (see neardup.py), if it was computed.
+    it is updated for each file placed in the archive, so new files can be checked
+    against the whole archive without hashing it again: a file whose size matches no
+    archived file is never hashed for it, otherwise a single lookup by hash is enough.
+    """
+
+    def __init__(self, archive_dir, rebuild=False):
+        self.archive_dir = archive_dir
+        self.db_path = os.path.join(archive_dir, INDEX_FILE_NAME)
+        self.pending_writes = 0
+        os.makedirs(archive_dir, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if rebuild or version != INDEX_SCHEMA_VERSION:
+            logger.debug("(re)building archive index: %s", self.db_path)
+            self.conn.execute("DROP TABLE IF EXISTS archive_old")
+            if rebuild or not self._has_table("archive"):
+                self.conn.execute("DROP TABLE IF EXISTS archive")
+            else:
+                # the entries are kept, the files of the archive are not hashed again
+                self.conn.execute("ALTER TABLE archive RENAME TO archive_old")
+            self.conn.execute("DROP INDEX IF EXISTS archive_size")
+            self.conn.execute("DROP INDEX IF EXISTS archive_name")
+            self.conn.execute("PRAGMA user_version = " + str(INDEX_SCHEMA_VERSION))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS archive ("
+            " name TEXT PRIMARY KEY,"
+            " fingerprint TEXT NOT NULL,"
+            " title TEXT,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " source TEXT,"
+            " signature TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS archive_size ON archive (size)")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS archive_fingerprint ON archive (fingerprint)"
+        )
+        self._copy_old_entries()
+        self.conn.commit()
+
+    def _has_table(self, table):
+        row = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        return row is not None
+
+    def _copy_old_entries(self):
+        """
+        copies the entries of the index written by an older version (if any), with the
+        columns both layouts have
+        """
+        if not self._has_table("archive_old"):
+            return
+        old_columns = {
+            row[1] for row in self.conn.execute("PRAGMA table_info(archive_old)")
+        }
+        columns = ", ".join(
+            row[1]
+            for row in self.conn.execute("PRAGMA table_info(archive)")
+            if row[1] in old_columns
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO archive (" + columns + ")"
+            " SELECT " + columns + " FROM archive_old"
+        )
+        self.conn.execute("DROP TABLE archive_old")
+
+    def has_size(self, size):
+        """
+        True if an archived file has this size (only then a new file must be hashed)
+        """
+        row = self.conn.execute(
+            "SELECT 1 FROM archive WHERE size = ? LIMIT 1", (size,)
+        ).fetchone()
+        return row is not None
+
+    def find(self, fingerprint):
+        """
+        returns the full path of an archived file with this content, or None.
+        entries of files removed from the archive are dropped.
+        """
+        for (name,) in self.conn.execute(
+            "SELECT name FROM archive WHERE fingerprint = ? ORDER BY name", (fingerprint,)
+        ).fetchall():
+            path = os.path.join(self.archive_dir, name)
+            if os.path.exists(path):
+                return path
+            self.conn.execute("DELETE FROM archive WHERE name = ?", (name,))
+        return None
+
+    def is_source(self, fingerprint, source):
+        """
+        True if the file 'source' was archived (and kept where it is) with this content
+        """
+        for (name,) in self.conn.execute(
+            "SELECT name FROM archive WHERE fingerprint = ? AND source = ?",
+            (fingerprint, os.path.abspath(source)),
+        ).fetchall():
+            if os.path.exists(os.path.join(self.archive_dir, name)):
+                return True
+        return False
+
+    def signatures(self):
+        """
+        yields (full path, signature) of the archived files with a signature
+        """
+        for name, signature in self.conn.execute(
+            "SELECT name, signature FROM archive WHERE signature IS NOT NULL"
+        ):
+            yield (
+                os.path.join(self.archive_dir, name),
+                tuple(int(value) for value in signature.split()),
+            )
+
+    def add(
+        self, fingerprint, path, title=None, stat_result=None, source=None, signature=None
+    ):
+        """
+        indexes the file 'path' (in the archive directory) with its full hash.
+        'source' is the original file, if it is kept outside of the archive.
+        'signature' is the MinHash signature of its first page text.
+        """
+        if stat_result is None:
+            stat_result = os.stat(path)
+        if source is not None:
+            source = os.path.abspath(source)
+        if signature is not None:
+            signature = " ".join(str(value) for value in signature)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO archive"
+            " (name, fingerprint, title, size, mtime_ns, source, signature)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                os.path.basename(path),
+                fingerprint,
+                title,
+                stat_result.st_size,
+                stat_result.st_mtime_ns,
+                source,
+                signature,
+            ),
+        )
+        self.pending_writes += 1
+        if self.pending_writes >= COMMIT_EVERY:
+            self.conn.commit()
+            self.pending_writes = 0
+
+    def reindex(self, full_digest_function):
+        """
+        brings the index in line with the files of the archive: entries of missing or
+        changed files are dropped, new and changed files are hashed with
+        'full_digest_function' (e.g. hash_file). unchanged files are not read.
+        returns (hashed, removed) counts.
+        """
+        indexed = {}
+        for name, size, mtime_ns in self.conn.execute(
+            "SELECT name, size, mtime_ns FROM archive"
+        ).fetchall():
+            indexed[name] = (size, mtime_ns)
+
+        hashed = 0
+        with os.scandir(self.archive_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(".pdf"):
+                    continue
+                file_stat = entry.stat()
+                known = indexed.pop(entry.name, None)
+                if known == (file_stat.st_size, file_stat.st_mtime_ns):
+                    continue
+                # a changed file replaces its own entry
+                self.add(
+                    full_digest_function(entry.path),
+                    entry.path,
+                    os.path.splitext(entry.name)[0],
+                    file_stat,
+                )
+                hashed += 1
+
+        # what is left is not in the archive anymore
+        for name in indexed:
+            self.conn.execute("DELETE FROM archive WHERE name = ?", (name,))
+        self.conn.commit()
+        return hashed, len(indexed)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# bump this number whenever the way hashes or titles are computed changes,
+# so entries written by older versions are discarded instead of being reused.
+CACHE_SCHEMA_VERSION = 3
+CACHE_FILE_NAME = "scan_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 200000
+# number of writes grouped in a single transaction
+COMMIT_EVERY = 500
+
+
+def default_cache_path():
+    """
+    returns the path of the scan cache database, under $XDG_CACHE_HOME (or ~/.cache)
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "sci-paper-rename", CACHE_FILE_NAME)
+
+
+class ScanCache:
+    """
+    persistent cache of the results of hash_file and scan_title.
+    entries are keyed by the absolute path of the file and are only reused if the
+    size, mtime_ns and inode of the file did not change since they were stored.
+    the least recently used entries are evicted when the cache grows over 'max_entries'.
+    titles depend on how scan_title is called, they are only reused if they were stored
+    with the same 'scan_key' (the hash of the file is reused in any case).
+    """
+
+    def __init__(
+        self,
+        db_path=None,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        rebuild=False,
+        scan_key="",
+    ):
+        if db_path is None:
+            db_path = default_cache_path()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.scan_key = scan_key
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.pending_writes = 0
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if rebuild or version != CACHE_SCHEMA_VERSION:
+            logger.debug("(re)building scan cache: " + db_path)
+            self.conn.execute("DROP TABLE IF EXISTS scan_cache")
+            self.conn.execute("PRAGMA user_version = " + str(CACHE_SCHEMA_VERSION))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scan_cache ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " fingerprint TEXT,"
+            " scan_key TEXT,"
+            " meta_title TEXT,"
+            " font_based_title TEXT,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS scan_cache_last_used ON scan_cache (last_used)"
+        )
+        self.conn.commit()
+
+    def get(self, path, stat_result):
+        """
+        returns (fingerprint, meta_title, font_based_title) for 'path' if the cached entry
+        still matches the file described by 'stat_result', None otherwise.
+        the fingerprint is None if the file was never hashed (its size was unique)
+        and the titles are None if the file was never scanned.
+        """
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, inode, fingerprint, scan_key, meta_title,"
+            " font_based_title FROM scan_cache WHERE path = ?",
+            (path,),
+        ).fetchone()
+        if row is None or row[:3] != (
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+            stat_result.st_ino,
+        ):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute(
+            "UPDATE scan_cache SET last_used = ? WHERE path = ?", (time.time(), path)
+        )
+        if row[4] != self.scan_key:
+            return row[3], None, None
+        return row[3], row[5], row[6]
+
+    def put(
+        self, path, stat_result, fingerprint=None, meta_title=None, font_based_title=None
+    ):
+        """
+        stores (or replaces) the entry of 'path'
+        """
+        self.conn.execute(
+            "INSERT OR REPLACE INTO scan_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                path,
+                stat_result.st_size,
+                stat_result.st_mtime_ns,
+                stat_result.st_ino,
+                fingerprint,
+                self.scan_key,
+                meta_title,
+                font_based_title,
+                time.time(),
+            ),
+        )
+        self.pending_writes += 1
+        if self.pending_writes >= COMMIT_EVERY:
+            self.conn.commit()
+            self.pending_writes = 0
+
+    def evict(self):
+        """
+        removes the least recently used entries above 'max_entries'
+        """
+        count = self.conn.execute("SELECT COUNT(*) FROM scan_cache").fetchone()[0]
+        if count > self.max_entries:
+            logger.debug("evicting " + str(count - self.max_entries) + " cache entries")
+            self.conn.execute(
+                "DELETE FROM scan_cache WHERE path IN ("
+                " SELECT path FROM scan_cache ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def close(self):
+        self.evict()
+        self.conn.commit()
+        self.conn.close()
+        logger.debug(
+            "scan cache hits: " + str(self.hits) + " misses: " + str(self.misses)
+        )
@@ -0,0 +1,403 @@
+import os
+import logging
+
+from .scan import (
+    hash_file,
+    hash_and_scan,
+    first_page_text,
+    scan_title,
+    choose_candidate_title,
+)
+from .dedup import DuplicateIndex
+from .neardup import NearDuplicateIndex, text_signature
+from .plan import NameIndex, apply_action
+from .walker import OUTPUT_DIR_NAME
+
+logger = logging.getLogger(__name__)
+
+# commit step of a run, shared by the command line (directory, single file, --watch)
+# and the library api: the decisions (dedup, new name) are taken here, one file after
+# the other, and applied. nothing is asked to the user nor printed but the logs.
+
+
+def is_same_file(path, file_stat):
+    """
+    True if 'path' (symlinks followed) is the file whose stat is 'file_stat'
+    """
+    try:
+        path_stat = os.stat(path)
+    except OSError:
+        return False
+    return (path_stat.st_dev, path_stat.st_ino) == (file_stat.st_dev, file_stat.st_ino)
+
+
+def is_marked_duplicate(full_file_name):
+    """
+    True if the file got the 'duplicated_' prefix (in an earlier run)
+    """
+    return os.path.basename(full_file_name).startswith("duplicated_")
+
+
+def look_up_archive(archive_index, scan_record):
+    """
+    looks for the content of the file of 'scan_record' in the 'archive_index', the file
+    is only hashed if an archived file has the same size. scan_record["archived"] is set
+    to the path of the archived copy (None if there is none).
+    returns False if the file is itself the archived copy (the original kept by
+    --link-mode hardlink or symlink), or the original it was cloned or copied from
+    (reflink), it must then be left alone.
+    """
+    scan_record["archived"] = None
+    if not archive_index.has_size(scan_record["stat"].st_size):
+        return True
+    try:
+        if scan_record["fingerprint"] is None:
+            scan_record["fingerprint"] = hash_file(scan_record["path"])
+        archived = archive_index.find(scan_record["fingerprint"])
+    except OSError:
+        return True
+    if archived is not None and (
+        is_same_file(archived, scan_record["stat"])
+        or archive_index.is_source(scan_record["fingerprint"], scan_record["path"])
+    ):
+        logger.debug("Already archived as %s: %s", archived, scan_record["path"])
+        return False
+    scan_record["archived"] = archived
+    return True
+
+
+def archive_file(
+    archive_index, full_file_name, fingerprint=None, source=None, signature=None
+):
+    """
+    adds a file just placed in the archive to its index, hashing it if needed.
+    'source' is the original file, if it was kept (not moved), 'signature' the MinHash
+    signature of its first page text, if it was computed.
+    """
+    try:
+        if fingerprint is None:
+            fingerprint = hash_file(full_file_name)
+        archive_index.add(
+            fingerprint,
+            full_file_name,
+            os.path.splitext(os.path.basename(full_file_name))[0],
+            source=source,
+            signature=signature,
+        )
+    except OSError as e:
+        logger.warning("Could not index %s: %s", full_file_name, e)
+
+
+def cache_moved_file(cache, full_file_name, fingerprint, meta_title, font_based_title):
+    """
+    stores the scan results of a file that was just renamed/moved under its new path
+    """
+    try:
+        file_stat = os.stat(full_file_name)
+    except OSError:
+        return
+    cache.put(full_file_name, file_stat, fingerprint, meta_title, font_based_title)
+
+
+class Committer:
+    """
+    takes the scan records of the files (see iter_scan_records) one after the other,
+    in order, finds what to do with each file (decide) and does it (apply):
+      - a file with the same content as an archived file (see look_up_archive), as a
+        file seen before (DuplicateIndex), or as a file claimed by another process
+        ('claims', see WorkClaims) is a duplicate, it gets a 'duplicated_' prefix in
+        its own directory. with 'near_duplicates' (a similarity between 0 and 1), so
+        is a file whose first page text is that similar to a file seen before.
+      - otherwise the file is placed in 'output_dir' (default: auto_renamed_pdf next to
+        each file) under its title, following 'link_mode' (see LINK_MODES).
+    new names never collide: they are reserved in an in-memory index of each target
+    directory (NameIndex, listed once), a name taken since the listing is never
+    replaced and the next free name is tried. with 'exclusive', this also holds
+    against other processes placing files at the same time (see place_file).
+    renamed files are added to the 'archive_index' of the output directory and keep
+    their entry in the scan 'cache', if given. 'scan_options' are extra keyword
+    arguments passed to scan_title (e.g. clip_top).
+    """
+
+    def __init__(
+        self,
+        output_dir=None,
+        link_mode="move",
+        scan_options=None,
+        archive_index=None,
+        near_duplicates=None,
+        claims=None,
+        cache=None,
+        exclusive=False,
+    ):
+        self.output_dir = output_dir
+        self.link_mode = link_mode
+        self.scan_options = scan_options or {}
+        self.archive_index = archive_index
+        self.claims = claims
+        self.cache = cache
+        self.exclusive = exclusive or claims is not None
+        # duplicate_index -> files seen so far, only hashed when their sizes collide
+        self.duplicate_index = DuplicateIndex(hash_file)
+        # near_duplicate_index -> signatures of the first page text of the files seen
+        self.near_duplicate_index = None
+        if near_duplicates is not None:
+            self.near_duplicate_index = NearDuplicateIndex(near_duplicates)
+            if archive_index is not None:
+                # the archived files are the originals of the new versions
+                for path, signature in archive_index.signatures():
+                    self.near_duplicate_index.add(path, signature)
+        # directory -> NameIndex of the names used in an output directory, or in the
+        # directory of a duplicate
+        self.name_indexes = {}
+        # output directories created so far, not checked for each file
+        self.created_dirs = set()
+
+    def target_dir(self, full_file_name):
+        return self.output_dir or os.path.join(
+            os.path.dirname(full_file_name), OUTPUT_DIR_NAME
+        )
+
+    def reserve(self, target_dir, name):
+        """
+        returns the full path of the first free name like 'name' in 'target_dir'
+        """
+        if target_dir not in self.name_indexes:
+            self.name_indexes[target_dir] = NameIndex.from_directory(target_dir)
+        return target_dir + "/" + self.name_indexes[target_dir].reserve(name)
+
+    def release(self, target):
+        target_dir, name = os.path.split(target)
+        self.name_indexes[target_dir].release(name)
+
+    def reserve_target(self, scan_record, action):
+        """
+        reserves a new name for 'action' (its target is taken)
+        """
+        full_file_name = scan_record["path"]
+        if action["action"] == "rename":
+            return self.reserve(self.target_dir(full_file_name), scan_record["title"])
+        return self.reserve(
+            os.path.dirname(full_file_name),
+            "duplicated_" + os.path.basename(full_file_name),
+        )
+
+    def decide(self, scan_record):
+        """
+        returns the action (see apply_action) for the file of 'scan_record', the name
+        it needs is reserved. a file not scanned yet (scan_record["meta_title"] is None)
+        is scanned here, unless it is a duplicate: the scan errors are raised. it is
+        hashed from the same read if scan_record["needs_hash"] is set.
+        the record gets what was found: "fingerprint" (if the file was hashed),
+        "meta_title", "font_based_title" and "title" (the chosen title).
+        """
+        current_file = scan_record["file"]
+        full_file_name = scan_record["path"]
+        fingerprint = scan_record["fingerprint"]
+        meta_title = scan_record["meta_title"]
+        font_based_title = scan_record["font_based_title"]
+        signature = scan_record.get("signature")
+        page_text = None
+        near_duplicate_index = self.near_duplicate_index
+        # files already in the archive (see look_up_archive) are not scanned
+        duplicate_of = scan_record.get("archived")
+        if duplicate_of is None:
+            # use the content of the file to avoid renaming files already renamed.
+            # avoiding duplications.
+            duplicate_of = self.duplicate_index.find_duplicate(
+                full_file_name, scan_record["stat"].st_size, fingerprint
+            )
+            fingerprint = self.duplicate_index.full_digests.get(full_file_name)
+            if duplicate_of is None and self.claims is not None:
+                # the other processes saw other files, the content is claimed
+                if fingerprint is None:
+                    fingerprint = hash_file(full_file_name)
+                duplicate_of = self.claims.claim_content(fingerprint, full_file_name)
+        else:
+            logger.info("Already in the archive: %s", duplicate_of)
+        if duplicate_of is None and meta_title is None:
+            if fingerprint is None and scan_record.get("needs_hash"):
+                # hashed from the same read as the scan
+                scanned = hash_and_scan(
+                    full_file_name, near_duplicate_index is not None, **self.scan_options
+                )
+                fingerprint = scanned[0]
+                self.duplicate_index.full_digests.setdefault(full_file_name, fingerprint)
+                scanned = scanned[1:]
+            else:
+                scanned = scan_title(
+                    full_file_name,
+                    with_text=near_duplicate_index is not None,
+                    **self.scan_options
+                )
+            meta_title, font_based_title = scanned[:2]
+            if near_duplicate_index is not None:
+                page_text = scanned[2]
+        similarity = None
+        if duplicate_of is None and near_duplicate_index is not None:
+            if signature is None:
+                if page_text is None:
+                    # titles from the scan cache, the text of the page is read again
+                    try:
+                        page_text = first_page_text(full_file_name)
+                    except Exception as e:
+                        logger.debug("could not read the text of %s: %s", full_file_name, e)
+                signature = text_signature(page_text)
+            while True:
+                # a file marked as a duplicate is never the original of the next ones
+                near_duplicate = near_duplicate_index.find_near_duplicate(
+                    full_file_name,
+                    signature,
+                    register=not is_marked_duplicate(full_file_name),
+                )
+                if near_duplicate is None or os.path.exists(near_duplicate[0]):
+                    break
+                # removed from the archive since it was indexed
+                near_duplicate_index.forget(near_duplicate[0])
+            if near_duplicate is not None:
+                duplicate_of, similarity = near_duplicate
+        if self.cache is not None and scan_record.get("cached") != (
+            fingerprint,
+            meta_title,
+            font_based_title,
+        ):
+            self.cache.put(
+                full_file_name,
+                scan_record["stat"],
+                fingerprint,
+                meta_title,
+                font_based_title,
+            )
+        scan_record["fingerprint"] = fingerprint
+        scan_record["meta_title"] = meta_title
+        scan_record["font_based_title"] = font_based_title
+        scan_record["signature"] = signature
+        scan_record["title"] = None
+
+        if duplicate_of is None:
+            found_title = choose_candidate_title(
+                meta_title, font_based_title, current_file
+            )
+            scan_record["title"] = found_title
+            if found_title is None:
+                return {"action": "skip", "source": full_file_name}
+            target = self.reserve(self.target_dir(full_file_name), found_title)
+            if os.path.basename(target) != found_title:
+                logger.info(
+                    "Another file is already named %s, using %s",
+                    found_title,
+                    os.path.basename(target),
+                )
+            return {
+                "action": "rename",
+                "source": full_file_name,
+                "target": target,
+                "link_mode": self.link_mode,
+            }
+
+        if similarity is not None:
+            logger.warning(
+                "Another file with nearly the same first page (%d%% similar) was"
+                " found in the source directory!",
+                round(similarity * 100),
+            )
+        else:
+            logger.warning(
+                "Another file with the same content (hash) was found in the source directory!"
+            )
+        logger.debug("[Original file] : %s", duplicate_of)
+        if is_marked_duplicate(full_file_name):
+            # marked by an earlier run, the prefix is not added again
+            logger.info("Skipping file: %s already marked as a duplicate", current_file)
+            return {"action": "skip", "source": full_file_name}
+        action = {"action": "duplicate", "source": full_file_name, "original": duplicate_of}
+        action["target"] = self.reserve_target(scan_record, action)
+        return action
+
+    def cancel(self, scan_record, action):
+        """
+        drops the 'action' decided for the file of 'scan_record' (e.g. the user skipped
+        the file): its name is free again, and the file is not the original of the
+        next ones
+        """
+        if action["action"] == "skip":
+            return
+        self.release(action["target"])
+        if action["action"] == "rename":
+            full_file_name = scan_record["path"]
+            self.duplicate_index.forget(full_file_name, scan_record["stat"].st_size)
+            if self.near_duplicate_index is not None:
+                self.near_duplicate_index.forget(full_file_name)
+            if self.claims is not None:
+                self.claims.release_content(scan_record["fingerprint"], full_file_name)
+
+    def apply(self, scan_record, action, journal=None):
+        """
+        applies the 'action' decided for the file of 'scan_record', trying the next free
+        name while the target is taken. if a 'journal' is given, the action is recorded
+        in it before and after being applied.
+        returns the new full path of the file, or None if it was not renamed (skip, or
+        already named after its title). raises OSError if the action failed.
+        """
+        full_file_name = scan_record["path"]
+        if action["action"] == "skip":
+            if journal is not None:
+                # handled, a resumed run does not take it again
+                journal.done(action)
+            return None
+        if action["action"] == "rename":
+            target_dir = os.path.dirname(action["target"])
+            if target_dir not in self.created_dirs:
+                os.makedirs(target_dir, exist_ok=True)
+                self.created_dirs.add(target_dir)
+        while True:
+            if self.claims is not None and action["action"] == "rename":
+                # the other processes find the original at its source or target path
+                self.claims.set_content_target(
+                    scan_record["fingerprint"], full_file_name, action["target"]
+                )
+            if journal is not None:
+                journal.intent(action)
+            try:
+                new_file_name = apply_action(action, self.exclusive)
+            except FileExistsError:
+                # placed (by another process) since the directory was listed
+                action["target"] = self.reserve_target(scan_record, action)
+                continue
+            except OSError:
+                if journal is not None:
+                    # a resumed run tries it again
+                    journal.failed(action)
+                self.release(action["target"])
+                raise
+            break
+        if journal is not None:
+            if new_file_name is None:
+                journal.failed(action)
+            else:
+                journal.done(action)
+        if new_file_name is None:
+            self.release(action["target"])
+        elif action["action"] == "rename":
+            if self.link_mode == "move":
+                self.duplicate_index.update_path(full_file_name, new_file_name)
+                if self.near_duplicate_index is not None:
+                    self.near_duplicate_index.update_path(full_file_name, new_file_name)
+            if self.archive_index is not None:
+                archive_file(
+                    self.archive_index,
+                    new_file_name,
+                    scan_record["fingerprint"],
+                    None if self.link_mode == "move" else full_file_name,
+                    scan_record.get("signature"),
+                )
+            if self.cache is not None:
+                # keep the entry valid for the file at its new location
+                cache_moved_file(
+                    self.cache,
+                    new_file_name,
+                    scan_record["fingerprint"],
+                    scan_record["meta_title"],
+                    scan_record["font_based_title"],
+                )
+        return new_file_name
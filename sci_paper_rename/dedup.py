@@ -0,0 +1,154 @@
+import os
+import hashlib
+import logging
+
+from .stats import timed_stage
+
+logger = logging.getLogger(__name__)
+
+# number of bytes read from the head and from the tail of a file for its partial digest
+PARTIAL_BLOCK_SIZE = 65536
+
+
+def partial_digest(path, size, block_size=PARTIAL_BLOCK_SIZE):
+    """
+    sha256 of the first and last 'block_size' bytes of the file.
+    files smaller than 2 * block_size are read entirely, so their partial digest is exact.
+    """
+    hasher = hashlib.sha256()
+    with timed_stage("partial_digest"), open(path, "rb") as f:
+        hasher.update(f.read(block_size))
+        if size > block_size:
+            f.seek(max(block_size, size - block_size))
+            hasher.update(f.read(block_size))
+    return hasher.hexdigest()
+
+
+class DuplicateIndex:
+    """
+    finds files with the same content, hashing as little as possible:
+      1. files are grouped by size, a file with a unique size is never read.
+      2. files whose size collides are compared by a partial (head + tail) digest.
+      3. the full digest ('full_digest_function', e.g. hash_file) is only computed
+         when both the size and the partial digest collide.
+    every lookup is a dict lookup, the first file seen with a given content is the
+    original and the next ones are reported as its duplicates.
+    """
+
+    def __init__(self, full_digest_function, block_size=PARTIAL_BLOCK_SIZE):
+        self.full_digest_function = full_digest_function
+        self.block_size = block_size
+        # size -> paths not hashed yet (only while the size is unique)
+        self.unhashed_by_size = {}
+        # (size, partial digest) -> paths whose full digest was not computed yet
+        self.pending_by_partial = {}
+        # (size, partial digest) -> {full digest: path}
+        self.originals_by_partial = {}
+        # path -> full digest, for every file whose full digest is known
+        self.full_digests = {}
+        # path -> (size, partial digest), for every file whose partial digest is known
+        self.partial_keys = {}
+        # registered path -> current path, and back, for files moved after being registered
+        self.current_paths = {}
+        self.registered_paths = {}
+        self.partial_hashed = 0
+        self.full_hashed = 0
+
+    def find_duplicate(self, path, size, full_digest=None):
+        """
+        registers 'path' and returns the path of an earlier file with the same content,
+        or None if the content was not seen before.
+        'full_digest' may be given when it is already known (e.g. from the scan cache).
+        """
+        if full_digest is not None:
+            self.full_digests[path] = full_digest
+
+        if size not in self.unhashed_by_size:
+            self.unhashed_by_size[size] = [path]
+            return None
+
+        # size collision: the files of this size (if any) are indexed by partial digest
+        for other_path in self.unhashed_by_size[size]:
+            self._add_partial(other_path, size)
+        self.unhashed_by_size[size] = []
+
+        key = (size, self._partial_digest(path, size))
+        self.partial_keys[path] = key
+        if key not in self.pending_by_partial:
+            self.pending_by_partial[key] = [path]
+            self.originals_by_partial[key] = {}
+            return None
+
+        # size and partial digest collision: compare full digests
+        originals = self.originals_by_partial[key]
+        for other_path in self.pending_by_partial[key]:
+            other_digest = self._full_digest(other_path)
+            if other_digest is not None:
+                originals.setdefault(other_digest, other_path)
+        self.pending_by_partial[key] = []
+
+        digest = self._full_digest(path)
+        if digest in originals:
+            return self.current_paths.get(originals[digest], originals[digest])
+        originals[digest] = path
+        return None
+
+    def update_path(self, old_path, new_path):
+        """
+        must be called when a registered file is renamed/moved, so it can still be
+        read if another file with the same size shows up later.
+        """
+        registered_path = self.registered_paths.pop(old_path, old_path)
+        self.current_paths[registered_path] = new_path
+        self.registered_paths[new_path] = registered_path
+
+    def forget(self, path, size):
+        """
+        unregisters 'path' (e.g. the user skipped it), so it is not the original of
+        the next files with the same content
+        """
+        paths = self.unhashed_by_size.get(size)
+        if paths == [path]:
+            del self.unhashed_by_size[size]
+        elif paths and path in paths:
+            paths.remove(path)
+        key = self.partial_keys.pop(path, None)
+        if key is not None:
+            if path in self.pending_by_partial[key]:
+                self.pending_by_partial[key].remove(path)
+            originals = self.originals_by_partial[key]
+            digest = self.full_digests.get(path)
+            if originals.get(digest) == path:
+                del originals[digest]
+
+    def _add_partial(self, path, size):
+        try:
+            key = (size, self._partial_digest(path, size))
+        except OSError as e:
+            # the file is gone, it can not be the original of another file
+            logger.debug("could not read %s: %s", path, e)
+            return
+        self.partial_keys[path] = key
+        if key not in self.pending_by_partial:
+            self.pending_by_partial[key] = []
+            self.originals_by_partial[key] = {}
+        self.pending_by_partial[key].append(path)
+
+    def _partial_digest(self, path, size):
+        self.partial_hashed += 1
+        digest = partial_digest(
+            self.current_paths.get(path, path), size, self.block_size
+        )
+        if size <= 2 * self.block_size:
+            # the whole file was read, the partial digest is also its full digest
+            self.full_digests.setdefault(path, digest)
+        return digest
+
+    def _full_digest(self, path):
+        if path not in self.full_digests:
+            current_path = self.current_paths.get(path, path)
+            if not os.path.isfile(current_path):
+                return None
+            self.full_hashed += 1
+            self.full_digests[path] = self.full_digest_function(current_path)
+        return self.full_digests[path]
@@ -0,0 +1,118 @@
+import sys
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# seconds between two refreshes of the progress line
+PROGRESS_INTERVAL = 0.2
+# keys of an event, the ones not known for a file (e.g. it could not be scanned) are null
+EVENT_FIELDS = (
+    "path",
+    "hash",
+    "meta_title",
+    "font_based_title",
+    "title",
+    "action",
+    "target",
+    "original",
+    "failure",
+    "applied",
+    "durations",
+)
+
+
+class EventWriter:
+    """
+    writes one json object per line to 'events_file' ("-" for stdout), one per file
+    processed, with the EVENT_FIELDS as keys. "durations" are the seconds spent on each
+    stage of the file (see stats.py). on stdout each line is flushed as it is written,
+    so a pipeline reading the events gets the result of each file right away.
+    """
+
+    def __init__(self, events_file):
+        self.events_file = events_file
+        if events_file == "-":
+            self.stream = sys.stdout
+        else:
+            self.stream = open(events_file, "w")
+        self.count = 0
+
+    def write(self, event):
+        self.stream.write(json.dumps(event) + "\n")
+        if self.stream is sys.stdout:
+            self.stream.flush()
+        self.count += 1
+
+    def close(self):
+        if self.stream is sys.stdout:
+            self.stream.flush()
+        else:
+            self.stream.close()
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return "%d:%02d:%02d" % (hours, minutes, seconds)
+    return "%d:%02d" % (minutes, seconds)
+
+
+class Progress:
+    """
+    single-line progress display (files done, files/s and ETA) on 'stream' (stderr).
+    the line is redrawn at most every PROGRESS_INTERVAL seconds, whatever the number
+    of files. the 'total' may be set later (see counted), the ETA is only shown once
+    it is known.
+    """
+
+    def __init__(self, total=None, stream=None, interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.done = 0
+        self.start = time.monotonic()
+        self.last_draw = 0.0
+        self.width = 0
+
+    def counted(self, iterable):
+        """
+        yields the items of 'iterable' (e.g. the files of the run, as they are found),
+        'total' is set to their number once it is exhausted
+        """
+        count = 0
+        for item in iterable:
+            count += 1
+            yield item
+        self.total = count
+
+    def update(self, count=1):
+        self.done += count
+        now = time.monotonic()
+        if now - self.last_draw >= self.interval:
+            self.last_draw = now
+            self.draw(now)
+
+    def draw(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        line = "%d" % self.done
+        total = self.total
+        if total is not None:
+            line += "/%d" % total
+        line += " files  %.1f files/s  elapsed %s" % (rate, format_duration(elapsed))
+        if total is not None and rate > 0:
+            line += "  ETA %s" % format_duration(max(0, total - self.done) / rate)
+        # pad with spaces to erase the end of a longer previous line
+        self.stream.write("\r" + line.ljust(self.width))
+        self.stream.flush()
+        self.width = len(line)
+
+    def close(self):
+        self.draw()
+        self.stream.write("\n")
+        self.stream.flush()
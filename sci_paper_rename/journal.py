@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FILE_NAME = ".sci-paper-rename-journal.jsonl"
+# the journal is fsync'ed every FSYNC_EVERY records or FSYNC_INTERVAL seconds
+FSYNC_EVERY = 64
+FSYNC_INTERVAL = 1.0
+
+
+def journal_path(base_dir):
+    return os.path.join(base_dir, JOURNAL_FILE_NAME)
+
+
+class Journal:
+    """
+    append-only journal of a rename run, one json record per line:
+      {"op": "intent", "action": {...}} written before an action is applied
+      {"op": "done", "action": {...}}   written once it completed
+      {"op": "failed", "action": {...}} written if it could not be applied, the file
+                                        is processed again by a resumed run
+    (actions are the ones of rename_files_in_dir / apply_action).
+    records are fsync'ed in batches: an intent lost in a crash is not a problem, the
+    state of a file can always be found back from the file system on --resume.
+    """
+
+    def __init__(
+        self, journal_file, truncate=False, fsync_every=FSYNC_EVERY,
+        fsync_interval=FSYNC_INTERVAL,
+    ):
+        self.journal_file = journal_file
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.file = open(journal_file, "w" if truncate else "a")
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def record(self, op, action):
+        self.file.write(json.dumps({"op": op, "action": action}) + "\n")
+        self.unsynced += 1
+        if (
+            self.unsynced >= self.fsync_every
+            or time.monotonic() - self.last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def intent(self, action):
+        self.record("intent", action)
+
+    def done(self, action):
+        self.record("done", action)
+
+    def failed(self, action):
+        self.record("failed", action)
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self, remove=False):
+        """
+        syncs and closes the journal, 'remove' deletes it (the run is complete)
+        """
+        self.sync()
+        self.file.close()
+        if remove:
+            os.remove(self.journal_file)
+
+
+def read_journal(journal_file):
+    """
+    reads a journal left by an interrupted run.
+    returns (completed, pending): the set of source paths whose action completed and
+    the list of actions that were started but not marked as done (nor failed).
+    """
+    completed = set()
+    pending = {}
+    with open(journal_file) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # last line cut by the crash
+                logger.debug("ignoring incomplete journal record: %s", line.strip())
+                continue
+            source = record["action"]["source"]
+            if record["op"] == "intent":
+                pending[source] = record["action"]
+            elif record["op"] == "done":
+                pending.pop(source, None)
+                completed.add(source)
+            elif record["op"] == "failed":
+                pending.pop(source, None)
+    return completed, list(pending.values())
@@ -0,0 +1,151 @@
+import re
+import random
+import hashlib
+import logging
+
+from .stats import timed_stage
+
+logger = logging.getLogger(__name__)
+
+# near-duplicate papers (arXiv v1 / v2, preprint / published version, re-stamped
+# downloads) differ in bytes but share most of the text of their first page.
+# the text is cut in shingles (runs of SHINGLE_SIZE words), summarized by a MinHash
+# signature of NUM_PERM values, and the signatures are indexed by LSH: BANDS bands of
+# NUM_PERM / BANDS values, two files are compared only if one of their bands is equal.
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 3
+# below this number of shingles (e.g. a scanned paper) the text says too little
+MIN_SHINGLES = 10
+# estimated jaccard similarity of the shingles above which files are near-duplicates
+SIMILARITY_THRESHOLD = 0.8
+
+MERSENNE_PRIME = (1 << 61) - 1
+# the same permutations in every process, signatures are comparable between runs
+_random = random.Random(20230717)
+PERMUTATIONS = [
+    (_random.randrange(1, MERSENNE_PRIME), _random.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+
+def text_shingles(text, size=SHINGLE_SIZE):
+    """
+    set of the runs of 'size' words of the text (case, punctuation and layout ignored)
+    """
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def text_signature(text):
+    """
+    MinHash signature (a tuple of NUM_PERM ints) of the shingles of the text,
+    None if the text is too short to be compared
+    """
+    if not text:
+        return None
+    with timed_stage("text_signature"):
+        shingles = text_shingles(text)
+        if len(shingles) < MIN_SHINGLES:
+            return None
+        hashes = [
+            int.from_bytes(
+                hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little"
+            )
+            for shingle in shingles
+        ]
+        return tuple(
+            min((a * value + b) % MERSENNE_PRIME for value in hashes)
+            for a, b in PERMUTATIONS
+        )
+
+
+def signature_similarity(signature, other_signature):
+    """
+    estimated jaccard similarity of the shingles behind two signatures
+    """
+    same = sum(1 for a, b in zip(signature, other_signature) if a == b)
+    return same / len(signature)
+
+
+class NearDuplicateIndex:
+    """
+    finds files whose first page text is nearly the same as a file seen before.
+    a lookup only compares the signature with the files sharing one of its LSH bands,
+    not with every file seen, the first file seen is the original of the next ones.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, bands=BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        # (band number, band values) -> ids of the files
+        self.buckets = {}
+        # id -> (current path, signature)
+        self.files = []
+        # current path -> id, for files moved after being registered
+        self.ids = {}
+
+    def _keys(self, signature):
+        return [
+            (band, signature[band * self.rows : (band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def add(self, path, signature):
+        """
+        registers 'path' as the original of the next files with nearly the same text
+        (e.g. a file of the archive, see ArchiveIndex.signatures)
+        """
+        file_id = len(self.files)
+        self.files.append((path, signature))
+        self.ids[path] = file_id
+        for key in self._keys(signature):
+            self.buckets.setdefault(key, []).append(file_id)
+
+    def find_near_duplicate(self, path, signature, register=True):
+        """
+        returns (path, similarity) of an earlier file with nearly the same text, or
+        None: then 'path' is registered, unless 'register' is False.
+        files without signature are never near-duplicates.
+        """
+        if signature is None:
+            return None
+        keys = self._keys(signature)
+        best = None
+        seen = set()
+        for key in keys:
+            for file_id in self.buckets.get(key, ()):
+                if file_id in seen:
+                    continue
+                seen.add(file_id)
+                other_path, other_signature = self.files[file_id]
+                similarity = signature_similarity(signature, other_signature)
+                if similarity >= self.threshold and (
+                    best is None or similarity > best[1]
+                ):
+                    best = (other_path, similarity)
+        if best is None and register:
+            self.add(path, signature)
+        return best
+
+    def forget(self, path):
+        """
+        unregisters 'path' (e.g. the user skipped it), so it is not the original of
+        the next files with nearly the same text
+        """
+        file_id = self.ids.pop(path, None)
+        if file_id is None:
+            return
+        for key in self._keys(self.files[file_id][1]):
+            self.buckets[key].remove(file_id)
+
+    def update_path(self, old_path, new_path):
+        """
+        must be called when a registered file is renamed/moved
+        """
+        file_id = self.ids.pop(old_path, None)
+        if file_id is not None:
+            self.ids[new_path] = file_id
+            self.files[file_id] = (new_path, self.files[file_id][1])
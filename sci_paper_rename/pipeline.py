@@ -0,0 +1,91 @@
+import collections
+
+# seconds between two checks of an input that is not ready (see bounded_map)
+INPUT_POLL_INTERVAL = 0.05
+
+
+def bounded_map(executor, function, iterable, depth, skip=None, input_ready=None):
+    """
+    like executor.map, but consumes 'iterable' lazily and keeps at most 'depth' items
+    in flight (a bounded queue in front of the executor).
+    results are yielded in the same order as 'iterable', whatever order they finish in.
+    items for which skip(item) is true are not sent to the executor, they are yielded
+    unchanged, in their place.
+    bounded_map calls can be chained, each executor being one stage of a pipeline:
+    the stages then run overlapped and the throughput is limited by the slowest stage.
+    if taking the next item of 'iterable' may block (e.g. paths read from a pipe, see
+    ReadAhead), 'input_ready' tells if it can be taken without waiting: until then,
+    the results that finish are yielded, they never wait for the next item.
+    """
+    import concurrent.futures
+
+    depth = max(1, depth)
+    pending = collections.deque()
+    items = iter(iterable)
+    try:
+        while True:
+            if input_ready is not None:
+                while pending and not input_ready():
+                    try:
+                        result = pending[0].result(timeout=INPUT_POLL_INTERVAL)
+                    except concurrent.futures.TimeoutError:
+                        continue
+                    pending.popleft()
+                    yield result
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            if skip is not None and skip(item):
+                future = concurrent.futures.Future()
+                future.set_result(item)
+            else:
+                future = executor.submit(function, item)
+            pending.append(future)
+            if len(pending) >= depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # the consumer stopped early (abort, Ctrl+C): drop what was not started yet
+        for future in pending:
+            future.cancel()
+
+
+class ReadAhead:
+    """
+    iterates over 'iterable' (e.g. paths read from stdin) in a daemon thread, at most
+    'size' items ahead of the consumer (a bounded queue). ready() tells if the next
+    item, or the end, can be taken without waiting (see bounded_map).
+    an exception raised by 'iterable' is raised again by the consumer.
+    """
+
+    _END = object()
+
+    def __init__(self, iterable, size):
+        import queue
+        import threading
+
+        self.queue = queue.Queue(maxsize=size)
+        self.error = None
+        threading.Thread(target=self._read, args=(iterable,), daemon=True).start()
+
+    def _read(self, iterable):
+        try:
+            for item in iterable:
+                self.queue.put(item)
+        except Exception as e:
+            self.error = e
+        self.queue.put(self._END)
+
+    def ready(self):
+        return not self.queue.empty()
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is self._END:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield item
@@ -0,0 +1,125 @@
+import os
+import json
+import errno
+import logging
+
+from .transfer import place_file
+
+logger = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+
+
+class NameIndex:
+    """
+    in-memory index of the file names already used in a target directory, so new names
+    can be made unique without checking the file system for each candidate.
+    names are compared case-insensitively, to be safe on case-insensitive file systems.
+    """
+
+    def __init__(self, names=()):
+        self.taken = set()
+        # name -> next numeric suffix to try, so repeated titles do not probe from _2 again
+        self.next_suffix = {}
+        for name in names:
+            self.taken.add(name.casefold())
+
+    @classmethod
+    def from_directory(cls, dir_name):
+        """
+        builds the index from the names found in 'dir_name' (a single directory listing)
+        """
+        try:
+            with os.scandir(dir_name) as entries:
+                return cls(entry.name for entry in entries)
+        except FileNotFoundError:
+            return cls()
+
+    def reserve(self, name):
+        """
+        returns 'name' if it is free, otherwise the first free 'name_2', 'name_3', ...
+        the returned name is marked as taken.
+        """
+        key = name.casefold()
+        if key not in self.taken:
+            self.taken.add(key)
+            return name
+
+        stem, extension = os.path.splitext(name)
+        suffix = self.next_suffix.get(key, 2)
+        candidate = stem + "_" + str(suffix) + extension
+        while candidate.casefold() in self.taken:
+            suffix += 1
+            candidate = stem + "_" + str(suffix) + extension
+        self.next_suffix[key] = suffix + 1
+        self.taken.add(candidate.casefold())
+        return candidate
+
+    def release(self, name):
+        """
+        marks 'name' as free again (e.g. the rename it was reserved for failed)
+        """
+        self.taken.discard(name.casefold())
+
+
+def write_plan(plan_file, base_dir, actions):
+    """
+    writes the planned 'actions' (see rename_files_in_dir) to the json file 'plan_file'
+    """
+    plan = {"version": PLAN_VERSION, "base_dir": base_dir, "actions": actions}
+    tmp_file = plan_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(plan, f, indent=2)
+    os.replace(tmp_file, plan_file)
+    logger.info(str(len(actions)) + " actions written to the plan: " + plan_file)
+
+
+def read_plan(plan_file):
+    """
+    reads a plan written by write_plan, returns (base_dir, actions)
+    """
+    with open(plan_file) as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError("Unsupported plan version: " + str(plan.get("version")))
+    return plan["base_dir"], plan["actions"]
+
+
+def apply_action(action, exclusive=False):
+    """
+    executes one action planned by rename_files_in_dir:
+      {"action": "rename", "source": full path, "target": full path in the output directory,
+       "link_mode": see LINK_MODES}
+      {"action": "duplicate", "source": full path, "target": full path with 'duplicated_' prefix}
+      {"action": "skip", "source": full path}
+    the output directory of a rename must exist, the file is placed there in one step.
+    returns the new full path of the file, or None if it was not renamed.
+    raises OSError if the file could not be placed, FileExistsError if the target
+    exists and must not be replaced, so another name can be tried: a duplicate never
+    replaces an existing file, a renamed file does not either if 'exclusive' (even
+    if another process places a file at the same time, see place_file).
+    """
+    source = action["source"]
+    if action["action"] == "rename":
+        if os.path.basename(source) == os.path.basename(action["target"]):
+            logger.warning(
+                "Current filename and found title are already the same. Skipping..."
+            )
+            return None
+        logger.info("Renaming file: %s -> %s", source, action["target"])
+        place_file(source, action["target"], action.get("link_mode", "move"), exclusive)
+        return action["target"]
+
+    if action["action"] == "duplicate":
+        if exclusive:
+            place_file(source, action["target"], exclusive=True)
+        elif os.path.lexists(action["target"]):
+            # created since the name was reserved (see NameIndex)
+            raise FileExistsError(
+                errno.EEXIST, os.strerror(errno.EEXIST), action["target"]
+            )
+        else:
+            os.rename(source, action["target"])
+        return action["target"]
+
+    return None
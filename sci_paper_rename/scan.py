@@ -0,0 +1,328 @@
+import os
+import re
+import sys
+import mmap
+import errno
+import string
+import hashlib
+import logging
+import functools
+import contextlib
+
+from .title import (
+    DEFAULT_TITLE_ORDER,
+    METADATA_MIN_SCORE,
+    TitleSelector,
+    metadata_title_score,
+)
+from .stats import timed_stage
+
+logger = logging.getLogger(__name__)
+
+# title extraction, free of any command line side effect (no sys.exit, no input),
+# shared by the command line and the library api.
+# fitz is imported where it is used, importing this module stays cheap.
+
+
+class ScanError(Exception):
+    """
+    raised when a pdf file can not be scanned for a title
+    """
+
+
+def in_worker_process():
+    """
+    True in a worker process of a pool (multiprocessing), False in the main process
+    """
+    multiprocessing = sys.modules.get("multiprocessing")
+    return multiprocessing is not None and multiprocessing.parent_process() is not None
+
+
+@contextlib.contextmanager
+def mapped_file(target_file):
+    """
+    yields the content of the file as a read-only buffer mapped in memory: the file
+    is read once, by the page cache, and the buffer can be hashed and parsed without
+    being copied.
+    the file is only mapped in the worker processes: a file truncated while it is
+    mapped kills the process (SIGBUS), the pool replaces a worker but nothing can
+    replace the main process, where the file is read into memory instead.
+    """
+    with open(target_file, "rb") as f:
+        if not in_worker_process():
+            yield f.read()
+            return
+        try:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # empty file, or a file system that can not map files
+            yield f.read()
+            return
+        buffer = memoryview(mapping)
+        try:
+            yield buffer
+        finally:
+            try:
+                buffer.release()
+                mapping.close()
+            except BufferError:
+                # still referenced (e.g. by a traceback), freed by the garbage collector
+                pass
+
+
+def hash_file(target_file):
+    """
+    sha256 of the content of the file, raises FileNotFoundError if it is not a file
+    """
+
+    target_file = os.path.abspath(target_file)
+    if os.path.isfile(target_file):
+        if not in_worker_process():
+            # read in chunks, the main process never maps a file (see mapped_file)
+            with timed_stage("hash_file"), open(target_file, "rb") as f:
+                return hashlib.file_digest(f, "sha256").hexdigest()
+        with timed_stage("hash_file"), mapped_file(target_file) as buffer:
+            return hashlib.sha256(buffer).hexdigest()
+    else:
+        raise FileNotFoundError(errno.ENOENT, "Not a file", target_file)
+
+
+def hash_and_scan(full_file_name, with_text=False, **scan_options):
+    """
+    hashes and scans the pdf file (see scan_title) from a single mapping of the file,
+    returns (fingerprint, meta_title, font_based_title), followed by the text of the
+    page if 'with_text' is set
+    """
+    with mapped_file(full_file_name) as buffer:
+        with timed_stage("hash_file"):
+            fingerprint = hashlib.sha256(buffer).hexdigest()
+        scanned = scan_title(
+            full_file_name, data=buffer, with_text=with_text, **scan_options
+        )
+    return (fingerprint,) + scanned
+
+
+def parse_title(title, max_length=None):
+    """
+    uses regex to parse the title/file-name candidate
+    """
+
+    if max_length == None:
+        max_length = 125
+
+    if len(title) > max_length:
+        title = title[:max_length]
+
+    title = re.sub(r"[^a-zA-Z0-9]+", " ", title)
+    title = title.strip()
+    title = re.sub(r"\s", "_", title)
+    title = string.capwords(title) + ".pdf"
+    return title
+
+
+@functools.lru_cache(maxsize=None)
+def get_text_method(page_class):
+    """
+    PyMuPDF renamed 'Page.getText' to 'Page.get_text', this function finds which one
+    the installed version provides. the check is made once per class, not per page.
+    """
+    if hasattr(page_class, "get_text"):
+        return page_class.get_text
+    if hasattr(page_class, "getText"):
+        return page_class.getText
+
+    raise ScanError(
+        "The installed PyMuPDF version provides neither 'get_text' nor 'getText'. "
+        "Please ensure that PyMuPDF meets the specified version requirements for this script to function properly."
+    )
+
+
+def get_page_text(current_page, clip=None, flags=None):
+    """
+    This function is required for compatibility reasons:
+    There is a function 'get_text' from PyMuPDF that has changed
+    its name from one version to another: 'get_text' or 'get_Text'
+    so this function just try to track the compatibility between them.
+    'clip' (a fitz.Rect) limits the extraction to a region of the page and
+    'flags' are the TEXT_* flags passed to MuPDF.
+    """
+    get_text = get_text_method(type(current_page))
+    with timed_stage("get_page_text"):
+        return get_text(current_page, "dict", clip=clip, flags=flags)["blocks"]
+
+
+def blocks_text(blocks):
+    """
+    plain text of the text blocks of a page (as returned by get_page_text)
+    """
+    return "\n".join(
+        " ".join(span["text"] for span in line["spans"])
+        for block in blocks
+        for line in block.get("lines", ())
+    )
+
+
+def find_largest_font_text(blocks):
+    """
+    looks for the sentence with the largest font in the text blocks of a page
+    (as returned by get_page_text), returns it as a raw (not parsed) string.
+    the spans are streamed to a TitleSelector, which only keeps the largest-font ones
+    and joins them in reading order.
+    """
+    selector = TitleSelector()
+    selector.add_blocks(blocks)
+    return selector.title()
+
+
+def scan_title(
+    full_file_name,
+    page_num=None,
+    clip_top=None,
+    data=None,
+    with_text=False,
+    title_order=None,
+):
+    """
+    scans the pdf file looking for a title, either based on the pdf metadata or
+    trying to figure out what is the sentence that has the larger font-size
+    if 'clip_top' is given (0 < clip_top < 1), only that top fraction of the page is
+    extracted, the full page is only extracted when nothing is found there, or when
+    the title found reaches the bottom of that fraction (it may go on below).
+    if 'data' (the bytes of the pdf) is given, it is scanned instead of reading the file,
+    'full_file_name' is then only used in the logs.
+    if 'with_text' is set, the text of the whole page (already extracted to find the
+    title, unless 'clip_top' was enough) is returned as a third value.
+    'title_order' lists the ways to find the title (see TITLE_STRATEGIES) in the order
+    they are tried: when "metadata" comes first and the metadata title is trusted (see
+    metadata_title_score), the page is neither loaded nor parsed and the font-based
+    title is empty. a strategy left out of the order gives an empty title.
+    """
+
+    logger.info("Searching title for file : %s", full_file_name)
+    if page_num is None:
+        page_num = 0
+    if title_order is None:
+        title_order = DEFAULT_TITLE_ORDER
+
+    import fitz
+
+    with timed_stage("fitz.open"):
+        if data is None:
+            doc = fitz.open(full_file_name)
+        else:
+            try:
+                doc = fitz.open(stream=data, filetype="pdf")
+            except TypeError:
+                # older PyMuPDF versions only take bytes, not a memoryview
+                doc = fitz.open(stream=bytes(data), filetype="pdf")
+    raw_meta_title = doc.metadata["title"].strip()
+    meta_title = raw_meta_title
+
+    # Check document's metadata for a potential title
+    if len(meta_title) > 5:
+        logger.debug("Document metadata title: %s", meta_title)
+        meta_title = parse_title(meta_title)
+
+    search_font = "font" in title_order
+    if "metadata" not in title_order:
+        meta_title = ""
+    elif (
+        title_order[0] == "metadata"
+        and metadata_title_score(raw_meta_title) >= METADATA_MIN_SCORE
+    ):
+        logger.debug("Metadata title trusted, the page is not scanned")
+        search_font = False
+
+    # images are never used to find the title, do not ask MuPDF for them
+    text_flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+    title = ""
+    blocks = None
+    if search_font:
+        # Read first page and look for the setence with the largest font
+        page = doc.load_page(page_num)
+    elif with_text:
+        blocks = get_page_text(doc.load_page(page_num), flags=text_flags)
+    if search_font and clip_top is not None and clip_top < 1:
+        # titles sit on the top of the first page
+        page_rect = page.rect
+        clip = fitz.Rect(
+            page_rect.x0,
+            page_rect.y0,
+            page_rect.x1,
+            page_rect.y0 + page_rect.height * clip_top,
+        )
+        blocks = get_page_text(page, clip, text_flags)
+        with timed_stage("find_largest_font_text"):
+            selector = TitleSelector()
+            selector.add_blocks(blocks)
+            title = selector.title()
+        if not title.strip():
+            logger.debug("No title found in the top of the page, scanning full page")
+            blocks = None
+        elif selector.may_go_on_below(clip.y1):
+            logger.debug("Title cut by the top of the page, scanning full page")
+            title = ""
+            blocks = None
+        elif with_text:
+            # the title was found in the clip, the text of the page is still needed
+            blocks = get_page_text(page, flags=text_flags)
+    if search_font and not title.strip():
+        blocks = get_page_text(page, flags=text_flags)
+        with timed_stage("find_largest_font_text"):
+            title = find_largest_font_text(blocks)
+
+    page_text = None
+    if with_text:
+        page_text = blocks_text(blocks)
+    doc.close()
+    parsed_found_title = ""
+    if search_font:
+        parsed_found_title = parse_title(title)
+
+    logger.debug("Parsed Found title: %s", parsed_found_title)
+    logger.debug("--------------------------------------------------------")
+
+    if with_text:
+        return (meta_title, parsed_found_title, page_text)
+    return (meta_title, parsed_found_title)
+
+
+def first_page_text(full_file_name, page_num=None):
+    """
+    text of the first page (or of page 'page_num') of the pdf file
+    """
+    if page_num is None:
+        page_num = 0
+
+    import fitz
+
+    with timed_stage("fitz.open"):
+        doc = fitz.open(full_file_name)
+    try:
+        page = doc.load_page(page_num)
+        text_flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+        return blocks_text(get_page_text(page, flags=text_flags))
+    finally:
+        doc.close()
+
+
+def choose_candidate_title(meta_title, font_based_title, current_file):
+    """
+    chooses between the 2 candidates returned by scan_title (metadata title and font-size title)
+    """
+
+    logger.debug(
+        "get_title returned:  [meta_title]: %s [found_title]: %s",
+        meta_title,
+        font_based_title,
+    )
+
+    if len(font_based_title) > 0:
+        # if found_title > 0: then font-based title was found. use font_based_title.
+        return font_based_title
+    elif len(meta_title) > 0:
+        # if meta_title > 0: then metadata title was found. user chooses between meta_title and mined title
+        return meta_title
+    else:
+        logger.info("No potential Title was found for : %s", current_file)
+        return None
@@ -0,0 +1,238 @@
+import os
+import json
+import stat
+import errno
+import base64
+import socket
+import logging
+import threading
+import socketserver
+
+from .scan import scan_title, choose_candidate_title
+
+logger = logging.getLogger(__name__)
+
+# title extraction server ('serve' command), one json object per line on a unix socket:
+#   request:  {"id": any, "files": [{"path": "/papers/1.pdf"} or {"data": base64 pdf bytes}]}
+#   response: {"id": same, "results": [{"path", "title", "meta_title", "font_based_title"}
+#                                      or {"path", "error"}, in the order of the files]}
+#   overload: {"id": same, "error": "busy", "retry_after": seconds}, nothing was scanned
+# the files are scanned in a pool of worker processes started (and warmed up) once.
+
+# requests scanned at the same time, the next ones are answered "busy"
+MAX_REQUESTS = 32
+# maximum number of files in a request
+MAX_BATCH = 256
+# seconds a client is told to wait before retrying a "busy" request
+RETRY_AFTER = 0.05
+
+
+def warm_up():
+    """
+    loads PyMuPDF in a worker, so the first requests do not pay for it
+    """
+    import fitz
+
+
+def scan_request_file(request_file, scan_options=None):
+    """
+    worker function: scans one file of a request, returns its json result
+    """
+    path = request_file.get("path")
+    try:
+        data = None
+        if request_file.get("data") is not None:
+            data = base64.b64decode(request_file["data"])
+        elif path is None:
+            raise ValueError("a file needs a 'path' or 'data'")
+        meta_title, font_based_title = scan_title(
+            path or "<data>", data=data, **(scan_options or {})
+        )
+    except Exception as e:
+        return {"path": path, "error": type(e).__name__ + ": " + str(e)}
+    return {
+        "path": path,
+        "title": choose_candidate_title(meta_title, font_based_title, path or "<data>"),
+        "meta_title": meta_title,
+        "font_based_title": font_based_title,
+    }
+
+
+class TitleRequestHandler(socketserver.StreamRequestHandler):
+    """
+    answers the requests of one connection, in order
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.answer(line)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class TitleServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    unix socket server, each connection is handled by a thread and the files
+    are scanned by 'executor' (a pool kept for the whole life of the server).
+    if a worker of the pool dies (crash, memory limit), the pool is broken: the files
+    it was scanning are answered with an error, and the pool is replaced by a new one
+    from 'executor_factory' (if given) for the next requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, socket_path, executor, scan_options=None, max_requests=MAX_REQUESTS,
+        max_batch=MAX_BATCH, executor_factory=None,
+    ):
+        self.executor = executor
+        self.executor_factory = executor_factory
+        self.executor_lock = threading.Lock()
+        self.scan_options = scan_options or {}
+        self.max_batch = max_batch
+        # free request slots, a request that gets none is not queued but answered "busy"
+        self.slots = threading.BoundedSemaphore(max_requests)
+        super().__init__(socket_path, TitleRequestHandler)
+
+    def answer(self, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            files = request["files"]
+            if not isinstance(files, list) or not all(
+                isinstance(request_file, dict) for request_file in files
+            ):
+                raise TypeError("'files' must be a list of objects")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return {"id": request_id, "error": "bad request: " + str(e)}
+        if len(files) > self.max_batch:
+            return {
+                "id": request_id,
+                "error": "too many files, the maximum is " + str(self.max_batch),
+            }
+
+        if not self.slots.acquire(blocking=False):
+            return {"id": request_id, "error": "busy", "retry_after": RETRY_AFTER}
+        try:
+            results = self.scan_files(files)
+        finally:
+            self.slots.release()
+        return {"id": request_id, "results": results}
+
+    def scan_files(self, files):
+        from concurrent.futures import BrokenExecutor
+
+        executor = self.executor
+        try:
+            futures = [
+                executor.submit(scan_request_file, request_file, self.scan_options)
+                for request_file in files
+            ]
+        except BrokenExecutor:
+            # broken by an earlier request, the files are scanned by a new pool
+            if not self.replace_executor(executor):
+                raise
+            return self.scan_files(files)
+        results = []
+        for request_file, future in zip(files, futures):
+            try:
+                results.append(future.result())
+            except BrokenExecutor as e:
+                self.replace_executor(executor)
+                results.append(
+                    {
+                        "path": request_file.get("path"),
+                        "error": type(e).__name__ + ": " + str(e),
+                    }
+                )
+        return results
+
+    def replace_executor(self, broken_executor):
+        """
+        replaces the broken executor by a new one (once, whatever the number of
+        requests that found it broken), returns False if there is no executor_factory
+        """
+        if self.executor_factory is None:
+            return False
+        with self.executor_lock:
+            if self.executor is broken_executor:
+                logger.warning("A worker process died, starting a new pool")
+                broken_executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self.executor_factory()
+        return True
+
+
+def remove_stale_socket(socket_path):
+    """
+    removes the socket left at 'socket_path' by a server that did not stop cleanly.
+    raises OSError if a server still answers on it, FileExistsError if it is not a
+    socket (it is never removed then)
+    """
+    try:
+        path_stat = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(path_stat.st_mode):
+        raise FileExistsError(errno.EEXIST, "Not a socket", socket_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError:
+            # nobody listens on it anymore
+            os.remove(socket_path)
+            return
+    raise OSError(errno.EADDRINUSE, "A server is already running on", socket_path)
+
+
+def serve(socket_path, jobs=1, scan_options=None, max_requests=MAX_REQUESTS, max_batch=MAX_BATCH):
+    """
+    runs the title extraction server on 'socket_path' until interrupted
+    """
+    import concurrent.futures
+
+    def start_executor():
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        return executor, [executor.submit(warm_up) for _ in range(jobs)]
+
+    remove_stale_socket(socket_path)
+    executor, warming_up = start_executor()
+    server = None
+    try:
+        for future in warming_up:
+            future.result()
+        # only the user running the server can connect, from the moment it is bound
+        umask = os.umask(0o177)
+        try:
+            server = TitleServer(
+                socket_path, executor, scan_options, max_requests, max_batch,
+                executor_factory=lambda: start_executor()[0],
+            )
+        finally:
+            os.umask(umask)
+        logger.info(
+            "Serving titles on " + socket_path + " with " + str(jobs) + " processes"
+        )
+        server.serve_forever()
+    finally:
+        if server is not None:
+            server.server_close()
+            os.remove(socket_path)
+            executor = server.executor
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def request_titles(socket_path, files, request_id=None, timeout=None):
+    """
+    client side: sends one request ('files' as described above) to a server started
+    with 'serve', returns its response
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        request = {"id": request_id, "files": files}
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as response:
+            return json.loads(response.readline())
@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import zlib
+import socket
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# several processes (on one or several machines sharing the file system) can process
+# the same directory together:
+#   --shard i/N -> each process takes the files whose path hash falls in its shard
+#   --claim     -> each process takes the next file nobody claimed yet
+# in both cases the processes share a claim directory, where a claim is a small json
+# file created atomically (written aside, then hard linked to its name, which fails
+# if it exists): "file-<sha1 of path>" for a file being processed (--claim), and
+# "content-<sha256>" for the first file seen with a content, so duplicates are found
+# across processes.
+
+CLAIM_DIR_NAME = ".sci-paper-rename-claims"
+# seconds after which the claim of a file is considered abandoned (its process died)
+LEASE_SECONDS = 600
+
+
+def parse_shard(text):
+    """
+    parses "i/N" (0 <= i < N), returns (i, N), raises ValueError
+    """
+    index, _, count = text.partition("/")
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError("the shard must be i/N with 0 <= i < N")
+    return index, count
+
+
+def in_shard(relative_name, shard):
+    """
+    True if the file 'relative_name' (relative to the processed directory, so the same
+    on every machine) belongs to 'shard' (i, N)
+    """
+    index, count = shard
+    return zlib.crc32(relative_name.encode("utf-8", "surrogateescape")) % count == index
+
+
+def node_name():
+    return socket.gethostname() + "-" + str(os.getpid())
+
+
+def file_identity(file_stat):
+    """
+    what tells a file from another one later found at the same path
+    """
+    return [file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns]
+
+
+class WorkClaims:
+    """
+    claim directory shared by the processes working on the same directory.
+    if 'claim_files' is unset (--shard), files are not claimed, only their content is.
+    """
+
+    def __init__(self, claim_dir, claim_files=True, lease=LEASE_SECONDS):
+        os.makedirs(claim_dir, exist_ok=True)
+        self.claim_dir = claim_dir
+        self.claim_files = claim_files
+        self.lease = lease
+        self.node = node_name()
+
+    def _create(self, claim_file, content):
+        """
+        creates 'claim_file' with its content in one step, False if it already exists
+        """
+        tmp_file = claim_file + "." + self.node + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(content, f)
+        try:
+            os.link(tmp_file, claim_file)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_file)
+
+    def _replace(self, claim_file, content):
+        """
+        rewrites 'claim_file', owned by this process, in one step
+        """
+        tmp_file = claim_file + "." + self.node + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(content, f)
+        os.replace(tmp_file, claim_file)
+
+    def _read(self, claim_file):
+        try:
+            with open(claim_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _take_over(self, claim_file, owner, content):
+        """
+        replaces the claim 'owner' (read from 'claim_file') by 'content', False if
+        another process replaced it first
+        """
+        # the process that moves the claim away takes it over
+        stale_file = claim_file + "." + self.node + ".stale"
+        try:
+            os.rename(claim_file, stale_file)
+        except FileNotFoundError:
+            return False
+        try:
+            if self._read(stale_file) != owner:
+                # another process took it over in the meantime, give its claim back
+                try:
+                    os.link(stale_file, claim_file)
+                except FileExistsError:
+                    pass
+                return False
+        finally:
+            os.remove(stale_file)
+        return self._create(claim_file, content)
+
+    def _file_claim(self, path):
+        return os.path.join(
+            self.claim_dir,
+            "file-" + hashlib.sha1(path.encode("utf-8", "surrogateescape")).hexdigest(),
+        )
+
+    def claim_file(self, path):
+        """
+        True if this process gets the file 'path', False if another process has it,
+        or already processed this very file (see release_file)
+        """
+        if not self.claim_files:
+            return True
+        try:
+            identity = file_identity(os.stat(path))
+        except OSError:
+            # moved away by another process since the directory was read
+            return False
+        claim_file = self._file_claim(path)
+        content = {"node": self.node, "path": path, "time": time.time(), "file": identity}
+        if not self._create(claim_file, content):
+            owner = self._read(claim_file)
+            if owner is None:
+                # released meanwhile
+                if not self._create(claim_file, content):
+                    return False
+            elif owner.get("done"):
+                if owner.get("file") == identity:
+                    return False
+                logger.info("Claiming a new file at a processed path: %s", path)
+                if not self._take_over(claim_file, owner, content):
+                    return False
+            elif time.time() - owner["time"] < self.lease:
+                return False
+            else:
+                logger.info("Taking over an abandoned claim: %s", path)
+                if not self._take_over(claim_file, owner, content):
+                    return False
+        if not os.path.exists(path):
+            # renamed by the process that released its claim just before
+            self._remove(claim_file)
+            return False
+        return True
+
+    def release_file(self, path):
+        """
+        to be called once the action of a claimed file is committed: the claim is
+        removed if the file left 'path' (renamed or moved), otherwise it is marked as
+        done, so the other processes skip this file but not a new file copied there.
+        """
+        if not self.claim_files:
+            return
+        claim_file = self._file_claim(path)
+        try:
+            identity = file_identity(os.stat(path))
+        except OSError:
+            self._remove(claim_file)
+            return
+        self._replace(
+            claim_file,
+            {
+                "node": self.node,
+                "path": path,
+                "time": time.time(),
+                "file": identity,
+                "done": True,
+            },
+        )
+
+    def _remove(self, claim_file):
+        try:
+            os.remove(claim_file)
+        except FileNotFoundError:
+            pass
+
+    def claim_content(self, fingerprint, path):
+        """
+        registers 'path' as the first file with this content (full hash), or returns
+        the path of the file that was registered first by any process. a registered
+        file that is neither at its path nor at its target (see set_content_target)
+        anymore was removed: its claim is taken over.
+        """
+        claim_file = os.path.join(self.claim_dir, "content-" + fingerprint)
+        content = {"node": self.node, "path": path}
+        if self._create(claim_file, content):
+            return None
+        owner = self._read(claim_file)
+        if owner is None or owner.get("path") == path:
+            # the same file, seen again (e.g. its first process died)
+            return None
+        for owner_path in (owner.get("target"), owner["path"]):
+            if owner_path is not None and os.path.exists(owner_path):
+                return owner_path
+        logger.info("The first file with this content is gone: %s", owner["path"])
+        if self._take_over(claim_file, owner, content):
+            return None
+        return self.claim_content(fingerprint, path)
+
+    def release_content(self, fingerprint, path):
+        """
+        gives up the claim of 'path' on its content (e.g. the user skipped the file)
+        """
+        claim_file = os.path.join(self.claim_dir, "content-" + fingerprint)
+        owner = self._read(claim_file)
+        if owner is not None and owner.get("path") == path:
+            self._remove(claim_file)
+
+    def set_content_target(self, fingerprint, path, target):
+        """
+        records where the first file with this content ('path') is being renamed to,
+        before it is renamed, so it is found at one of both paths at any time
+        """
+        claim_file = os.path.join(self.claim_dir, "content-" + fingerprint)
+        self._replace(claim_file, {"node": self.node, "path": path, "target": target})
@@ -0,0 +1,165 @@
+import json
+import time
+import heapq
+import logging
+import threading
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+# the collector of each thread, stages are not timed in threads without one
+_local = threading.local()
+
+
+def get_collector():
+    return getattr(_local, "collector", None)
+
+
+def set_collector(collector):
+    """
+    installs 'collector' (a RunStats, or None to disable timing) for the current thread
+    """
+    _local.collector = collector
+
+
+@contextlib.contextmanager
+def timed_stage(stage):
+    """
+    times the block as one run of 'stage', if a collector is installed in this thread
+    """
+    collector = getattr(_local, "collector", None)
+    if collector is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        collector.add(stage, time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def collecting(enabled=True):
+    """
+    installs a fresh collector for the block (used by the pool workers and I/O threads),
+    yields it (or None if not 'enabled') so its timings can be sent back with the file.
+    """
+    if not enabled:
+        yield None
+        return
+    previous = get_collector()
+    collector = RunStats()
+    set_collector(collector)
+    try:
+        yield collector
+    finally:
+        set_collector(previous)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[int(round(fraction * (len(sorted_values) - 1)))]
+
+
+class RunStats:
+    """
+    per-stage latencies of a run (hash_file, fitz.open, get_page_text, ...) and the
+    slowest files. durations are only appended to lists while the run goes on,
+    the percentiles are computed once, by summary().
+    """
+
+    def __init__(self, slowest_count=10):
+        self.durations = {}
+        # stage -> seconds spent on the file being processed
+        self.file_timings = {}
+        # heap of (seconds, file name) of the slowest files
+        self.slowest = []
+        self.slowest_count = slowest_count
+        self.files = 0
+        self.start = time.perf_counter()
+
+    def add(self, stage, seconds):
+        if stage not in self.durations:
+            self.durations[stage] = []
+        self.durations[stage].append(seconds)
+        self.file_timings[stage] = self.file_timings.get(stage, 0.0) + seconds
+
+    def take_file_timings(self):
+        """
+        returns the timings of the current file as [(stage, seconds)] and resets them
+        """
+        timings = list(self.file_timings.items())
+        self.file_timings = {}
+        return timings
+
+    def merge(self, timings):
+        """
+        adds the timings sent back by a worker (see take_file_timings)
+        """
+        for stage, seconds in timings or ():
+            self.add(stage, seconds)
+
+    def end_file(self, file_name):
+        """
+        closes the accounting of 'file_name', keeping it if it is one of the slowest.
+        returns its timings as {stage: seconds}
+        """
+        self.files += 1
+        file_timings = self.file_timings
+        total = sum(file_timings.values())
+        self.file_timings = {}
+        if len(self.slowest) < self.slowest_count:
+            heapq.heappush(self.slowest, (total, file_name))
+        elif total > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (total, file_name))
+        return file_timings
+
+    def summary(self):
+        stages = {}
+        for stage, durations in self.durations.items():
+            durations = sorted(durations)
+            stages[stage] = {
+                "count": len(durations),
+                "total": sum(durations),
+                "p50": percentile(durations, 0.50),
+                "p95": percentile(durations, 0.95),
+                "max": durations[-1],
+            }
+        return {
+            "files": self.files,
+            "elapsed": time.perf_counter() - self.start,
+            "stages": stages,
+            "slowest_files": [
+                {"file": file_name, "seconds": seconds}
+                for seconds, file_name in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+    def log_summary(self):
+        summary = self.summary()
+        logger.info("*" * 80)
+        logger.info(
+            "Stats => files: %d, elapsed: %.3f s", summary["files"], summary["elapsed"]
+        )
+        logger.info(
+            "%-24s %8s %10s %10s %10s %10s",
+            "stage", "count", "total s", "p50 ms", "p95 ms", "max ms",
+        )
+        for stage, values in sorted(
+            summary["stages"].items(), key=lambda item: -item[1]["total"]
+        ):
+            logger.info(
+                "%-24s %8d %10.3f %10.2f %10.2f %10.2f",
+                stage,
+                values["count"],
+                values["total"],
+                values["p50"] * 1000,
+                values["p95"] * 1000,
+                values["max"] * 1000,
+            )
+        logger.info("Slowest files:")
+        for slow_file in summary["slowest_files"]:
+            logger.info("%10.2f ms  %s", slow_file["seconds"] * 1000, slow_file["file"])
+
+    def write_json(self, json_file):
+        with open(json_file, "w") as f:
+            json.dump(self.summary(), f, indent=2)
@@ -0,0 +1,268 @@
+import json
+import time
+import signal
+import logging
+import collections
+
+from .pipeline import INPUT_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE_FILE_NAME = ".sci-paper-rename-quarantine.jsonl"
+# failure of a file already listed in the quarantine (it is not scanned again)
+QUARANTINED = "quarantined"
+# seconds given to the workers to leave before they are killed
+SHUTDOWN_TIMEOUT = 1.0
+
+
+def worker_loop(conn, max_memory=None):
+    """
+    runs in a supervised worker process: receives (function, item) tasks and sends back
+    ("ok", result) or ("error", message) until it receives None.
+    'max_memory' (bytes) limits the address space of the process.
+    """
+    # Ctrl+C is handled by the supervisor, which stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if max_memory is not None:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        function, item = task
+        try:
+            result = ("ok", function(item))
+        except Exception as e:
+            result = ("error", type(e).__name__ + ": " + str(e))
+        conn.send(result)
+
+
+class SupervisedTask:
+    """
+    an item given to SupervisedPool.map, and its result once done
+    """
+
+    __slots__ = ("item", "done", "result")
+
+    def __init__(self, item):
+        self.item = item
+        self.done = False
+        self.result = None
+
+    def finish(self, result):
+        self.done = True
+        self.result = result
+
+
+class SupervisedWorker:
+    __slots__ = ("process", "conn", "task", "deadline")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.task = None
+        self.deadline = None
+
+
+class SupervisedPool:
+    """
+    pool of worker processes that are watched while they work: a worker that takes
+    more than 'timeout' seconds on an item is killed, one that dies (crash, memory
+    limit) is detected, and both are replaced by a fresh worker. the item is then
+    reported as failed, instead of stalling or breaking the whole run.
+    'max_memory' (bytes) caps the address space of each worker (RLIMIT_AS).
+    """
+
+    def __init__(self, jobs, timeout=None, max_memory=None):
+        self.jobs = max(1, jobs)
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.workers = []
+        self.restarted = 0
+
+    def _start_worker(self):
+        import multiprocessing
+
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=worker_loop, args=(child_conn, self.max_memory), daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = SupervisedWorker(process, conn)
+        self.workers.append(worker)
+        return worker
+
+    def _replace_worker(self, worker):
+        """
+        kills 'worker' (if it is still running) and starts a new one
+        """
+        worker.process.kill()
+        worker.process.join()
+        worker.conn.close()
+        self.workers.remove(worker)
+        self.restarted += 1
+        return self._start_worker()
+
+    def map(
+        self, function, iterable, depth=None, skip=None, on_failure=None, input_ready=None
+    ):
+        """
+        like bounded_map (see pipeline.py): yields function(item) for each item of
+        'iterable', in order, with at most 'depth' items in flight. items for which
+        skip(item) is true are yielded unchanged. if given, the next item is only taken
+        once input_ready() is true (or nothing is in flight), the results that finish
+        meanwhile are yielded.
+        for an item whose worker failed, on_failure(item, reason) is yielded instead,
+        'reason' being "timeout", "crashed (exit code N)" or the exception raised.
+        """
+        import multiprocessing.connection
+
+        if depth is None:
+            depth = 2 * self.jobs
+        depth = max(1, depth)
+        if on_failure is None:
+            on_failure = lambda item, reason: None
+        while len(self.workers) < self.jobs:
+            self._start_worker()
+        idle = list(self.workers)
+        pending = collections.deque()
+        waiting = collections.deque()
+        items = iter(iterable)
+        exhausted = False
+
+        def fail(worker, reason):
+            task = worker.task
+            logger.warning("Worker failed (%s), restarting it", reason)
+            task.finish(on_failure(task.item, reason))
+            idle.append(self._replace_worker(worker))
+
+        while True:
+            while not exhausted and len(pending) < depth:
+                if pending and input_ready is not None and not input_ready():
+                    break
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                task = SupervisedTask(item)
+                pending.append(task)
+                if skip is not None and skip(item):
+                    task.finish(item)
+                else:
+                    waiting.append(task)
+
+            while waiting and idle:
+                worker = idle.pop()
+                worker.task = waiting.popleft()
+                worker.conn.send((function, worker.task.item))
+                if self.timeout is not None:
+                    worker.deadline = time.monotonic() + self.timeout
+
+            if pending and pending[0].done:
+                while pending and pending[0].done:
+                    yield pending.popleft().result
+                continue
+            if not pending:
+                return
+
+            busy = [worker for worker in self.workers if worker.task is not None]
+            wait_timeout = None
+            if self.timeout is not None:
+                wait_timeout = max(
+                    0.0, min(worker.deadline for worker in busy) - time.monotonic()
+                )
+            if input_ready is not None and not exhausted:
+                # wake up to take the next item once it comes
+                if wait_timeout is None or wait_timeout > INPUT_POLL_INTERVAL:
+                    wait_timeout = INPUT_POLL_INTERVAL
+            ready = multiprocessing.connection.wait(
+                [worker.conn for worker in busy]
+                + [worker.process.sentinel for worker in busy],
+                wait_timeout,
+            )
+            now = time.monotonic()
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        status, result = worker.conn.recv()
+                    except (EOFError, OSError):
+                        worker.process.join()
+                        fail(worker, "crashed (exit code " + str(worker.process.exitcode) + ")")
+                        continue
+                    task = worker.task
+                    worker.task = None
+                    if status == "ok":
+                        task.finish(result)
+                    else:
+                        task.finish(on_failure(task.item, result))
+                    idle.append(worker)
+                elif worker.process.sentinel in ready:
+                    worker.process.join()
+                    fail(worker, "crashed (exit code " + str(worker.process.exitcode) + ")")
+                elif worker.deadline is not None and now >= worker.deadline:
+                    fail(worker, "timeout")
+
+    def close(self):
+        """
+        stops the workers, killing the ones still busy
+        """
+        for worker in self.workers:
+            if worker.task is None:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for worker in self.workers:
+            if worker.task is None:
+                worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+        self.workers = []
+
+
+class Quarantine:
+    """
+    files that could not be scanned (timeout, crash, too large, ...), listed in a
+    json-lines file: {"path", "size", "mtime_ns", "reason"}.
+    they are not scanned again by the next runs, as long as they do not change.
+    """
+
+    def __init__(self, quarantine_file):
+        self.quarantine_file = quarantine_file
+        # path -> (size, mtime_ns) of the file when it was quarantined
+        self.entries = {}
+        try:
+            with open(quarantine_file) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[entry["path"]] = (entry["size"], entry["mtime_ns"])
+        except FileNotFoundError:
+            pass
+
+    def contains(self, path, file_stat):
+        return self.entries.get(path) == (file_stat.st_size, file_stat.st_mtime_ns)
+
+    def add(self, path, file_stat, reason):
+        self.entries[path] = (file_stat.st_size, file_stat.st_mtime_ns)
+        entry = {
+            "path": path,
+            "size": file_stat.st_size,
+            "mtime_ns": file_stat.st_mtime_ns,
+            "reason": reason,
+        }
+        with open(self.quarantine_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        logger.warning("File quarantined (%s): %s", reason, path)
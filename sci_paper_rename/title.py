@@ -0,0 +1,150 @@
+import re
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+# part of the scan cache key, titles found by another version are scanned again
+TITLE_SELECTOR_VERSION = "title-v3"
+# maximum number of spans (at the largest font size) joined into a title
+TITLE_MAX_SPANS = 5
+# spans with up to this many characters are ignored, to avoid drop caps (a single
+# letter bigger than the title) being taken for the title
+MIN_SPAN_LENGTH = 2
+# distance (in font sizes) from the baseline of a line to the bottom of the next line
+# of the same font, to tell if a title could go on below a part of the page
+NEXT_LINE_BOTTOM = 1.5
+
+# ways to find a title, tried in the order given to scan_title:
+#   metadata -> the title of the pdf metadata, taken only if it looks like a real title
+#               (see metadata_title_score), no page is loaded nor parsed
+#   font     -> the text with the largest font on the first page
+TITLE_STRATEGIES = ("metadata", "font")
+DEFAULT_TITLE_ORDER = ("font", "metadata")
+# metadata titles scoring less are not trusted (see metadata_title_score)
+METADATA_MIN_SCORE = 0.6
+
+# what authoring tools and publishers leave in the title field instead of a title
+_TOOL_PREFIX = re.compile(r"^(microsoft\s+\w+\s*-|untitled|title:?$|no\s+title|document\d*$)", re.I)
+_FILE_NAME = re.compile(r"\.(pdf|docx?|tex|dvi|ps|rtf|odt|indd|qxd)$", re.I)
+_DOI = re.compile(r"^(doi:\s*|https?://(dx\.)?doi\.org/)?10\.\d{4,9}/\S+$", re.I)
+_ARXIV_ID = re.compile(r"^(arxiv:\s*)?\d{4}\.\d{4,5}(v\d+)?$", re.I)
+
+
+class TitleSpan:
+    """
+    compact record of a span kept as a title candidate
+    """
+
+    __slots__ = ("size", "text", "x", "y", "order")
+
+    def __init__(self, size, text, x, y, order):
+        self.size = size
+        self.text = text
+        self.x = x
+        self.y = y
+        self.order = order
+
+    def reading_key(self):
+        """
+        position in reading order: top to bottom, then left to right
+        """
+        return (self.y, self.x, self.order)
+
+
+class TitleSelector:
+    """
+    picks the title of a page from its spans, given one at a time (see add):
+    only the spans of the largest font size seen so far are kept, at most
+    'max_spans' of them (the first ones in reading order), in a bounded heap.
+    the title is rebuilt in reading order, whatever the order of the spans.
+    """
+
+    def __init__(self, max_spans=TITLE_MAX_SPANS, min_length=MIN_SPAN_LENGTH):
+        self.max_spans = max_spans
+        self.min_length = min_length
+        self.size = 0
+        # max-heap (on the reading order) of the spans at self.size:
+        # the root is the last one in reading order, the first to be dropped
+        self.heap = []
+        self.count = 0
+
+    def add(self, size, text, origin):
+        if len(text) <= self.min_length or size < self.size:
+            return
+        if size > self.size:
+            # a larger font, the previous group is dropped
+            self.size = size
+            self.heap = []
+        self.count += 1
+        span = TitleSpan(size, text, origin[0], origin[1], self.count)
+        entry = (-span.y, -span.x, -span.order, span)
+        if len(self.heap) < self.max_spans:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            # before the last kept span in reading order
+            heapq.heapreplace(self.heap, entry)
+
+    def add_blocks(self, blocks):
+        """
+        adds the spans of the horizontal text lines of 'blocks' (as returned by get_page_text)
+        """
+        for block in blocks:
+            # only considers text blocks (type 0)
+            if block["type"] != 0:
+                continue
+            for line in block["lines"]:
+                # only considers horizontal lines, written left to right
+                if line["dir"] != (1.0, 0.0) or line["wmode"] != 0:
+                    continue
+                for span in line["spans"]:
+                    self.add(span["size"], span["text"], span["origin"])
+
+    def title(self):
+        """
+        returns the selected spans joined in reading order, as a raw (not parsed) string
+        """
+        spans = sorted((entry[3] for entry in self.heap), key=TitleSpan.reading_key)
+        return "".join([span.text.strip() + " " for span in spans])
+
+    def may_go_on_below(self, bottom):
+        """
+        True if the title could go on below the 'bottom' of the part of the page the
+        spans were taken from: a next line of the title would not fit above it
+        """
+        if not self.heap:
+            return False
+        last_baseline = max(entry[3].y for entry in self.heap)
+        return last_baseline + self.size * NEXT_LINE_BOTTOM > bottom
+
+
+def metadata_title_score(title):
+    """
+    how much a (raw) metadata title looks like the title of a paper, from 0 to 1:
+    empty titles, tool leftovers ("Microsoft Word - draft.docx", "untitled"), file
+    names, DOIs and other identifiers score 0, titles of one or two words, with
+    underscores or made mostly of digits and symbols score less than a plain sentence.
+    """
+    title = title.strip()
+    if len(title) <= 5:
+        return 0.0
+    if (
+        _TOOL_PREFIX.match(title)
+        or _FILE_NAME.search(title)
+        or _DOI.match(title)
+        or _ARXIV_ID.match(title)
+    ):
+        return 0.0
+    words = title.split()
+    if len(words) == 1:
+        # a single token: an identifier or a file name
+        return 0.0
+    score = 1.0
+    if len(words) < 3:
+        score -= 0.5
+    if "_" in title:
+        score -= 0.5
+    letters = sum(1 for char in title if char.isalpha())
+    if letters < 0.6 * len(title.replace(" ", "")):
+        score -= 0.5
+    return max(0.0, score)
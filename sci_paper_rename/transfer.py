@@ -0,0 +1,122 @@
+import os
+import errno
+import shutil
+import logging
+
+from .stats import timed_stage
+
+logger = logging.getLogger(__name__)
+
+# how a renamed file is placed in the output directory:
+#   move     -> the file is moved (one atomic rename, a kernel-side copy across file systems)
+#   hardlink -> the original file is kept, the new name is a hard link to it
+#   symlink  -> the original file is kept, the new name is a symbolic link to it
+#   reflink  -> the original file is kept, the new name is a copy-on-write clone of it
+#               (a kernel-side copy if the file system can not clone)
+LINK_MODES = ("move", "hardlink", "symlink", "reflink")
+# ioctl of linux/fs.h cloning a whole file (btrfs, xfs, ...)
+FICLONE = 0x40049409
+# suffix of the temporary file written while copying across file systems
+PARTIAL_SUFFIX = ".part"
+
+
+def copy_data(src_fd, dst_fd, size):
+    """
+    copies 'size' bytes between two file descriptors, in the kernel when possible
+    (copy_file_range, then sendfile), through user space otherwise
+    """
+    copied = 0
+    for copy_function in ("copy_file_range", "sendfile"):
+        if not hasattr(os, copy_function):
+            continue
+        try:
+            while copied < size:
+                if copy_function == "copy_file_range":
+                    sent = os.copy_file_range(src_fd, dst_fd, size - copied)
+                else:
+                    sent = os.sendfile(dst_fd, src_fd, copied, size - copied)
+                if sent == 0:
+                    break
+                copied += sent
+            return copied
+        except OSError as e:
+            # not supported between these files, try the next way if nothing was copied
+            if copied or e.errno not in (
+                errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EBADF
+            ):
+                raise
+    with os.fdopen(os.dup(src_fd), "rb") as src, os.fdopen(os.dup(dst_fd), "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    return size
+
+
+def copy_file(source, target, clone=False, exclusive=False):
+    """
+    copies 'source' to 'target' through a temporary file in the target directory,
+    which is renamed to 'target' only once complete. if 'clone', the copy is first
+    tried as a copy-on-write clone (FICLONE).
+    if 'exclusive', an existing 'target' is not replaced: FileExistsError is raised.
+    """
+    tmp_file = target + PARTIAL_SUFFIX
+    if exclusive:
+        # other processes may be copying to the same target
+        tmp_file = target + "." + str(os.getpid()) + PARTIAL_SUFFIX
+    with open(source, "rb") as src:
+        src_stat = os.fstat(src.fileno())
+        try:
+            with open(tmp_file, "wb") as dst:
+                cloned = False
+                if clone:
+                    try:
+                        import fcntl
+
+                        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                        cloned = True
+                    except (ImportError, OSError) as e:
+                        logger.debug("Clone not supported, copying: %s", e)
+                if not cloned:
+                    copy_data(src.fileno(), dst.fileno(), src_stat.st_size)
+                os.fsync(dst.fileno())
+            shutil.copystat(source, tmp_file)
+            if exclusive:
+                os.link(tmp_file, target)
+                os.remove(tmp_file)
+            else:
+                os.replace(tmp_file, target)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+
+def place_file(source, target, link_mode="move", exclusive=False):
+    """
+    places 'source' at 'target' (a full path in an existing directory) as given by
+    'link_mode' (see LINK_MODES), in a single step: the target name appears complete
+    or not at all. raises OSError if it fails.
+    if 'exclusive', an existing 'target' is never replaced, even by another process
+    placing a file at the same time: FileExistsError is raised instead.
+    """
+    with timed_stage("place_file"):
+        if link_mode == "move":
+            try:
+                if exclusive:
+                    # a hard link can not replace a file, unlike a rename
+                    os.link(source, target)
+                    os.remove(source)
+                else:
+                    os.replace(source, target)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                logger.debug("Target on another file system, copying: %s", target)
+                copy_file(source, target, exclusive=exclusive)
+                os.remove(source)
+        elif link_mode == "hardlink":
+            os.link(source, target)
+        elif link_mode == "symlink":
+            os.symlink(os.path.abspath(source), target)
+        elif link_mode == "reflink":
+            copy_file(source, target, clone=True, exclusive=exclusive)
+        else:
+            raise ValueError("Unknown link mode: " + str(link_mode))
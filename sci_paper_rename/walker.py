@@ -0,0 +1,141 @@
+import os
+import stat
+import fnmatch
+import logging
+
+logger = logging.getLogger(__name__)
+
+# directory where renamed files are moved, it is never scanned
+OUTPUT_DIR_NAME = "auto_renamed_pdf"
+# bytes read at once from a list of paths (see read_path_list)
+PATH_LIST_CHUNK_SIZE = 64 * 1024
+
+
+def matches_any(relative_name, name, patterns):
+    """
+    True if the relative path or the base name matches one of the glob 'patterns'
+    """
+    for pattern in patterns:
+        if fnmatch.fnmatch(relative_name, pattern) or fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+
+def iter_pdf_files(
+    base_dir,
+    recursive=False,
+    include=None,
+    exclude=None,
+    max_depth=None,
+    skip_paths=None,
+):
+    """
+    yields (relative_name, full_file_name, stat_result) for each pdf file found in base_dir.
+    files are yielded as directories are read (os.scandir), nothing is listed upfront.
+      recursive : also walks sub-directories, down to 'max_depth' levels (None: no limit)
+      include   : glob patterns, if given only files matching one of them are yielded
+      exclude   : glob patterns of files and directories to skip
+      skip_paths: set of full paths to ignore (e.g. files created by the current run),
+                  it may grow while the walk is in progress.
+    the '.pdf' extension is case insensitive and the output directory is always skipped.
+    the stat of each file comes from the DirEntry, it is not stat'ed again afterwards.
+    """
+    if not recursive:
+        max_depth = 0
+    include = include or []
+    exclude = exclude or []
+    if skip_paths is None:
+        skip_paths = set()
+
+    # directories still to be read: (full path, relative path, depth)
+    pending_dirs = [(base_dir, "", 0)]
+    while pending_dirs:
+        dir_name, relative_dir, depth = pending_dirs.pop()
+        sub_dirs = []
+        try:
+            dir_iterator = os.scandir(dir_name)
+        except OSError as e:
+            logger.warning("Could not read directory %s: %s", dir_name, e)
+            continue
+
+        with dir_iterator:
+            for entry in dir_iterator:
+                relative_name = os.path.join(relative_dir, entry.name)
+                if matches_any(relative_name, entry.name, exclude):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != OUTPUT_DIR_NAME and (
+                            max_depth is None or depth < max_depth
+                        ):
+                            sub_dirs.append((entry.path, relative_name, depth + 1))
+                        continue
+                    if not entry.name.lower().endswith(".pdf") or not entry.is_file():
+                        continue
+                    if include and not matches_any(relative_name, entry.name, include):
+                        continue
+                    if entry.path in skip_paths:
+                        continue
+                    file_stat = entry.stat()
+                except OSError:
+                    # the entry vanished while the directory was being read
+                    continue
+                logger.debug("found pdf file: %s", relative_name)
+                yield relative_name, entry.path, file_stat
+
+        # sub-directories are read once the current one is closed, in listing order
+        pending_dirs.extend(reversed(sub_dirs))
+
+
+def read_path_list(stream, separator=b"\n", chunk_size=PATH_LIST_CHUNK_SIZE):
+    """
+    yields the paths listed in the binary 'stream' (e.g. stdin fed by `find -print0`),
+    one per 'separator' (b"\\0" or b"\\n"), as soon as they are read: the stream is read
+    in chunks of at most 'chunk_size' bytes, the list is never read upfront.
+    paths are decoded like os.listdir does, empty entries are ignored.
+    """
+    pending = b""
+    while True:
+        chunk = stream.read1(chunk_size)
+        if not chunk:
+            break
+        *paths, pending = (pending + chunk).split(separator)
+        for path in paths:
+            if path:
+                yield os.fsdecode(path)
+    if pending:
+        yield os.fsdecode(pending)
+
+
+def iter_listed_pdf_files(paths, base_dir, skip_paths=None):
+    """
+    yields (relative_name, full_file_name, stat_result) like iter_pdf_files, for the
+    files of the 'paths' list (relative paths are relative to the current directory).
+    names are relative to 'base_dir' for the files inside it, full paths otherwise.
+    files that are missing, not regular files or not pdf files are skipped with a
+    warning. files of the output directory of 'base_dir' and 'skip_paths' are skipped.
+    """
+    if skip_paths is None:
+        skip_paths = set()
+    output_dir = os.path.join(base_dir, OUTPUT_DIR_NAME) + os.sep
+
+    for path in paths:
+        full_file_name = os.path.abspath(path)
+        if not full_file_name.lower().endswith(".pdf"):
+            logger.warning("Not a pdf file: %s", path)
+            continue
+        if full_file_name.startswith(output_dir) or full_file_name in skip_paths:
+            continue
+        try:
+            file_stat = os.stat(full_file_name)
+        except OSError as e:
+            logger.warning("Could not read %s: %s", path, e)
+            continue
+        if not stat.S_ISREG(file_stat.st_mode):
+            logger.warning("Not a regular file: %s", path)
+            continue
+        if full_file_name.startswith(base_dir + os.sep):
+            relative_name = full_file_name[len(base_dir) + 1 :]
+        else:
+            relative_name = full_file_name
+        yield relative_name, full_file_name, file_stat
@@ -0,0 +1,138 @@
+import os
+import time
+import errno
+import select
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# inotify events (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# struct inotify_event: int wd, uint32 mask, uint32 cookie, uint32 len, char name[len]
+EVENT_HEADER = struct.Struct("iIII")
+# a file is processed once it did not change for DEBOUNCE_SECONDS after its last event
+DEBOUNCE_SECONDS = 0.5
+
+
+class Inotify:
+    """
+    minimal inotify binding (through the C library, no extra dependency)
+    """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available on this system")
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, dir_name, mask):
+        import ctypes
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_name), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), dir_name)
+        return wd
+
+    def read_events(self, timeout=None):
+        """
+        waits up to 'timeout' seconds (forever if None) for events,
+        returns them as a list of (mask, name)
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def file_signature(path):
+    """
+    (size, mtime_ns) of the file, None if it is not there anymore
+    """
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return None
+    return file_stat.st_size, file_stat.st_mtime_ns
+
+
+def watch_pdf_files(dir_name, debounce=DEBOUNCE_SECONDS):
+    """
+    yields the full path of each pdf file written (close-write) or moved into 'dir_name',
+    once it has not changed for 'debounce' seconds: files still being downloaded
+    are not picked up half written. files already in the directory are not yielded.
+    runs until the generator is closed.
+    """
+    inotify = Inotify()
+    try:
+        inotify.add_watch(dir_name, IN_CLOSE_WRITE | IN_MOVED_TO)
+        # path -> (deadline, signature) of the files waiting for their debounce delay
+        pending = {}
+        while True:
+            timeout = None
+            if pending:
+                deadline = min(deadline for deadline, signature in pending.values())
+                timeout = max(0.0, deadline - time.monotonic())
+            for mask, name in inotify.read_events(timeout):
+                if mask & IN_Q_OVERFLOW:
+                    # the kernel queue overflowed and events were lost,
+                    # the directory is listed once to find the files they were about
+                    logger.warning("Watch events were lost, listing %s", dir_name)
+                    with os.scandir(dir_name) as entries:
+                        names = [
+                            entry.name
+                            for entry in entries
+                            if entry.is_file() and entry.name.lower().endswith(".pdf")
+                        ]
+                elif mask & (IN_ISDIR | IN_IGNORED) or not name.lower().endswith(".pdf"):
+                    continue
+                else:
+                    names = [name]
+                for name in names:
+                    path = os.path.join(dir_name, name)
+                    pending[path] = (time.monotonic() + debounce, file_signature(path))
+
+            now = time.monotonic()
+            for path, (deadline, signature) in list(pending.items()):
+                if deadline > now:
+                    continue
+                current_signature = file_signature(path)
+                if current_signature is None:
+                    # moved away or deleted meanwhile
+                    del pending[path]
+                elif current_signature != signature:
+                    # still being written
+                    pending[path] = (now + debounce, current_signature)
+                else:
+                    del pending[path]
+                    yield path
+    finally:
+        inotify.close()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import shutil
+import tempfile
+import concurrent.futures
+from sci_paper_rename import extract_title, extract_titles, rename_batch
+from sci_paper_rename.archive import ArchiveIndex
+from sci_paper_rename.stats import RunStats, set_collector
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+TITLE_1 = 'A_structured_survey_of_quantum_computing_for_the_financial_industry.pdf'
+
+
+def test_api():
+    tmp_dir = tempfile.mkdtemp()
+    paths = [os.path.join(tmp_dir, name) for name in ('a.pdf', 'b.pdf', 'broken.pdf')]
+    shutil.copy(os.path.join(EXAMPLES_DIR, '1.pdf'), paths[0])
+    shutil.copy(os.path.join(EXAMPLES_DIR, '1.pdf'), paths[1])
+    with open(paths[2], 'w') as f:
+        f.write('not a pdf')
+
+    assert extract_title(paths[0]).title == TITLE_1
+    # errors are raised for a single file, returned in a batch
+    try:
+        extract_title(paths[2])
+        assert False
+    except Exception:
+        pass
+    results = list(extract_titles(paths))
+    assert [result.title for result in results] == [TITLE_1, TITLE_1, None]
+    assert results[2].error is not None
+
+    planned = list(rename_batch(paths, dry_run=True))
+    assert [result.action for result in planned] == ['rename', 'duplicate', 'error']
+    assert sorted(os.listdir(tmp_dir)) == ['a.pdf', 'b.pdf', 'broken.pdf']
+
+    done = list(rename_batch(paths))
+    assert [result.target for result in done] == [result.target for result in planned]
+    # the original of the duplicate is found at its new path
+    assert done[1].original == done[0].target
+    assert os.path.isfile(os.path.join(tmp_dir, 'auto_renamed_pdf', TITLE_1))
+    assert os.path.isfile(os.path.join(tmp_dir, 'duplicated_b.pdf'))
+
+
+def test_rename_batch_like_the_command_line():
+    tmp_dir = tempfile.mkdtemp()
+    output_dir = os.path.join(tmp_dir, 'auto_renamed_pdf')
+    paths = [os.path.join(tmp_dir, name) for name in ('a.pdf', 'b.pdf')]
+    for path in paths:
+        shutil.copy(os.path.join(EXAMPLES_DIR, '1.pdf'), path)
+    # another paper already holds the name of the duplicate, it is not replaced
+    shutil.copy(os.path.join(EXAMPLES_DIR, '2.pdf'), os.path.join(tmp_dir, 'duplicated_b.pdf'))
+
+    # the duplicate is not scanned
+    run_stats = RunStats()
+    set_collector(run_stats)
+    archive_index = ArchiveIndex(output_dir)
+    try:
+        done = list(rename_batch(paths, output_dir, archive_index=archive_index))
+    finally:
+        set_collector(None)
+        archive_index.close()
+    assert [result.action for result in done] == ['rename', 'duplicate']
+    assert len(run_stats.durations['fitz.open']) == 1
+    assert done[1].target == os.path.join(tmp_dir, 'duplicated_b_2.pdf')
+    assert os.path.getsize(os.path.join(tmp_dir, 'duplicated_b.pdf')) == \
+        os.path.getsize(os.path.join(EXAMPLES_DIR, '2.pdf'))
+
+    # a new copy of the paper is found in the archive, even in another batch
+    shutil.copy(os.path.join(EXAMPLES_DIR, '1.pdf'), paths[0])
+    archive_index = ArchiveIndex(output_dir)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            again = list(rename_batch(paths[:1], output_dir, executor=executor,
+                                      archive_index=archive_index))
+    finally:
+        archive_index.close()
+    assert [result.action for result in again] == ['duplicate']
+    assert again[0].original == os.path.join(output_dir, TITLE_1)
+
+
+if __name__ == '__main__':
+
+    test_api()
+    test_rename_batch_like_the_command_line()
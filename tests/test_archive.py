@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import sqlite3
+import tempfile
+from sci_paper_rename.archive import INDEX_FILE_NAME, ArchiveIndex
+from sci_paper_rename.scan import hash_file
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_archive_index():
+    with tempfile.TemporaryDirectory() as archive_dir:
+        write(os.path.join(archive_dir, 'A.pdf'), b'paper a')
+        write(os.path.join(archive_dir, 'B.pdf'), b'paper b!')
+
+        index = ArchiveIndex(archive_dir)
+        assert index.reindex(hash_file) == (2, 0)
+        # unchanged files are not hashed again
+        assert index.reindex(hash_file) == (0, 0)
+        assert index.has_size(len(b'paper a'))
+        assert not index.has_size(1)
+        fingerprint = hash_file(os.path.join(archive_dir, 'A.pdf'))
+        assert index.find(fingerprint) == os.path.join(archive_dir, 'A.pdf')
+
+        os.remove(os.path.join(archive_dir, 'B.pdf'))
+        assert index.reindex(hash_file) == (0, 1)
+        index.close()
+
+        # the index is kept between runs, and dropped entries of missing files
+        index = ArchiveIndex(archive_dir)
+        os.remove(os.path.join(archive_dir, 'A.pdf'))
+        assert index.find(fingerprint) is None
+        assert not index.has_size(len(b'paper a'))
+        index.close()
+
+
+def test_archive_index_by_name():
+    with tempfile.TemporaryDirectory() as archive_dir:
+        write(os.path.join(archive_dir, 'A.pdf'), b'paper a')
+        write(os.path.join(archive_dir, 'copy.pdf'), b'paper a')
+        index = ArchiveIndex(archive_dir)
+        assert index.reindex(hash_file) == (2, 0)
+        fingerprint = hash_file(os.path.join(archive_dir, 'A.pdf'))
+
+        # a file renamed by hand keeps its content indexed
+        os.rename(os.path.join(archive_dir, 'A.pdf'), os.path.join(archive_dir, 'B.pdf'))
+        assert index.reindex(hash_file) == (1, 1)
+        assert index.find(fingerprint) == os.path.join(archive_dir, 'B.pdf')
+        # both files with the same content are indexed
+        os.remove(os.path.join(archive_dir, 'B.pdf'))
+        assert index.find(fingerprint) == os.path.join(archive_dir, 'copy.pdf')
+        index.close()
+
+
+def test_archive_index_upgrade():
+    # an index written before the entries were keyed by name is kept
+    with tempfile.TemporaryDirectory() as archive_dir:
+        write(os.path.join(archive_dir, 'A.pdf'), b'paper a')
+        file_stat = os.stat(os.path.join(archive_dir, 'A.pdf'))
+        conn = sqlite3.connect(os.path.join(archive_dir, INDEX_FILE_NAME))
+        conn.execute('CREATE TABLE archive (fingerprint TEXT PRIMARY KEY, name TEXT NOT NULL,'
+                     ' title TEXT, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)')
+        conn.execute('INSERT INTO archive VALUES (?, ?, ?, ?, ?)',
+                     ('old hash', 'A.pdf', 'A', file_stat.st_size, file_stat.st_mtime_ns))
+        conn.execute('PRAGMA user_version = 1')
+        conn.commit()
+        conn.close()
+
+        index = ArchiveIndex(archive_dir)
+        assert index.find('old hash') == os.path.join(archive_dir, 'A.pdf')
+        assert index.reindex(hash_file) == (0, 0)
+        index.close()
+
+
+if __name__ == '__main__':
+
+    test_archive_index()
+    test_archive_index_by_name()
+    test_archive_index_upgrade()
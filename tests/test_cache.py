@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import tempfile
+from sci_paper_rename.cache import ScanCache
+
+
+def test_cache():
+    tmp_dir = tempfile.mkdtemp()
+    pdf_file = os.path.join(tmp_dir, 'paper.pdf')
+    with open(pdf_file, 'wb') as f:
+        f.write(b'%PDF-1.4 test')
+
+    cache = ScanCache(os.path.join(tmp_dir, 'cache.sqlite3'), max_entries=1)
+    file_stat = os.stat(pdf_file)
+    assert cache.get(pdf_file, file_stat) is None
+    cache.put(pdf_file, file_stat, 'abc', 'Meta.pdf', 'Title.pdf')
+    assert cache.get(pdf_file, file_stat) == ('abc', 'Meta.pdf', 'Title.pdf')
+
+    # a modified file must not hit the cache
+    with open(pdf_file, 'ab') as f:
+        f.write(b' changed')
+    assert cache.get(pdf_file, os.stat(pdf_file)) is None
+
+    # only the most recently used entry survives eviction
+    cache.put(pdf_file + '.old', file_stat, 'old')
+    cache.put(pdf_file, file_stat, 'abc', 'Meta.pdf', 'Title.pdf')
+    cache.get(pdf_file, file_stat)
+    cache.close()
+    cache = ScanCache(os.path.join(tmp_dir, 'cache.sqlite3'))
+    assert cache.get(pdf_file + '.old', file_stat) is None
+    assert cache.get(pdf_file, file_stat) is not None
+    cache.close()
+
+    cache = ScanCache(os.path.join(tmp_dir, 'cache.sqlite3'), rebuild=True)
+    assert cache.get(pdf_file, file_stat) is None
+    cache.close()
+    print('cache ok')
+
+
+if __name__ == '__main__':
+
+    test_cache()
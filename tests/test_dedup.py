@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import hashlib
+import tempfile
+from sci_paper_rename.dedup import DuplicateIndex
+
+
+def write_file(dir_name, file_name, content):
+    path = os.path.join(dir_name, file_name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def full_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def test_dedup():
+    tmp_dir = tempfile.mkdtemp()
+    big = b'x' * 300000
+    # same size and same head/tail as 'big', different middle
+    big_other = big[:150000] + b'y' + big[150001:]
+
+    index = DuplicateIndex(full_digest, block_size=1024)
+    unique = write_file(tmp_dir, 'unique.pdf', b'unique size')
+    assert index.find_duplicate(unique, os.path.getsize(unique)) is None
+    a = write_file(tmp_dir, 'a.pdf', big)
+    assert index.find_duplicate(a, len(big)) is None
+    # unique sizes are never hashed
+    assert index.partial_hashed == 0 and index.full_hashed == 0
+
+    b = write_file(tmp_dir, 'b.pdf', big_other)
+    assert index.find_duplicate(b, len(big)) is None
+    c = write_file(tmp_dir, 'c.pdf', big)
+    # the original was moved after being registered
+    moved_a = os.path.join(tmp_dir, 'moved_a.pdf')
+    os.rename(a, moved_a)
+    index.update_path(a, moved_a)
+    assert index.find_duplicate(c, len(big)) == moved_a
+
+    small = write_file(tmp_dir, 'small.pdf', b'small')
+    small_copy = write_file(tmp_dir, 'small_copy.pdf', b'small')
+    assert index.find_duplicate(small, 5) is None
+    assert index.find_duplicate(small_copy, 5) == small
+
+    # a forgotten file is not the original of the next copies
+    index.forget(unique, os.path.getsize(unique))
+    unique_copy = write_file(tmp_dir, 'unique_copy.pdf', b'unique size')
+    assert index.find_duplicate(unique_copy, os.path.getsize(unique_copy)) is None
+    # forgetting a duplicate leaves its original registered
+    index.forget(c, len(big))
+    d = write_file(tmp_dir, 'd.pdf', big)
+    assert index.find_duplicate(d, len(big)) == moved_a
+    print('dedup ok')
+
+
+if __name__ == '__main__':
+
+    test_dedup()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import io
+import os
+import json
+import tempfile
+from sci_paper_rename.events import EventWriter, Progress, format_duration
+
+
+def test_event_writer():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        events_file = os.path.join(tmp_dir, 'events.jsonl')
+        events = EventWriter(events_file)
+        events.write({'path': '/papers/1.pdf', 'action': 'rename'})
+        events.write({'path': '/papers/2.pdf', 'action': 'skip'})
+        events.close()
+        with open(events_file) as f:
+            lines = [json.loads(line) for line in f]
+    assert [event['path'] for event in lines] == ['/papers/1.pdf', '/papers/2.pdf']
+    assert events.count == 2
+
+
+def test_progress():
+    stream = io.StringIO()
+    progress = Progress(total=4, stream=stream, interval=0)
+    for _ in range(3):
+        progress.update()
+    progress.close()
+    last_line = stream.getvalue().rstrip('\n').split('\r')[-1]
+    assert last_line.startswith('3/4 files')
+    assert 'ETA' in last_line
+    assert format_duration(3725) == '1:02:05'
+
+    # the total is known once the files of the run were all found
+    progress = Progress(stream=io.StringIO(), interval=0)
+    files = progress.counted(['1.pdf', '2.pdf'])
+    assert next(files) == '1.pdf'
+    assert progress.total is None
+    assert list(files) == ['2.pdf']
+    assert progress.total == 2
+    assert format_duration(65) == '1:05'
+
+
+if __name__ == '__main__':
+
+    test_event_writer()
+    test_progress()
@@ -2,18 +2,40 @@
 
 import sys
 sys.path.append('../')
-from sci_rename import hash_file
+import os
+from sci_paper_rename.__main__ import hash_file
+from sci_paper_rename.scan import mapped_file
 import re
+import concurrent.futures
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
 
 def test_hash():
-    file1 = '../examples/1.pdf'
-    file2 = '../examples/1.pdf'
-    file3 = '../examples/2.pdf'
+    file1 = os.path.join(EXAMPLES_DIR, '1.pdf')
+    file2 = os.path.join(EXAMPLES_DIR, '1.pdf')
+    file3 = os.path.join(EXAMPLES_DIR, '2.pdf')
     
     print(hash_file(file1))
     print(hash_file(file2))
     print(hash_file(file3))
+    assert hash_file(file1) == hash_file(file2)
+    assert hash_file(file1) != hash_file(file3)
+
+
+def mapped_type(path):
+    with mapped_file(path) as buffer:
+        return type(buffer).__name__
+
+
+def test_mapped_only_in_workers():
+    # a file truncated while it is mapped kills the process: the main process reads it
+    path = os.path.join(EXAMPLES_DIR, '1.pdf')
+    assert mapped_type(path) == 'bytes'
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(mapped_type, path).result() == 'memoryview'
+        assert executor.submit(hash_file, path).result() == hash_file(path)
 
 if __name__ == '__main__':
     
-    test_hash()
\ No newline at end of file
+    test_hash()
+    test_mapped_only_in_workers()
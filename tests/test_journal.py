@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import tempfile
+from sci_paper_rename.journal import Journal, read_journal
+
+
+def test_journal():
+    tmp_dir = tempfile.mkdtemp()
+    journal_file = os.path.join(tmp_dir, 'journal.jsonl')
+    done_action = {'action': 'rename', 'source': '/papers/1.pdf',
+                   'target': '/papers/auto_renamed_pdf/Title.pdf'}
+    pending_action = {'action': 'duplicate', 'source': '/papers/2.pdf',
+                      'target': '/papers/duplicated_2.pdf'}
+    failed_action = {'action': 'rename', 'source': '/papers/3.pdf',
+                     'target': '/papers/auto_renamed_pdf/Title_2.pdf'}
+
+    journal = Journal(journal_file, truncate=True, fsync_every=1)
+    journal.intent(done_action)
+    journal.done(done_action)
+    journal.intent(pending_action)
+    journal.intent(failed_action)
+    journal.failed(failed_action)
+    journal.close()
+    # a record cut by a crash is ignored
+    with open(journal_file, 'a') as f:
+        f.write('{"op": "done", "act')
+
+    completed, pending = read_journal(journal_file)
+    assert completed == {'/papers/1.pdf'}
+    assert pending == [pending_action]
+
+    Journal(journal_file).close(remove=True)
+    assert not os.path.exists(journal_file)
+
+
+if __name__ == '__main__':
+
+    test_journal()
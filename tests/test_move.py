@@ -2,17 +2,24 @@
 
 import sys
 sys.path.append('../')
-from sci_rename import move_file
+import os
+import tempfile
+from sci_paper_rename.__main__ import move_file
 import re
 
 
-def move():
+def test_move():
     
-    src_file = 'teste.txt'
-    dest_dir = "test_dir"
-    move_file(src_file, dest_dir)
+    tmp_dir = tempfile.mkdtemp()
+    src_file = os.path.join(tmp_dir, 'teste.txt')
+    with open(src_file, 'w') as f:
+        f.write('teste')
+    dest_dir = os.path.join(tmp_dir, 'test_dir')
+    assert move_file(src_file, dest_dir, 'teste.txt')
+    assert os.path.isfile(os.path.join(dest_dir, 'teste.txt'))
+    assert not os.path.exists(src_file)
  
 
 if __name__ == '__main__':
     
-    move()
\ No newline at end of file
+    test_move()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+from sci_paper_rename.neardup import NearDuplicateIndex, text_signature
+
+ABSTRACT = (
+    'We present a scalable architecture for access management in the internet of'
+    ' things based on a permissioned blockchain, and evaluate its throughput and'
+    ' latency on a testbed of constrained devices running several smart contracts.'
+)
+
+
+def test_near_duplicates():
+    paper = text_signature('Blockchain meets IoT\n' + ABSTRACT)
+    new_version = text_signature('arXiv:1711.07061v2 [cs.CR]\nBlockchain meets IoT\n' + ABSTRACT)
+    other_paper = text_signature(
+        'Borg, the next generation\nCluster management at scale, with a look at how'
+        ' jobs are scheduled across machines in the data centers of a large company.'
+    )
+    assert text_signature('too short') is None
+
+    index = NearDuplicateIndex(0.7)
+    assert index.find_near_duplicate('paper.pdf', paper) is None
+    assert index.find_near_duplicate('other.pdf', other_paper) is None
+    index.update_path('paper.pdf', 'renamed/Blockchain_meets_iot.pdf')
+    original, similarity = index.find_near_duplicate('paper_v2.pdf', new_version)
+    assert original == 'renamed/Blockchain_meets_iot.pdf'
+    assert 0.7 <= similarity <= 1
+    assert index.find_near_duplicate('scan.pdf', None) is None
+
+    # a file looked up without being registered is not the original of the next ones
+    index = NearDuplicateIndex(0.7)
+    assert index.find_near_duplicate('duplicated_paper.pdf', paper, register=False) is None
+    assert index.find_near_duplicate('paper_v2.pdf', new_version) is None
+    index = NearDuplicateIndex(0.7)
+    index.add('archive/Blockchain_meets_iot.pdf', paper)
+    original, similarity = index.find_near_duplicate('paper_v2.pdf', new_version)
+    assert original == 'archive/Blockchain_meets_iot.pdf'
+
+
+if __name__ == '__main__':
+
+    test_near_duplicates()
@@ -2,7 +2,7 @@
 
 import sys
 sys.path.append('../')
-from sci_rename import parse_title
+from sci_paper_rename.__main__ import parse_title
 import re
 
 
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import threading
+import concurrent.futures
+from sci_paper_rename.pipeline import ReadAhead, bounded_map
+from sci_paper_rename.supervisor import SupervisedPool
+
+
+def double(item):
+    return item * 2
+
+
+def slow_input(first_result):
+    # the second item comes only once the first result was taken, like a path
+    # written to stdin after the first file is reported
+    yield 1
+    assert first_result.wait(10), 'the first result waited for the next item'
+    yield 2
+
+
+def take_results(results, first_result):
+    taken = []
+    for result in results:
+        taken.append(result)
+        first_result.set()
+    return taken
+
+
+def test_bounded_map_read_ahead():
+    first_result = threading.Event()
+    listed = ReadAhead(slow_input(first_result), 4)
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        results = bounded_map(executor, double, listed, 4, input_ready=listed.ready)
+        assert take_results(results, first_result) == [2, 4]
+
+
+def test_supervised_pool_read_ahead():
+    first_result = threading.Event()
+    listed = ReadAhead(slow_input(first_result), 4)
+    pool = SupervisedPool(2, timeout=30)
+    try:
+        results = pool.map(double, listed, input_ready=listed.ready)
+        assert take_results(results, first_result) == [2, 4]
+    finally:
+        pool.close()
+
+
+def fail_after_first():
+    yield 1
+    raise OSError('broken pipe')
+
+
+def test_read_ahead_error():
+    listed = ReadAhead(fail_after_first(), 4)
+    taken = []
+    try:
+        for item in listed:
+            taken.append(item)
+    except OSError as e:
+        assert str(e) == 'broken pipe'
+    else:
+        assert False, 'the error of the input was lost'
+    assert taken == [1]
+
+
+if __name__ == '__main__':
+
+    test_bounded_map_read_ahead()
+    test_supervised_pool_read_ahead()
+    test_read_ahead_error()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import tempfile
+from sci_paper_rename.plan import NameIndex, apply_action, read_plan, write_plan
+
+
+def test_name_index():
+    index = NameIndex(['Paper.pdf', 'Paper_2.pdf'])
+    assert index.reserve('Other.pdf') == 'Other.pdf'
+    assert index.reserve('Paper.pdf') == 'Paper_3.pdf'
+    assert index.reserve('paper.PDF') == 'paper_4.PDF'
+    assert index.reserve('Other.pdf') == 'Other_2.pdf'
+    index.release('Other_2.pdf')
+    assert index.reserve('Other_2.pdf') == 'Other_2.pdf'
+
+
+def test_plan_file():
+    tmp_dir = tempfile.mkdtemp()
+    plan_file = os.path.join(tmp_dir, 'plan.json')
+    actions = [{'action': 'rename', 'source': '/papers/1.pdf',
+                'target': '/papers/auto_renamed_pdf/Title.pdf'}]
+    write_plan(plan_file, '/papers', actions)
+    assert read_plan(plan_file) == ('/papers', actions)
+
+
+def test_duplicate_never_replaces():
+    tmp_dir = tempfile.mkdtemp()
+    for name in ('x.pdf', 'duplicated_x.pdf'):
+        with open(os.path.join(tmp_dir, name), 'w') as f:
+            f.write(name)
+    action = {'action': 'duplicate', 'source': os.path.join(tmp_dir, 'x.pdf'),
+              'target': os.path.join(tmp_dir, 'duplicated_x.pdf')}
+    for exclusive in (False, True):
+        try:
+            apply_action(action, exclusive)
+            assert False, 'the existing file was replaced'
+        except FileExistsError:
+            pass
+        with open(action['target']) as f:
+            assert f.read() == 'duplicated_x.pdf'
+    action['target'] = os.path.join(tmp_dir, 'duplicated_x_2.pdf')
+    assert apply_action(action) == action['target']
+    assert sorted(os.listdir(tmp_dir)) == ['duplicated_x.pdf', 'duplicated_x_2.pdf']
+
+
+if __name__ == '__main__':
+
+    test_name_index()
+    test_plan_file()
+    test_duplicate_never_replaces()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import shutil
+import builtins
+import tempfile
+import time
+from sci_paper_rename.__main__ import rename_files_in_dir
+from sci_paper_rename import commit
+from sci_paper_rename.archive import ArchiveIndex
+from sci_paper_rename.stats import RunStats, set_collector
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def copy_examples(dir_name, names):
+    for source, target in names:
+        shutil.copy(os.path.join(EXAMPLES_DIR, source), os.path.join(dir_name, target))
+
+
+def test_hash_on_size_collision():
+    # files with a unique size are scanned without being hashed, only the two copies
+    # of 1.pdf are hashed (the copy is scanned ahead by the pool, not in a serial run)
+    for jobs in (1, 2):
+        tmp_dir = tempfile.mkdtemp()
+        copy_examples(tmp_dir, [('1.pdf', 'a.pdf'), ('2.pdf', 'b.pdf'),
+                                ('3.pdf', 'c.pdf'), ('1.pdf', 'd.pdf')])
+        run_stats = RunStats()
+        set_collector(run_stats)
+        try:
+            plan = []
+            rename_files_in_dir(tmp_dir, jobs=jobs, loop_type='1', plan=plan)
+        finally:
+            set_collector(None)
+        assert sorted(action['action'] for action in plan) == ['duplicate', 'rename',
+                                                               'rename', 'rename']
+        assert len(run_stats.durations['hash_file']) == 2
+        assert len(run_stats.durations['fitz.open']) == (3 if jobs == 1 else 4)
+
+
+
+def run_with_index(dir_name, link_mode='move'):
+    archive_index = ArchiveIndex(os.path.join(dir_name, 'auto_renamed_pdf'))
+    try:
+        return rename_files_in_dir(dir_name, loop_type='1', link_mode=link_mode,
+                                   archive_index=archive_index)
+    finally:
+        archive_index.close()
+
+
+def listing(dir_name):
+    return (sorted(os.listdir(dir_name)),
+            sorted(os.listdir(os.path.join(dir_name, 'auto_renamed_pdf'))))
+
+
+def test_second_run():
+    # a duplicate keeps a single prefix, run after run
+    tmp_dir = tempfile.mkdtemp()
+    copy_examples(tmp_dir, [('1.pdf', 'a.pdf'), ('2.pdf', 'b.pdf'), ('1.pdf', 'c.pdf')])
+    run_with_index(tmp_dir)
+    first_run = listing(tmp_dir)
+    assert first_run[0] == ['auto_renamed_pdf', 'duplicated_c.pdf']
+    assert run_with_index(tmp_dir) == (0, 1)
+    assert listing(tmp_dir) == first_run
+
+    # the originals kept by the link modes are not duplicates of their links or copies
+    # (reflink copies the file where it can not be cloned, e.g. on tmpfs)
+    for link_mode in ('hardlink', 'symlink', 'reflink'):
+        tmp_dir = tempfile.mkdtemp()
+        copy_examples(tmp_dir, [('1.pdf', 'a.pdf'), ('2.pdf', 'b.pdf')])
+        assert run_with_index(tmp_dir, link_mode) == (2, 2)
+        first_run = listing(tmp_dir)
+        assert run_with_index(tmp_dir, link_mode) == (0, 0)
+        assert listing(tmp_dir) == first_run
+        for name in first_run[1]:
+            assert os.path.exists(os.path.join(tmp_dir, 'auto_renamed_pdf', name))
+
+
+
+def test_archived_from_scan_read():
+    # the renamed files are added to the archive with the hash of their scan read,
+    # they are not read again once moved
+    hashed_again = []
+    hash_file = commit.hash_file
+    commit.hash_file = lambda path: hashed_again.append(path) or hash_file(path)
+    try:
+        for jobs in (1, 2):
+            tmp_dir = tempfile.mkdtemp()
+            copy_examples(tmp_dir, [('1.pdf', 'a.pdf'), ('2.pdf', 'b.pdf'),
+                                    ('3.pdf', 'c.pdf')])
+            archive_index = ArchiveIndex(os.path.join(tmp_dir, 'auto_renamed_pdf'))
+            try:
+                assert rename_files_in_dir(tmp_dir, jobs=jobs, loop_type='1',
+                                           archive_index=archive_index) == (3, 3)
+                for example in ('1.pdf', '2.pdf', '3.pdf'):
+                    fingerprint = hash_file(os.path.join(EXAMPLES_DIR, example))
+                    assert archive_index.find(fingerprint) is not None
+            finally:
+                archive_index.close()
+    finally:
+        commit.hash_file = hash_file
+    assert hashed_again == []
+
+
+def test_near_duplicate_of_archived_file():
+    # a new version of a paper renamed in an earlier run is a near-duplicate of the
+    # archived file, a file marked as a duplicate is not the original of the next ones
+    tmp_dir = tempfile.mkdtemp()
+    copy_examples(tmp_dir, [('1.pdf', 'a.pdf')])
+    archive_dir = os.path.join(tmp_dir, 'auto_renamed_pdf')
+    archive_index = ArchiveIndex(archive_dir)
+    try:
+        assert rename_files_in_dir(tmp_dir, loop_type='1', near_duplicates=0.8,
+                                   archive_index=archive_index) == (1, 1)
+    finally:
+        archive_index.close()
+    # other bytes, same text
+    with open(os.path.join(EXAMPLES_DIR, '1.pdf'), 'rb') as f:
+        content = f.read()
+    with open(os.path.join(tmp_dir, 'b.pdf'), 'wb') as f:
+        f.write(content + b'\n% downloaded again\n')
+    with open(os.path.join(tmp_dir, 'duplicated_c.pdf'), 'wb') as f:
+        f.write(content + b'\n% downloaded once more\n')
+    archived = os.listdir(archive_dir)
+    archive_index = ArchiveIndex(archive_dir)
+    try:
+        assert rename_files_in_dir(tmp_dir, loop_type='1', near_duplicates=0.8,
+                                   archive_index=archive_index) == (0, 2)
+    finally:
+        archive_index.close()
+    assert listing(tmp_dir)[0] == ['auto_renamed_pdf', 'duplicated_b.pdf',
+                                   'duplicated_c.pdf']
+    assert os.listdir(archive_dir) == archived
+
+
+def test_skipped_file_is_not_an_original():
+    # two copies of a paper, one by one: the first one is skipped, so the second one
+    # is renamed, it is not a duplicate of the skipped file
+    for prefetch in (0, 4):
+        tmp_dir = tempfile.mkdtemp()
+        copy_examples(tmp_dir, [('1.pdf', 'a.pdf'), ('1.pdf', 'b.pdf')])
+        prompts = []
+
+        def answer(prompt):
+            prompts.append(prompt)
+            return 's' if len(prompts) == 1 else 'c'
+
+        builtins.input, original_input = answer, builtins.input
+        try:
+            assert rename_files_in_dir(tmp_dir, loop_type='2', prefetch=prefetch) == (1, 2)
+        finally:
+            builtins.input = original_input
+        assert all(prompt.startswith('Proposed name: ') for prompt in prompts)
+        assert listing(tmp_dir)[1] == ['A_structured_survey_of_quantum_computing_for_the_financial_industry.pdf']
+        assert len(listing(tmp_dir)[0]) == 2
+
+
+def same_content(path, example):
+    with open(path, 'rb') as f, open(os.path.join(EXAMPLES_DIR, example), 'rb') as g:
+        return f.read() == g.read()
+
+
+def test_listed_files_read_ahead():
+    # a listed path that is not a file to scan does not hold back the files scanned
+    # before it while the next path is awaited (like paths written to stdin)
+    tmp_dir = tempfile.mkdtemp()
+    copy_examples(tmp_dir, [('1.pdf', 'a.pdf'), ('2.pdf', 'b.pdf')])
+    renamed = os.path.join(tmp_dir, 'auto_renamed_pdf',
+                           'A_structured_survey_of_quantum_computing_for_the_financial_industry.pdf')
+
+    def listed():
+        yield os.path.join(tmp_dir, 'a.pdf')
+        yield os.path.join(tmp_dir, 'notes.txt')
+        for _ in range(200):
+            if os.path.exists(renamed):
+                break
+            time.sleep(0.05)
+        else:
+            assert False, 'a.pdf waited for the next path'
+        yield os.path.join(tmp_dir, 'b.pdf')
+
+    for jobs in (1, 2):
+        assert rename_files_in_dir(tmp_dir, jobs=jobs, loop_type='1',
+                                   listed_files=listed(), read_ahead=4) == (2, 2)
+        for name in os.listdir(os.path.join(tmp_dir, 'auto_renamed_pdf')):
+            os.rename(os.path.join(tmp_dir, 'auto_renamed_pdf', name),
+                      os.path.join(tmp_dir, 'a.pdf' if name == os.path.basename(renamed)
+                                   else 'b.pdf'))
+
+
+def test_duplicate_name_taken():
+    # duplicated_x.pdf is another paper, it is not replaced by the duplicate x.pdf
+    tmp_dir = tempfile.mkdtemp()
+    copy_examples(tmp_dir, [('1.pdf', 'a.pdf'), ('1.pdf', 'x.pdf'),
+                            ('2.pdf', 'duplicated_x.pdf')])
+    listed = [os.path.join(tmp_dir, name) for name in ('a.pdf', 'x.pdf')]
+    assert rename_files_in_dir(tmp_dir, loop_type='1', listed_files=listed) == (1, 2)
+    assert listing(tmp_dir)[0] == ['auto_renamed_pdf', 'duplicated_x.pdf',
+                                   'duplicated_x_2.pdf']
+    assert same_content(os.path.join(tmp_dir, 'duplicated_x.pdf'), '2.pdf')
+    assert same_content(os.path.join(tmp_dir, 'duplicated_x_2.pdf'), '1.pdf')
+
+
+if __name__ == '__main__':
+
+    test_hash_on_size_collision()
+    test_second_run()
+    test_archived_from_scan_read()
+    test_near_duplicate_of_archived_file()
+    test_skipped_file_is_not_an_original()
+    test_listed_files_read_ahead()
+    test_duplicate_name_taken()
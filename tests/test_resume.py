@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+from sci_paper_rename.journal import journal_path
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+TITLE_1 = 'A_structured_survey_of_quantum_computing_for_the_financial_industry.pdf'
+TITLE_2 = 'Blockchain_and_trusted_computing_problems_pitfalls_and_a_solution_for_hyperledger_fabric.pdf'
+TITLE_3 = 'Blockchain_meets_iot_an_architecture_for_scalable_access_management_in_iot.pdf'
+
+
+def run(*args):
+    code = ('import sys; sys.argv[0] = "sci-paper-rename"; '
+            'from sci_paper_rename.__main__ import main; main()')
+    return subprocess.run([sys.executable, '-c', code, '--yes', '--no-cache'] + list(args),
+                          cwd=PACKAGE_DIR, capture_output=True, text=True)
+
+
+def interrupted_run(records):
+    """
+    a directory with 1.pdf, 2.pdf and 3.pdf and the journal of an interrupted run,
+    returns (directory, output directory)
+    """
+    tmp_dir = tempfile.mkdtemp()
+    for name in ('1.pdf', '2.pdf', '3.pdf'):
+        shutil.copy(os.path.join(EXAMPLES_DIR, name), tmp_dir)
+    output_dir = os.path.join(tmp_dir, 'auto_renamed_pdf')
+    os.mkdir(output_dir)
+    with open(journal_path(tmp_dir), 'w') as f:
+        for op, action in records(tmp_dir, output_dir):
+            f.write(json.dumps({'op': op, 'action': action}) + '\n')
+    return tmp_dir, output_dir
+
+
+def rename(tmp_dir, output_dir, name, title):
+    return {'action': 'rename', 'source': os.path.join(tmp_dir, name),
+            'target': os.path.join(output_dir, title), 'link_mode': 'move'}
+
+
+def test_resume():
+    def records(tmp_dir, output_dir):
+        # 1.pdf was moved before the crash, 2.pdf was not, renaming 3.pdf failed
+        os.rename(os.path.join(tmp_dir, '1.pdf'), os.path.join(output_dir, TITLE_1))
+        failed = rename(tmp_dir, output_dir, '3.pdf', TITLE_3)
+        return [('intent', rename(tmp_dir, output_dir, '1.pdf', TITLE_1)),
+                ('intent', rename(tmp_dir, output_dir, '2.pdf', TITLE_2)),
+                ('intent', failed), ('failed', failed)]
+
+    tmp_dir, output_dir = interrupted_run(records)
+    result = run('--resume', tmp_dir)
+    assert result.returncode == 0, result.stderr
+    assert os.listdir(tmp_dir) == ['auto_renamed_pdf']
+    assert sorted(name for name in os.listdir(output_dir) if name.endswith('.pdf')) == \
+        [TITLE_1, TITLE_2, TITLE_3]
+
+
+def test_resume_copy_not_finished():
+    # a copy across file systems was complete, but its source was not removed yet
+    def records(tmp_dir, output_dir):
+        shutil.copy(os.path.join(tmp_dir, '1.pdf'), os.path.join(output_dir, TITLE_1))
+        return [('intent', rename(tmp_dir, output_dir, '1.pdf', TITLE_1))]
+
+    tmp_dir, output_dir = interrupted_run(records)
+    result = run('--resume', tmp_dir)
+    assert result.returncode == 0, result.stderr
+    assert os.listdir(tmp_dir) == ['auto_renamed_pdf']
+    assert sorted(name for name in os.listdir(output_dir) if name.endswith('.pdf')) == \
+        [TITLE_1, TITLE_2, TITLE_3]
+
+
+def test_journal_kept_without_resume():
+    # a new run does not forget an interrupted one, unless told to
+    def records(tmp_dir, output_dir):
+        os.rename(os.path.join(tmp_dir, '1.pdf'), os.path.join(output_dir, TITLE_1))
+        return [('intent', rename(tmp_dir, output_dir, '1.pdf', TITLE_1))]
+
+    tmp_dir, output_dir = interrupted_run(records)
+    with open(journal_path(tmp_dir)) as f:
+        journal = f.read()
+    result = run(tmp_dir)
+    assert result.returncode == 1
+    assert '--resume' in result.stderr
+    with open(journal_path(tmp_dir)) as f:
+        assert f.read() == journal
+    assert sorted(os.listdir(tmp_dir)) == [os.path.basename(journal_path(tmp_dir)),
+                                           '2.pdf', '3.pdf', 'auto_renamed_pdf']
+
+    result = run('--discard-journal', tmp_dir)
+    assert result.returncode == 0, result.stderr
+    assert os.listdir(tmp_dir) == ['auto_renamed_pdf']
+
+
+if __name__ == '__main__':
+
+    test_resume()
+    test_resume_copy_not_finished()
+    test_journal_kept_without_resume()
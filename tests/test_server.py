@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import socket
+import base64
+import tempfile
+import threading
+import concurrent.futures
+from sci_paper_rename.server import TitleServer, remove_stale_socket, request_titles
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def test_server():
+    socket_path = os.path.join(tempfile.mkdtemp(), 'titles.sock')
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    server = TitleServer(socket_path, executor, max_batch=2)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with open(os.path.join(EXAMPLES_DIR, '2.pdf'), 'rb') as f:
+            data = base64.b64encode(f.read()).decode()
+        response = request_titles(socket_path, [
+            {'path': os.path.join(EXAMPLES_DIR, '1.pdf')}, {'data': data}], request_id=1)
+        assert response['id'] == 1
+        titles = [result['title'] for result in response['results']]
+        assert titles[0] == 'A_structured_survey_of_quantum_computing_for_the_financial_industry.pdf'
+        assert titles[1].startswith('Blockchain_and_trusted_computing')
+
+        response = request_titles(socket_path, [{'path': '/no/such/file.pdf'}])
+        assert 'error' in response['results'][0]
+        assert 'error' in request_titles(socket_path, [{}] * 3)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        executor.shutdown()
+
+
+def test_broken_pool():
+    # a worker that dies breaks the pool, the next requests are scanned by a new one
+    socket_path = os.path.join(tempfile.mkdtemp(), 'titles.sock')
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+    server = TitleServer(socket_path, executor, executor_factory=lambda:
+                         concurrent.futures.ProcessPoolExecutor(max_workers=1))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        try:
+            executor.submit(os._exit, 1).result()
+        except concurrent.futures.BrokenExecutor:
+            pass
+        response = request_titles(socket_path, [{'path': os.path.join(EXAMPLES_DIR, '1.pdf')}])
+        assert response['results'][0]['title'] == \
+            'A_structured_survey_of_quantum_computing_for_the_financial_industry.pdf'
+        assert server.executor is not executor
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        server.executor.shutdown()
+
+
+def test_stale_socket():
+    tmp_dir = tempfile.mkdtemp()
+    socket_path = os.path.join(tmp_dir, 'titles.sock')
+    # left by a server that did not stop cleanly
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(socket_path)
+    remove_stale_socket(socket_path)
+    assert not os.path.exists(socket_path)
+
+    # a server still answers on it
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(socket_path)
+        listener.listen()
+        try:
+            remove_stale_socket(socket_path)
+        except OSError:
+            pass
+        else:
+            assert False, 'the socket of a running server was removed'
+        assert os.path.exists(socket_path)
+    os.remove(socket_path)
+
+    # not a socket
+    with open(socket_path, 'w') as f:
+        f.write('notes')
+    try:
+        remove_stale_socket(socket_path)
+    except FileExistsError:
+        pass
+    else:
+        assert False, 'a file that is not a socket was removed'
+    assert os.path.exists(socket_path)
+
+
+if __name__ == '__main__':
+
+    test_server()
+    test_broken_pool()
+    test_stale_socket()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import tempfile
+import multiprocessing
+from sci_paper_rename.shard import WorkClaims, in_shard, parse_shard
+from sci_paper_rename.transfer import place_file
+
+
+def claim_all(files_dir, claim_dir):
+    claims = WorkClaims(claim_dir)
+    return [name for name in map(str, range(50))
+            if claims.claim_file(os.path.join(files_dir, name))]
+
+
+def write(path, data='%PDF'):
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def test_shards():
+    assert parse_shard('1/4') == (1, 4)
+    for text in ('4/4', '-1/2', '1/0', 'x'):
+        try:
+            parse_shard(text)
+            assert False, text
+        except ValueError:
+            pass
+    names = ['paper_%d.pdf' % i for i in range(100)]
+    shards = [[name for name in names if in_shard(name, (i, 3))] for i in range(3)]
+    assert sorted(sum(shards, [])) == sorted(names)
+
+
+def test_claims():
+    with tempfile.TemporaryDirectory() as files_dir, \
+            tempfile.TemporaryDirectory() as claim_dir:
+        for name in map(str, range(50)):
+            write(os.path.join(files_dir, name))
+        # each file is claimed by exactly one of the processes racing for it
+        with multiprocessing.Pool(4) as pool:
+            claimed = pool.starmap(claim_all, [(files_dir, claim_dir)] * 4)
+        assert sorted(sum(claimed, []), key=int) == list(map(str, range(50)))
+
+        claims = WorkClaims(claim_dir)
+        path = os.path.join(files_dir, '0')
+        # an expired claim is taken over
+        assert not claims.claim_file(path)
+        claims.lease = 0
+        assert claims.claim_file(path)
+        claims.lease = 600
+
+        # a processed file is skipped, a new file at the same path is not
+        claims.release_file(path)
+        assert not claims.claim_file(path)
+        os.remove(path)
+        write(path, 'another paper')
+        assert claims.claim_file(path)
+        # the claims of files moved away are removed
+        os.remove(path)
+        claims.release_file(path)
+        assert not os.path.exists(claims._file_claim(path))
+
+        papers = [os.path.join(files_dir, name) for name in ('1', '2', '3')]
+        target = os.path.join(files_dir, 'Title.pdf')
+        assert claims.claim_content('abc', papers[0]) is None
+        assert claims.claim_content('abc', papers[0]) is None
+        assert claims.claim_content('abc', papers[1]) == papers[0]
+        # the original is found while it is renamed, and after
+        claims.set_content_target('abc', papers[0], target)
+        assert claims.claim_content('abc', papers[1]) == papers[0]
+        os.rename(papers[0], target)
+        assert claims.claim_content('abc', papers[1]) == target
+        # once it is removed, the next file with the content is the original
+        os.remove(target)
+        assert claims.claim_content('abc', papers[1]) is None
+        assert claims.claim_content('abc', papers[2]) == papers[1]
+
+
+def test_exclusive_place():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, 'a.pdf')
+        target = os.path.join(tmp_dir, 'Title.pdf')
+        for path in (source, target):
+            with open(path, 'w') as f:
+                f.write(path)
+        try:
+            place_file(source, target, exclusive=True)
+            assert False
+        except FileExistsError:
+            pass
+        assert os.path.exists(source)
+        place_file(source, target + '_2', exclusive=True)
+        assert not os.path.exists(source)
+
+
+if __name__ == '__main__':
+
+    test_shards()
+    test_claims()
+    test_exclusive_place()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import subprocess
+import time
+
+# modules that must not be loaded just to start the command line (e.g. --help)
+HEAVY_MODULES = ['fitz', 'pymupdf', 'pkg_resources', 'sqlite3', 'concurrent.futures']
+# generous upper bound for 'sci-paper-rename --help', the usual value is well below it
+MAX_HELP_SECONDS = 1.0
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def run_python(code):
+    return subprocess.run([sys.executable, '-c', code], cwd=PACKAGE_DIR,
+                          capture_output=True, text=True)
+
+
+def test_startup_imports():
+    result = run_python('import sys, sci_paper_rename.__main__; '
+                        'print(" ".join(sys.modules))')
+    loaded_modules = result.stdout.split()
+    for module in HEAVY_MODULES:
+        assert module not in loaded_modules, module + ' is imported at startup'
+
+
+def test_startup_time():
+    code = ('import sys; sys.argv = ["sci-paper-rename", "--help"]; '
+            'from sci_paper_rename.__main__ import main; main()')
+    # best of 3, to ignore a cold disk cache
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        result = run_python(code)
+        timings.append(time.perf_counter() - start)
+        assert result.returncode == 0
+    print('sci-paper-rename --help: %.1f ms' % (min(timings) * 1000))
+    assert min(timings) < MAX_HELP_SECONDS
+
+
+if __name__ == '__main__':
+
+    test_startup_imports()
+    test_startup_time()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+from sci_paper_rename.stats import RunStats, collecting, set_collector, timed_stage
+
+
+def test_stats():
+    run_stats = RunStats(slowest_count=2)
+    set_collector(run_stats)
+    try:
+        for file_name in ('a.pdf', 'b.pdf', 'c.pdf'):
+            with timed_stage('hash_file'):
+                pass
+            # timings sent back by a worker are added to the current file
+            with collecting() as collector:
+                with timed_stage('get_page_text'):
+                    pass
+            run_stats.merge(collector.take_file_timings())
+            run_stats.end_file(file_name)
+    finally:
+        set_collector(None)
+
+    summary = run_stats.summary()
+    assert summary['files'] == 3
+    assert summary['stages']['hash_file']['count'] == 3
+    assert summary['stages']['get_page_text']['count'] == 3
+    assert len(summary['slowest_files']) == 2
+    # no collector, nothing is timed
+    with timed_stage('hash_file'):
+        pass
+    assert run_stats.summary()['stages']['hash_file']['count'] == 3
+
+
+if __name__ == '__main__':
+
+    test_stats()
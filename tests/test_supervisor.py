@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import time
+from sci_paper_rename.supervisor import SupervisedPool
+
+
+def work(item):
+    if item == 2:
+        time.sleep(60)
+    if item == 3:
+        os._exit(1)
+    if item == 4:
+        raise ValueError('bad file')
+    return item * 10
+
+
+def test_supervised_pool():
+    pool = SupervisedPool(2, timeout=0.5)
+    try:
+        results = list(pool.map(work, range(6), on_failure=lambda item, reason: reason))
+    finally:
+        pool.close()
+    assert results[:2] == [0, 10]
+    assert results[2] == 'timeout'
+    assert results[3].startswith('crashed')
+    assert results[4] == 'ValueError: bad file'
+    assert results[5] == 50
+    assert pool.restarted == 2
+
+
+if __name__ == '__main__':
+
+    test_supervised_pool()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+from sci_paper_rename.scan import scan_title
+from sci_paper_rename.title import METADATA_MIN_SCORE, TitleSelector, metadata_title_score
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def test_title_selector():
+    selector = TitleSelector(max_spans=3)
+    # spans given out of reading order
+    selector.add(20, 'Second Line', (50, 130))
+    selector.add(10, 'Body text of the paper', (50, 300))
+    selector.add(20, 'First Line', (50, 100))
+    # drop cap: larger, but too short
+    selector.add(48, 'T', (50, 340))
+    selector.add(20, 'Third Line', (50, 160))
+    selector.add(20, 'Too Far', (50, 190))
+    assert selector.title() == 'First Line Second Line Third Line '
+
+    # a larger font replaces the group found so far
+    selector.add(24, ' Larger ', (50, 400))
+    assert selector.title() == 'Larger '
+    assert TitleSelector().title() == ''
+
+    # a next line of the title would not fit above the bottom of the clip
+    assert selector.may_go_on_below(420)
+    assert not selector.may_go_on_below(440)
+    assert not TitleSelector().may_go_on_below(0)
+
+
+def test_clipped_title():
+    # titles cut by the bottom of the top of the page are looked for on the full page
+    for name in ('1.pdf', '3.pdf', '5.pdf', '7.pdf'):
+        path = os.path.join(EXAMPLES_DIR, name)
+        assert scan_title(path, clip_top=0.1) == scan_title(path), name
+
+
+def test_metadata_title_score():
+    for title in (
+        'Borg: the Next Generation',
+        'Blockchain and Trusted Computing: Problems, Pitfalls, and a Solution',
+    ):
+        assert metadata_title_score(title) >= METADATA_MIN_SCORE, title
+    for title in (
+        '',
+        'Microsoft Word - final_version.docx',
+        'untitled',
+        'main.pdf',
+        'doi:10.1145/3357223.3362707',
+        '2101.00001v2',
+        'paper_final_v2',
+        'Proceedings 2020',
+    ):
+        assert metadata_title_score(title) < METADATA_MIN_SCORE, title
+
+
+if __name__ == '__main__':
+
+    test_title_selector()
+    test_clipped_title()
+    test_metadata_title_score()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import tempfile
+from sci_paper_rename.transfer import copy_file, place_file
+
+
+def test_place_file():
+    tmp_dir = tempfile.mkdtemp()
+    src_file = os.path.join(tmp_dir, 'paper.pdf')
+    with open(src_file, 'wb') as f:
+        f.write(b'%PDF' * 50000)
+
+    for link_mode in ('hardlink', 'symlink', 'reflink'):
+        target = os.path.join(tmp_dir, link_mode + '.pdf')
+        place_file(src_file, target, link_mode)
+        # the original file is kept
+        assert os.path.isfile(src_file)
+        with open(target, 'rb') as f:
+            assert f.read() == b'%PDF' * 50000
+    assert os.path.islink(os.path.join(tmp_dir, 'symlink.pdf'))
+
+    # the copy used across file systems leaves no temporary file
+    copy_file(src_file, os.path.join(tmp_dir, 'copy.pdf'))
+    assert not os.path.exists(os.path.join(tmp_dir, 'copy.pdf.part'))
+
+    target = os.path.join(tmp_dir, 'moved.pdf')
+    place_file(src_file, target)
+    assert os.path.isfile(target) and not os.path.exists(src_file)
+
+
+if __name__ == '__main__':
+
+    test_place_file()
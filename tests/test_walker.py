@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import io
+import os
+import tempfile
+from sci_paper_rename.walker import iter_listed_pdf_files, iter_pdf_files, read_path_list
+
+
+def make_tree(base_dir, file_names):
+    for file_name in file_names:
+        path = os.path.join(base_dir, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'%PDF')
+
+
+def found(base_dir, **walk_options):
+    return sorted(name for name, path, stat in iter_pdf_files(base_dir, **walk_options))
+
+
+def test_walker():
+    base_dir = tempfile.mkdtemp()
+    make_tree(base_dir, ['a.pdf', 'B.PDF', 'notes.txt', '2020/c.pdf', '2020/icde/d.pdf',
+                         '2021/draft_e.pdf', 'auto_renamed_pdf/done.pdf'])
+
+    assert found(base_dir) == ['B.PDF', 'a.pdf']
+    assert found(base_dir, recursive=True) == ['2020/c.pdf', '2020/icde/d.pdf',
+                                               '2021/draft_e.pdf', 'B.PDF', 'a.pdf']
+    assert found(base_dir, recursive=True, max_depth=1) == ['2020/c.pdf', '2021/draft_e.pdf',
+                                                            'B.PDF', 'a.pdf']
+    assert found(base_dir, recursive=True, exclude=['draft_*', '2020']) == ['B.PDF', 'a.pdf']
+    assert found(base_dir, recursive=True, include=['2020/*']) == ['2020/c.pdf', '2020/icde/d.pdf']
+    assert found(base_dir, skip_paths={os.path.join(base_dir, 'a.pdf')}) == ['B.PDF']
+
+    # the stat comes with each file
+    for name, path, stat in iter_pdf_files(base_dir):
+        assert stat.st_size == 4
+    print('walker ok')
+
+
+def test_listed_files():
+    base_dir = tempfile.mkdtemp()
+    make_tree(base_dir, ['a.pdf', 'sub/new\nline.pdf', 'notes.txt', 'auto_renamed_pdf/done.pdf'])
+
+    # entries are split across the chunks read from the stream
+    listing = b'\0'.join(os.fsencode(os.path.join(base_dir, name)) for name in
+                         ['a.pdf', 'sub/new\nline.pdf', 'notes.txt', 'missing.pdf',
+                          'auto_renamed_pdf/done.pdf']) + b'\0'
+    paths = list(read_path_list(io.BytesIO(listing), b'\0', chunk_size=7))
+    assert len(paths) == 5 and paths[1] == os.path.join(base_dir, 'sub/new\nline.pdf')
+    assert list(read_path_list(io.BytesIO(b'a.pdf\n\nb.pdf'))) == ['a.pdf', 'b.pdf']
+
+    names = [name for name, path, stat in iter_listed_pdf_files(paths, base_dir)]
+    assert names == ['a.pdf', 'sub/new\nline.pdf']
+    # files outside the base directory keep their full path
+    names = [name for name, path, stat in iter_listed_pdf_files(paths[:1], base_dir + '/sub')]
+    assert names == [os.path.join(base_dir, 'a.pdf')]
+    print('listed files ok')
+
+
+if __name__ == '__main__':
+
+    test_walker()
+    test_listed_files()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import sys
+sys.path.append('../')
+import os
+import time
+import tempfile
+import shutil
+import threading
+from sci_paper_rename.__main__ import rename_target_file
+from sci_paper_rename.commit import Committer
+from sci_paper_rename.watch import watch_pdf_files
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def write_files(dir_name):
+    time.sleep(0.2)
+    with open(os.path.join(dir_name, 'notes.txt'), 'w') as f:
+        f.write('not a pdf')
+    # downloaded under a temporary name, then moved in place
+    with open(os.path.join(dir_name, 'paper.pdf.part'), 'w') as f:
+        f.write('%PDF')
+    os.rename(os.path.join(dir_name, 'paper.pdf.part'), os.path.join(dir_name, 'paper.pdf'))
+
+
+def test_watch():
+    tmp_dir = tempfile.mkdtemp()
+    with open(os.path.join(tmp_dir, 'old.pdf'), 'w') as f:
+        f.write('%PDF')
+    writer = threading.Thread(target=write_files, args=(tmp_dir,))
+    writer.start()
+    new_files = watch_pdf_files(tmp_dir, debounce=0.1)
+    try:
+        assert next(new_files) == os.path.join(tmp_dir, 'paper.pdf')
+    finally:
+        new_files.close()
+        writer.join()
+
+
+
+def test_watch_duplicates():
+    # the same paper dropped twice in a watched folder
+    tmp_dir = tempfile.mkdtemp()
+    committer = Committer(os.path.join(tmp_dir, 'auto_renamed_pdf'))
+    for name in ['a.pdf', 'b.pdf']:
+        shutil.copy(os.path.join(EXAMPLES_DIR, '4.pdf'), os.path.join(tmp_dir, name))
+        rename_target_file(tmp_dir, name, committer=committer)
+    assert os.listdir(os.path.join(tmp_dir, 'auto_renamed_pdf')) == ['Borg_the_next_generation.pdf']
+    assert sorted(os.listdir(tmp_dir)) == ['auto_renamed_pdf', 'duplicated_b.pdf']
+
+
+if __name__ == '__main__':
+
+    test_watch()
+    test_watch_duplicates()